@@ -0,0 +1,75 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Every Lambda lives in its own directory and is deployed as
+``lambda_function.py``, so the modules are loaded by path under a unique name
+rather than imported as a package.
+"""
+import importlib.util
+import math
+import os
+import sys
+import timeit
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDAS: str = os.path.join(ROOT, "lambdas")
+COMMON: str = os.path.join(LAMBDAS, "common")
+
+# keep EMF metric lines out of benchmark output
+os.environ.setdefault("METRICS_DISABLED", "true")
+
+# the shared modules are deployed as a layer, which puts them on sys.path
+if COMMON not in sys.path:
+    sys.path.insert(0, COMMON)
+
+
+def load_module(directory: str, module: str, name: str):
+    """
+    Loads a module by path under a unique name, making its directory
+    importable first so its sibling imports resolve.
+
+    :param directory: the directory holding the module
+    :param module: the module file name without the .py suffix
+    :param name: the name to load it under
+    """
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(directory, module + ".py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def load_lambda(name: str, module: str = "lambda_function"):
+    """
+    Loads a Lambda module by path, making its directory importable the same
+    way the Lambda runtime does.
+
+    :param name: the directory of the Lambda under lambdas/, e.g. 'lf1'
+    :param module: the module file name without the .py suffix
+    """
+    return load_module(os.path.join(LAMBDAS, name), module, f"{name}_{module}".replace("-", "_"))
+
+
+def bench(label: str, func, number: int = 10000, repeat: int = 5) -> float:
+    """
+    Times func and prints the best per-call time in microseconds.
+
+    :return: the best per-call time in microseconds
+    """
+    best = min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+    print(f"{label:<48} {best:10.3f} us/call")
+    return best
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    The nearest-rank percentile of values.
+
+    :param q: the percentile, from 0 to 100
+    """
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[rank]
@@ -0,0 +1,101 @@
+"""
+Cold-init profile of every Lambda.
+
+Each handler module is imported in a fresh interpreter with -X importtime,
+the way the Lambda runtime imports it during init, and the slowest imports
+are reported with the total. The "before" run pre-imports the dependencies
+the handlers used to import eagerly (boto3, botocore, requests), which
+reproduces the old init; the "after" run imports the handler as it is now.
+
+    python benchmarks/bench_cold_start.py
+    python benchmarks/bench_cold_start.py --runs 10 --top 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from _util import COMMON, LAMBDAS
+
+FUNCTIONS: tuple = ("lf0", "lf1", "lf2", "ddb-to-opensearch")
+
+# what each handler imported at init before the lazy-import change
+EAGER_BEFORE: dict = {
+    "lf0": ("boto3",),
+    "lf1": ("boto3", "botocore.exceptions"),
+    "lf2": ("boto3", "botocore.exceptions", "requests"),
+    "ddb-to-opensearch": ("boto3", "requests"),
+}
+
+ENV: dict = dict(os.environ, METRICS_DISABLED="true", AWS_DEFAULT_REGION="us-east-1")
+
+
+def init_script(function: str, eager: tuple) -> str:
+    return "; ".join([
+        "import sys",
+        f"sys.path[:0] = [{os.path.join(LAMBDAS, function)!r}, {COMMON!r}]",
+        *[f"import {name}" for name in eager],
+        "import lambda_function",
+    ])
+
+
+def profile(function: str, eager: tuple = ()) -> tuple:
+    """
+    Imports a handler in a fresh interpreter.
+
+    :return: (init milliseconds, [(milliseconds, module)] for each import made
+             directly by the handler module)
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", init_script(function, eager)],
+                            env=ENV, capture_output=True, text=True, check=True)
+    entries: list = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        # nested imports are indented two spaces per level, and printed before their parent
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        entries.append((depth, int(cumulative) / 1000, module.strip()))
+
+    wanted = set(eager) | {"lambda_function"}
+    init: float = 0.0
+    children: list = []
+    pending: list = []
+    for depth, ms, module in entries:
+        if depth == 0:
+            if module in wanted:
+                init += ms
+            if module == "lambda_function":
+                children = pending
+            pending = []
+        elif depth == 1:
+            pending.append((ms, module))
+    return init, children
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold-init import profile of the Lambdas.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports listed per Lambda")
+    args = parser.parse_args()
+
+    rows: list = []
+    for function in FUNCTIONS:
+        before = [profile(function, EAGER_BEFORE[function])[0] for _ in range(args.runs)]
+        runs = [profile(function) for _ in range(args.runs)]
+        after = [init for init, _ in runs]
+        rows.append((function, statistics.median(before), statistics.median(after)))
+
+        print(f"{function}: slowest imports made by the handler (ms, cumulative)")
+        for ms, module in sorted(runs[-1][1], reverse=True)[:args.top]:
+            print(f"    {ms:8.1f}  {module}")
+
+    print()
+    print(f"{'function':<20} {'before ms':>10} {'after ms':>10} {'saved':>8}")
+    for function, before, after in rows:
+        print(f"{function:<20} {before:10.1f} {after:10.1f} {before - after:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Micro-benchmarks for the pure functions on the pipeline's hot paths, with
+no AWS or network access:
+
+    lf0     create_simple_message, parse_response
+    lf1     validate_dining, the Lex V2 response builders
+    lf2     get_query, handle_os_response
+    indexer parse_record, compare_images
+    ingest  yelp_api.convert on 50, 1k and 10k synthetic businesses
+
+Results are written to benchmarks/results/<commit>.json, so any two commits
+can be compared:
+
+    python benchmarks/bench_hot_paths.py
+    python benchmarks/bench_hot_paths.py --compare 3713002
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+from _util import ROOT, bench, load_lambda, load_module
+
+RESULTS: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+CONVERT_SIZES: tuple = (50, 1000, 10000)
+
+
+def commit() -> str:
+    """The short hash of HEAD, suffixed with -dirty when the tree has changes."""
+    def git(*args) -> str:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+
+    sha = git("rev-parse", "--short", "HEAD") or "unknown"
+    return sha + "-dirty" if git("status", "--porcelain", "--untracked-files=no") else sha
+
+
+def yelp_business(i: int) -> dict:
+    """A business shaped like a Yelp Fusion search result."""
+    return {
+        "id": f"biz-{i:06d}",
+        "alias": f"restaurant-{i}-new-york",
+        "name": f"Restaurant {i}",
+        "image_url": f"https://s3-media1.fl.yelpcdn.com/bphoto/{i}/o.jpg",
+        "is_closed": False,
+        "url": f"https://www.yelp.com/biz/restaurant-{i}-new-york",
+        "review_count": 100 + i % 900,
+        "categories": [{"alias": "italian", "title": "Italian"}, {"alias": "pizza", "title": "Pizza"}],
+        "rating": 3.5 + (i % 4) / 2,
+        "coordinates": {"latitude": 40.7 + i / 1e5, "longitude": -73.9 - i / 1e5},
+        "transactions": ["delivery", "pickup"],
+        "price": "$$",
+        "location": {
+            "address1": f"{i} Mulberry St", "address2": "", "address3": None, "city": "New York",
+            "zip_code": "10013", "country": "US", "state": "NY",
+            "display_address": [f"{i} Mulberry St", "New York, NY 10013"],
+        },
+        "phone": f"+1212555{i % 10000:04d}",
+        "display_phone": f"(212) 555-{i % 10000:04d}",
+        "distance": 1000.0 + i,
+    }
+
+
+def stream_record(event_name: str, i: int) -> dict:
+    image = {"id": {"S": f"biz-{i}"}, "Cuisine": {"S": "italian"}, "Location": {"S": "new york"},
+             "name": {"S": f"Restaurant {i}"}, "rating": {"N": "4.5"}}
+    dynamodb: dict = {"Keys": {"id": {"S": f"biz-{i}"}}, "NewImage": image}
+    if event_name == "MODIFY":
+        dynamodb["OldImage"] = dict(image, Cuisine={"S": "pizza"})
+    return {"eventID": f"event-{i}", "eventName": event_name, "dynamodb": dynamodb}
+
+
+def os_response(hits: int) -> dict:
+    return {"hits": {"total": {"value": hits, "relation": "eq"},
+                     "hits": [{"_id": str(i), "_source": {"id": f"biz-{i}", "Cuisine": "italian"}}
+                              for i in range(hits)]}}
+
+
+def lex_event(source: str, slots: dict) -> dict:
+    return {
+        "invocationSource": source,
+        "sessionState": {
+            "intent": {"name": "DiningSuggestionIntent", "confirmationState": "None", "slots": {
+                name: {"value": {"originalValue": value, "interpretedValue": value,
+                                 "resolvedValues": [value]}}
+                for name, value in slots.items()
+            }},
+            "sessionAttributes": {},
+            "originatingRequestId": "request-1",
+        },
+    }
+
+
+def run() -> dict:
+    lf0 = load_lambda("lf0")
+    lf1 = load_lambda("lf1")
+    lf2 = load_lambda("lf2")
+    indexer = load_lambda("ddb-to-opensearch")
+    yelp_api = load_module(os.path.join(ROOT, "dynamodb"), "yelp_api", "yelp_api")
+    from codehook import LexV2Request, plain_text
+    from validation import today
+
+    results: dict = {}
+
+    def record(label: str, func, number: int = 10000) -> None:
+        results[label] = bench(label, func, number=number)
+
+    lex_response = {"ResponseMetadata": {"HTTPStatusCode": 200},
+                    "messages": [{"contentType": "PlainText", "content": "Hi there, how can I help you?"}]}
+    record("lf0 create_simple_message, 1 message", lambda: lf0.create_simple_message(["Hello!"]))
+    record("lf0 parse_response", lambda: lf0.parse_response(lex_response))
+
+    tomorrow = str(today().fromordinal(today().toordinal() + 1))
+    filled = dict(location="new york", cuisine="italian", date=tomorrow, time="19:00", count="4")
+    typo = dict(filled, location="nyc", cuisine="italain")
+    valid_request = LexV2Request(lex_event("DialogCodeHook", filled))
+    record("lf1 validate_dining, valid slots", lambda: lf1.validate_dining(valid_request))
+    # the corrections are written back into the slots, so each call needs a fresh event
+    record("lf1 validate_dining, alias + typo, with event",
+           lambda: lf1.validate_dining(LexV2Request(lex_event("DialogCodeHook", typo))), number=2000)
+    request = LexV2Request(lex_event("DialogCodeHook", filled))
+    message = plain_text("How many people are in your party?")
+    record("lf1 LexV2Request from event", lambda: LexV2Request(lex_event("DialogCodeHook", filled)))
+    record("lf1 delegate", request.delegate)
+    record("lf1 elicit_slot", lambda: request.elicit_slot("count", message))
+    record("lf1 close", lambda: request.close("Fulfilled", message))
+
+    record("lf2 get_query", lambda: lf2.get_query("italian"))
+    response = os_response(3)
+    record("lf2 handle_os_response, 3 hits", lambda: lf2.handle_os_response(response))
+
+    insert, modify = stream_record("INSERT", 1), stream_record("MODIFY", 2)
+    record("indexer parse_record, INSERT", lambda: indexer.parse_record(insert))
+    record("indexer parse_record, MODIFY", lambda: indexer.parse_record(modify))
+    new_item = dict(indexer.deserialise_image(modify["dynamodb"]["NewImage"]), id="biz-2")
+    new_document = indexer.build_document(new_item)
+    record("indexer compare_images, MODIFY", lambda: indexer.compare_images(modify, new_item, new_document))
+
+    for size in CONVERT_SIZES:
+        businesses = [yelp_business(i) for i in range(size)]
+        record(f"yelp_api.convert, {size} businesses",
+               lambda: yelp_api.convert(businesses, "New York City", "italian"),
+               number=max(1, 20000 // size))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the hot-path functions.")
+    parser.add_argument("--compare", help="a commit, or a results file, to compare against")
+    parser.add_argument("--no-save", action="store_true", help="do not write a results file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    results = run()
+
+    sha = commit()
+    if not args.no_save:
+        os.makedirs(RESULTS, exist_ok=True)
+        path = os.path.join(RESULTS, f"{sha}.json")
+        with open(path, "w") as file:
+            json.dump({"commit": sha, "timestamp": time.time(), "python": platform.python_version(),
+                       "unit": "us/call", "results": results}, file, indent=2)
+        print(f"\nwrote {path}")
+
+    if args.compare:
+        path = args.compare if os.path.exists(args.compare) else os.path.join(RESULTS, f"{args.compare}.json")
+        with open(path) as file:
+            baseline = json.load(file)
+        print(f"\ncompared with {baseline['commit']}:")
+        for label, after in results.items():
+            before = baseline["results"].get(label)
+            if before is None:
+                print(f"{label:<48} {'new':>10}")
+            else:
+                print(f"{label:<48} {(after - before) / before * 100:+9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark for lf1's per-event dispatch overhead.
+
+The original if/elif dispatcher, with its repeated deep lookups into
+intent_request['sessionState']['intent'] and the json.dumps in the greeting
+handler, is reproduced below as the baseline.
+
+    python benchmarks/bench_lf1_dispatch.py
+"""
+import json
+import logging
+
+from _util import bench, load_lambda
+
+logger = logging.getLogger("baseline")
+
+
+def baseline_close(session_attributes, fulfillment_state, message, intent_name):
+    return {
+        'sessionState': {
+            'sessionAttributes': session_attributes,
+            'dialogAction': {'type': 'Close'},
+            'intent': {'name': intent_name, 'state': "Fulfilled"},
+            'messages': [message]
+        }
+    }
+
+
+def baseline_delegate(session_attributes, slots, intent):
+    return {
+        "sessionState": {
+            'sessionAttributes': session_attributes,
+            'dialogAction': {'type': 'Delegate'},
+            "intent": {"name": intent, "slots": slots, "state": "ReadyForFulfillment"}
+        }
+    }
+
+
+def baseline_handle_greet(intent_request):
+    logger.debug("Recieved GreetingIntent\nintent_request: {}".format(json.dumps(intent_request)))
+    session_attributes = intent_request.get('sessionAttributes') if intent_request.get(
+        'sessionAttributes') is not None else {}
+    return baseline_close(session_attributes, 'Fulfilled',
+                          {'contentType': 'PlainText', 'content': 'Hi there, how can I help you?'},
+                          intent_request['sessionState']['intent']['name'])
+
+
+def baseline_handle_thank_you(intent_request):
+    session_attributes = intent_request.get('sessionAttributes') if intent_request.get(
+        'sessionAttributes') is not None else {}
+    return baseline_close(session_attributes, "Fulfilled",
+                          {"contentType": "PlainText", "content": "Thanks for chatting with me!"},
+                          intent_request['sessionState']['intent']['name'])
+
+
+def baseline_dispatch(intent_request):
+    logger.debug('dispatch intentName={}'.format(intent_request['sessionState']['intent']['name']))
+    intent_name = intent_request['sessionState']['intent']['name']
+    if intent_name == 'GreetingIntent':
+        return baseline_handle_greet(intent_request)
+    elif intent_name == 'ThankYouIntent':
+        # the original raised here; returned so the two can be compared
+        return baseline_handle_thank_you(intent_request)
+    raise Exception('Intent with name ' + intent_name + ' not supported')
+
+
+def make_event(intent_name: str) -> dict:
+    return {
+        'sessionId': 'bench',
+        'inputTranscript': 'hello there',
+        'invocationSource': 'DialogCodeHook',
+        'bot': {'id': 'EZOWQCMXTB', 'name': 'DiningConcierge', 'aliasId': '49P3WS4KR0', 'localeId': 'en_US'},
+        'sessionState': {
+            'sessionAttributes': {},
+            'originatingRequestId': 'a8a4c2cc-bench',
+            'intent': {'name': intent_name, 'slots': {}, 'state': 'InProgress', 'confirmationState': 'None'},
+        },
+        'interpretations': [{'intent': {'name': intent_name, 'slots': {}}, 'nluConfidence': {'score': 0.97}}],
+    }
+
+
+def main():
+    lf1 = load_lambda("lf1")
+    for intent_name in ('GreetingIntent', 'ThankYouIntent'):
+        event = make_event(intent_name)
+        before = bench(f"baseline dispatch {intent_name}", lambda: baseline_dispatch(event))
+        after = bench(f"registry dispatch {intent_name}", lambda: lf1.dispatcher.dispatch(event))
+        print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
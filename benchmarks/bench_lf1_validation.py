@@ -0,0 +1,108 @@
+"""
+Micro-benchmark for lf1.validate_dining.
+
+Compares the precompiled validation tables against the original
+implementation (list rebuilds, dateutil + strptime, try_ex lambdas), which is
+reproduced below as the baseline.
+
+    python benchmarks/bench_lf1_validation.py
+"""
+import datetime
+
+import dateutil.parser
+
+from _util import bench, load_lambda
+from codehook import LexV2Request
+
+
+def try_ex(func):
+    try:
+        return func()
+    except KeyError:
+        return None
+
+
+def isvalid_date(date):
+    try:
+        dateutil.parser.parse(date)
+        return True
+    except ValueError:
+        return False
+
+
+def isvalid_city(city):
+    valid_cities = ['new york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio',
+                    'san diego', 'dallas', 'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis',
+                    'columbus', 'fort worth', 'charlotte', 'detroit', 'el paso', 'seattle', 'denver', 'washington dc',
+                    'memphis', 'boston', 'nashville', 'baltimore', 'portland']
+    return city.lower() in valid_cities
+
+
+def isvalid_cuisine(cuisine):
+    valid_cuisines = ['vegetarian', 'seafood', 'indian', 'chinese', 'american', 'italian', 'japanese',
+                      'mexican', 'mediterranean', 'vegan', 'chicken', 'steak', 'noodles', 'fast food', 'deli',
+                      'convenience', 'sandwiches', 'desserts', 'burgers', 'salad', 'coffee', 'thai', 'brazilian', ]
+    return cuisine.lower() in valid_cuisines
+
+
+def baseline_validate_dining(slots: dict) -> dict:
+    location = try_ex(lambda: slots['location'])
+    cuisine = try_ex(lambda: slots['cuisine'])
+    date = try_ex(lambda: slots['date'])
+    count = try_ex(lambda: slots['count'])
+
+    if location and not isvalid_city(location['value']['interpretedValue']):
+        return {'isValid': False}
+    if cuisine and not isvalid_cuisine(cuisine['value']['interpretedValue']):
+        return {'isValid': False}
+    if date:
+        if not isvalid_date(date['value']['interpretedValue']):
+            return {'isValid': False}
+        if datetime.datetime.strptime(date['value']['interpretedValue'], '%Y-%m-%d').date() <= datetime.date.today():
+            return {'isValid': False}
+    if count is not None and (int(count['value']['interpretedValue']) < 1 or int(count['value']['interpretedValue']) > 8):
+        return {'isValid': False}
+    return {'isValid': True}
+
+
+def slot(value):
+    return {'shape': 'Scalar', 'value': {'originalValue': value, 'interpretedValue': value, 'resolvedValues': [value]}}
+
+
+def make_request(slots: dict) -> LexV2Request:
+    return LexV2Request({'invocationSource': 'DialogCodeHook', 'sessionState': {'intent': {
+        'name': 'DiningSuggestionIntent', 'slots': slots}}})
+
+
+def make_slots():
+    tomorrow = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+    return {
+        'location': slot('portland'),
+        'cuisine': slot('brazilian'),
+        'date': slot(tomorrow),
+        'time': slot('19:00'),
+        'count': slot('4'),
+        'phone': None,
+        'email': None,
+    }
+
+
+def main():
+    lf1 = load_lambda("lf1")
+    slots = make_slots()
+    assert baseline_validate_dining(slots)['isValid']
+    request = make_request(slots)
+    assert lf1.validate_dining(request)['isValid']
+
+    before = bench("baseline validate_dining", lambda: baseline_validate_dining(slots))
+    after = bench("precompiled validate_dining", lambda: lf1.validate_dining(request))
+    print(f"speedup: {before / after:.1f}x")
+
+    # a misspelling costs a BK-tree search, but saves a full Lex round trip
+    typo = make_slots()
+    bench("validate_dining with a corrected typo",
+          lambda: lf1.validate_dining(make_request({**typo, 'cuisine': slot('italain')})), number=2000)
+
+
+if __name__ == "__main__":
+    main()
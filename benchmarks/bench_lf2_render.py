@@ -0,0 +1,85 @@
+"""
+Micro-benchmark for rendering a batch of 10 lf2 emails.
+
+The original f-string building in send_message, including its prints of the
+request, is reproduced below as the baseline. Its output goes to an in-memory
+buffer, which is cheaper than the CloudWatch-bound stdout of a real Lambda.
+
+    python benchmarks/bench_lf2_render.py
+"""
+import contextlib
+import io
+
+from _util import bench, load_lambda
+
+BATCH_SIZE: int = 10
+
+
+def baseline_message(restaurant: dict, attributes: dict) -> str:
+    print(f"send_message: {restaurant}, {attributes}")
+
+    phone: str = attributes["phone"]
+    count: int = attributes["count"]
+    cuisine: str = attributes["cuisine"]
+    date: str = attributes["date"]
+    time: str = attributes["time"]
+
+    print(
+        f"params: phone: {phone}\ncount: {count}\ncuisine: {cuisine}\ndate: {date}\ntime: {time}")
+
+    rest_name: str = restaurant.get("name")
+    loc_obj: dict = restaurant.get("location")
+    location_display_name: str = loc_obj["display_address"][0]
+
+    print(
+        f"restaurant suggestion: name: {rest_name}, address: {location_display_name}")
+
+    message: str = (
+        f"Hello! Here are my {cuisine} restaurant suggestions for {count} "
+        f"people, for {date} at {time}: {rest_name}, located at {location_display_name}.\n"
+        "Hope you enjoy the suggestions!."
+    )
+
+    print(f"Message to send:\n{message}")
+    return message
+
+
+def make_batch() -> list:
+    batch: list = []
+    for i in range(BATCH_SIZE):
+        request = dict(location="new york", cuisine="italian", date="2030-01-01", time="19:00",
+                       count=4, phone=f"+1555000{i:04d}", email=f"user{i}@example.com")
+        restaurant = {"id": f"r{i}", "name": f"Trattoria {i}", "rating": 4.5,
+                      "location": {"display_address": [f"{i} Mulberry St", "New York, NY 10013"]}}
+        batch.append((request, restaurant))
+    return batch
+
+
+def main():
+    render = load_lambda("lf2", "render")
+    batch = make_batch()
+
+    def baseline():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return [baseline_message(restaurant, request) for request, restaurant in batch]
+
+    def compiled_text():
+        return [render.SUGGESTION_TEXT.render(dict(request, suggestions=render.SUGGESTION_TEXT_ITEM.render(
+            dict(render.display_fields(restaurant), rank=1)))) for request, restaurant in batch]
+
+    def compiled():
+        return [render.render_suggestions(request, [restaurant]) for request, restaurant in batch]
+
+    def compiled_three():
+        return [render.render_suggestions(request, [restaurant] * 3) for request, restaurant in batch]
+
+    before = bench("baseline f-strings + prints, 10 records", baseline, number=2000)
+    after = bench("compiled text only, 10 records", compiled_text, number=2000)
+    print(f"speedup: {before / after:.1f}x")
+    # the multipart email renders twice the output, HTML-escaped
+    bench("compiled text + html, 10 records", compiled, number=2000)
+    bench("compiled text + html, 3 suggestions each", compiled_three, number=2000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Throughput benchmark for the BookTrip sample's price quotes.
+
+The original per-call pricing functions are reproduced below as the baseline.
+
+    python benchmarks/bench_sample_pricing.py
+"""
+import random
+import time
+
+from _util import load_lambda
+
+
+def baseline_car_price(location, days, age, car_type):
+    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
+    base_location_cost = 0
+    for i in range(len(location)):
+        base_location_cost += ord(location.lower()[i]) - 97
+
+    age_multiplier = 1.10 if age < 25 else 1
+    if car_type not in car_types:
+        car_type = car_types[0]
+
+    return days * ((100 + base_location_cost) + ((car_types.index(car_type.lower()) * 50) * age_multiplier))
+
+
+def baseline_hotel_price(location, nights, room_type):
+    room_types = ['queen', 'king', 'deluxe']
+    cost_of_living = 0
+    for i in range(len(location)):
+        cost_of_living += ord(location.lower()[i]) - 97
+
+    return nights * (100 + cost_of_living + (100 + room_types.index(room_type.lower())))
+
+
+def quotes_per_second(label: str, func, count: int) -> float:
+    start = time.perf_counter()
+    func()
+    rate = count / (time.perf_counter() - start)
+    print(f"{label:<40} {rate:14,.0f} quotes/s")
+    return rate
+
+
+def main(count: int = 100000):
+    pricing = load_lambda("sample", "pricing")
+    rng = random.Random(7)
+    cities = sorted(pricing.VALID_CITIES)
+    cars = [(rng.choice(cities), rng.randint(1, 30), rng.randint(18, 80), rng.choice(pricing.CAR_TYPES))
+            for _ in range(count)]
+    hotels = [(rng.choice(cities), rng.randint(1, 30), rng.choice(pricing.ROOM_TYPES)) for _ in range(count)]
+
+    assert pricing.quote_cars(cars[:100]) == [baseline_car_price(*q) for q in cars[:100]]
+    assert pricing.quote_hotels(hotels[:100]) == [baseline_hotel_price(*q) for q in hotels[:100]]
+
+    before = quotes_per_second("baseline car quotes", lambda: [baseline_car_price(*q) for q in cars], count)
+    after = quotes_per_second("quote_cars", lambda: pricing.quote_cars(cars), count)
+    print(f"speedup: {after / before:.1f}x")
+    before = quotes_per_second("baseline hotel quotes", lambda: [baseline_hotel_price(*q) for q in hotels], count)
+    after = quotes_per_second("quote_hotels", lambda: pricing.quote_hotels(hotels), count)
+    print(f"speedup: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,535 @@
+"""
+In-memory stand-ins for the AWS services the pipeline calls, for running it
+on a laptop with no network.
+
+Each fake implements only the calls and response fields that the Lambdas and
+the index tools use, with an optional fixed latency per call so that
+dependency time can be simulated.
+The OpenSearch stand-in is a real HTTP server on localhost, because lf2 and
+the indexer talk to OpenSearch with requests rather than through boto3.
+"""
+import fnmatch
+import itertools
+import json
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+from uuid import uuid4
+
+
+class Latency:
+    """A fixed delay added to every call of a fake."""
+
+    def __init__(self, milliseconds: float = 0) -> None:
+        self.seconds: float = milliseconds / 1000
+
+    def pause(self) -> None:
+        if self.seconds:
+            time.sleep(self.seconds)
+
+
+class FakeSqs:
+    """
+    A FIFO queue: send_message_batch for lf1, receive for the lf2 poller.
+
+    Like a FIFO queue, a message whose MessageDeduplicationId was seen in the
+    last five minutes is accepted but not delivered.
+    """
+
+    DEDUP_INTERVAL: float = 300
+
+    def __init__(self, latency: Optional[Latency] = None) -> None:
+        self.latency: Latency = latency or Latency()
+        self.messages: deque = deque()
+        self.seen: dict = {}
+        self.duplicates: int = 0
+        self.sent: int = 0
+        self.lock: threading.Lock = threading.Lock()
+        self.available: threading.Condition = threading.Condition(self.lock)
+
+    def send_message_batch(self, QueueUrl: str, Entries: list) -> dict:
+        self.latency.pause()
+        now = time.time()
+        successful: list = []
+        with self.lock:
+            for entry in Entries:
+                dedup_id = entry.get("MessageDeduplicationId")
+                message_id = str(uuid4())
+                successful.append({"Id": entry["Id"], "MessageId": message_id})
+                if dedup_id is not None and now - self.seen.get(dedup_id, -self.DEDUP_INTERVAL) < self.DEDUP_INTERVAL:
+                    self.duplicates += 1
+                    continue
+                if dedup_id is not None:
+                    self.seen[dedup_id] = now
+                self.messages.append({
+                    "messageId": message_id,
+                    "body": entry["MessageBody"],
+                    "messageAttributes": entry.get("MessageAttributes") or {},
+                    "attributes": {
+                        "SentTimestamp": str(int(now * 1000)),
+                        "MessageGroupId": entry.get("MessageGroupId"),
+                        "MessageDeduplicationId": dedup_id,
+                    },
+                    "eventSource": "aws:sqs",
+                })
+                self.sent += 1
+            self.available.notify_all()
+        return {"Successful": successful, "Failed": []}
+
+    def receive(self, max_messages: int = 10, wait: float = 0.0) -> list:
+        """
+        Takes up to max_messages records in Lambda's SQS event shape, waiting
+        up to wait seconds for the first one.
+        """
+        with self.lock:
+            if not self.messages:
+                self.available.wait(wait)
+            records: list = []
+            while self.messages and len(records) < max_messages:
+                records.append(self.messages.popleft())
+            return records
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.messages)
+
+
+class FakeTable:
+    """
+    A DynamoDB Table, keyed by a single 'id' attribute unless other key
+    attributes are given. items maps the id, or the tuple of key values, to
+    each item.
+    """
+
+    def __init__(self, name: str, latency: Latency, key_names: tuple = ("id",)) -> None:
+        self.name: str = name
+        self.latency: Latency = latency
+        self.key_names: tuple = key_names
+        self.items: dict = {}
+
+    def _key(self, item: dict):
+        if self.key_names == ("id",):
+            return item["id"]
+        return tuple(item[name] for name in self.key_names)
+
+    def load(self) -> None:
+        self.latency.pause()
+
+    def get_item(self, Key: dict) -> dict:
+        self.latency.pause()
+        item = self.items.get(self._key(Key))
+        return {"Item": item} if item is not None else {}
+
+    def put_item(self, Item: dict) -> dict:
+        self.latency.pause()
+        self.items[self._key(Item)] = Item
+        return {}
+
+    def scan(self, Segment: int = 0, TotalSegments: int = 1, Limit: int = 1000,
+             ExclusiveStartKey: Optional[dict] = None, ProjectionExpression: Optional[str] = None,
+             ExpressionAttributeNames: Optional[dict] = None) -> dict:
+        """
+        Pages through one segment of the items, in key order, projecting the
+        named attributes when asked to.
+        """
+        self.latency.pause()
+        keys = sorted(key for key in self.items if zlib.crc32(key.encode()) % TotalSegments == Segment)
+        if ExclusiveStartKey is not None:
+            keys = [key for key in keys if key > ExclusiveStartKey["id"]]
+        page = keys[:Limit]
+        items = [self.items[key] for key in page]
+        if ProjectionExpression:
+            names = [(ExpressionAttributeNames or {}).get(name.strip(), name.strip())
+                     for name in ProjectionExpression.split(",")]
+            items = [{name: item[name] for name in names if name in item} for item in items]
+        response: dict = {"Items": items, "Count": len(items)}
+        if len(keys) > Limit:
+            response["LastEvaluatedKey"] = {"id": page[-1]}
+        return response
+
+    def query(self, IndexName: str, KeyConditionExpression: str, ExpressionAttributeValues: dict,
+              ExpressionAttributeNames: Optional[dict] = None, ProjectionExpression: Optional[str] = None,
+              Limit: int = 1000) -> dict:
+        """
+        Queries an index with equality conditions on its keys joined by AND,
+        e.g. "#ck = :ck AND #lk = :lk"; IndexName is not checked.
+        """
+        self.latency.pause()
+        names = ExpressionAttributeNames or {}
+        conditions: list = []
+        for condition in KeyConditionExpression.split(" AND "):
+            name, value = (part.strip() for part in condition.split("="))
+            conditions.append((names.get(name, name), ExpressionAttributeValues[value]))
+        items = [item for _, item in sorted(self.items.items())
+                 if all(item.get(name) == value for name, value in conditions)][:Limit]
+        if ProjectionExpression:
+            projected = [names.get(name.strip(), name.strip()) for name in ProjectionExpression.split(",")]
+            items = [{name: item[name] for name in projected if name in item} for item in items]
+        return {"Items": items, "Count": len(items)}
+
+
+class FakeDynamoResource:
+    """The parts of a boto3 DynamoDB resource used by lf2."""
+
+    MAX_BATCH_GET: int = 100
+
+    def __init__(self, latency: Optional[Latency] = None) -> None:
+        self.latency: Latency = latency or Latency()
+        self.tables: dict = {}
+
+    def Table(self, name: str, key_names: tuple = ("id",)) -> FakeTable:
+        """
+        :param key_names: the key attributes, used when the table is first referenced
+        """
+        if name not in self.tables:
+            self.tables[name] = FakeTable(name, self.latency, key_names)
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems: dict) -> dict:
+        self.latency.pause()
+        responses: dict = {}
+        for name, request in RequestItems.items():
+            if len(request["Keys"]) > self.MAX_BATCH_GET:
+                raise ValueError(f"too many keys for BatchGetItem: {len(request['Keys'])}")
+            items = self.Table(name).items
+            responses[name] = [items[key["id"]] for key in request["Keys"] if key["id"] in items]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+class FakeSes:
+    """Records sent emails, calling on_send with each recipient as it is sent."""
+
+    def __init__(self, latency: Optional[Latency] = None,
+                 on_send: Optional[Callable[[str], None]] = None) -> None:
+        self.latency: Latency = latency or Latency()
+        self.on_send: Optional[Callable[[str], None]] = on_send
+        self.sent: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def _sent(self, address: str) -> str:
+        with self.lock:
+            self.sent += 1
+        if self.on_send is not None:
+            self.on_send(address)
+        return str(uuid4())
+
+    def send_email(self, Destination: dict, Message: dict, Source: str) -> dict:
+        self.latency.pause()
+        return {"MessageId": self._sent(Destination["ToAddresses"][0])}
+
+    def send_bulk_templated_email(self, Source: str, Template: str, DefaultTemplateData: str,
+                                  Destinations: list) -> dict:
+        self.latency.pause()
+        return {"Status": [
+            {"Status": "Success", "MessageId": self._sent(destination["Destination"]["ToAddresses"][0])}
+            for destination in Destinations
+        ]}
+
+
+class FakeLex:
+    """
+    Stands in for the Lex V2 runtime: each utterance is looked up in a table
+    of recorded interpretations and handed to the code hook, lf1.
+
+    :param code_hook: lf1's lambda_handler
+    :param interpret: maps the utterance text to (intent name, slots, invocation source)
+    """
+
+    def __init__(self, code_hook: Callable, interpret: Callable, latency: Optional[Latency] = None,
+                 on_code_hook: Optional[Callable[[float], None]] = None) -> None:
+        self.code_hook: Callable = code_hook
+        self.interpret: Callable = interpret
+        self.latency: Latency = latency or Latency()
+        self.on_code_hook: Optional[Callable[[float], None]] = on_code_hook
+
+    def recognize_text(self, botId: str, botAliasId: str, localeId: str, sessionId: str,
+                       text: str, requestAttributes: Optional[dict] = None) -> dict:
+        self.latency.pause()
+        intent, slots, source = self.interpret(text)
+        event: dict = {
+            "sessionId": sessionId,
+            "inputTranscript": text,
+            "invocationSource": source,
+            "requestAttributes": requestAttributes or {},
+            "sessionState": {
+                "originatingRequestId": str(uuid4()),
+                "sessionAttributes": {},
+                "intent": {
+                    "name": intent,
+                    "state": "InProgress",
+                    "confirmationState": "None",
+                    "slots": {
+                        name: {"value": {"originalValue": value, "interpretedValue": value,
+                                         "resolvedValues": [value]}}
+                        for name, value in slots.items()
+                    },
+                },
+            },
+        }
+        start = time.perf_counter()
+        response = self.code_hook(event, None)
+        if self.on_code_hook is not None:
+            self.on_code_hook((time.perf_counter() - start) * 1000)
+        return {
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+            "sessionState": response.get("sessionState"),
+            "messages": response.get("messages"),
+        }
+
+
+class FakeOpenSearch:
+    """
+    An OpenSearch stand-in on localhost. It keeps indexes and aliases and
+    serves the APIs the Lambdas and the index tools call: _doc writes and
+    deletes, term queries through _search, _bulk, _reindex, _aliases, index
+    settings and counts.
+
+        with FakeOpenSearch() as search:
+            search.add({"id": "r1", "Cuisine": "italian"})
+            requests.get(search.url + "/restaurants/_search", json=query)
+    """
+
+    DEFAULT_SETTINGS: dict = {"number_of_shards": "1", "number_of_replicas": "1", "refresh_interval": "1s"}
+
+    def __init__(self, latency: Optional[Latency] = None) -> None:
+        self.latency: Latency = latency or Latency()
+        self.indices: dict = {}
+        self.aliases: dict = {}
+        self.lock: threading.RLock = threading.RLock()
+        self.requests: dict = {}
+        self._ids = itertools.count()
+        self.server: ThreadingHTTPServer = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url: str = "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    def create_index(self, name: str, body: Optional[dict] = None) -> bool:
+        with self.lock:
+            if name in self.indices or name in self.aliases:
+                return False
+            settings = dict(self.DEFAULT_SETTINGS)
+            settings.update({key: str(value) for key, value in ((body or {}).get("settings") or {}).items()
+                             if not isinstance(value, dict)})
+            self.indices[name] = {"documents": {}, "settings": settings,
+                                  "mappings": (body or {}).get("mappings") or {}}
+            return True
+
+    def resolve(self, name: str) -> list:
+        """Returns the indexes a name refers to, following aliases."""
+        with self.lock:
+            if name in self.aliases:
+                return list(self.aliases[name])
+            return [name] if name in self.indices else []
+
+    def write_index(self, name: str) -> str:
+        """Resolves the index a write to name goes to, creating it as OpenSearch would."""
+        with self.lock:
+            targets = self.resolve(name)
+            if len(targets) > 1:
+                raise ValueError(f"alias {name} points at several indexes")
+            if not targets:
+                self.create_index(name)
+                return name
+            return targets[0]
+
+    def documents(self, name: str = "restaurants") -> dict:
+        with self.lock:
+            found: dict = {}
+            for index in self.resolve(name):
+                found.update(self.indices[index]["documents"])
+            return found
+
+    def add(self, document: dict, doc_id: Optional[str] = None, index: str = "restaurants") -> str:
+        with self.lock:
+            doc_id = doc_id or str(next(self._ids))
+            self.indices[self.write_index(index)]["documents"][doc_id] = document
+            return doc_id
+
+    def delete(self, doc_id: str, index: str = "restaurants") -> bool:
+        with self.lock:
+            return self.indices[self.write_index(index)]["documents"].pop(doc_id, None) is not None
+
+    def search(self, query: dict, index: str = "restaurants") -> dict:
+        term = query.get("query", {}).get("term", {})
+        field, condition = next(iter(term.items())) if term else (None, None)
+        value = condition["value"] if isinstance(condition, dict) else condition
+        hits = [
+            {"_id": doc_id, "_source": document}
+            for doc_id, document in self.documents(index).items()
+            if field is None or str(document.get(field, "")).lower() == str(value).lower()
+        ]
+        return {"hits": {"total": {"value": len(hits), "relation": "eq"},
+                         "hits": hits[:query.get("size", 10)]}}
+
+    def update_aliases(self, actions: list) -> None:
+        with self.lock:
+            for action in actions:
+                (kind, spec), = action.items()
+                if kind == "add":
+                    targets = self.aliases.setdefault(spec["alias"], [])
+                    if spec["index"] not in targets:
+                        targets.append(spec["index"])
+                elif kind == "remove":
+                    self.aliases.get(spec["alias"], []).remove(spec["index"])
+                    if not self.aliases[spec["alias"]]:
+                        del self.aliases[spec["alias"]]
+                elif kind == "remove_index":
+                    del self.indices[spec["index"]]
+
+    def bulk(self, body: bytes) -> dict:
+        lines = [json.loads(line) for line in body.decode().splitlines() if line.strip()]
+        items: list = []
+        position = 0
+        while position < len(lines):
+            (kind, meta), = lines[position].items()
+            position += 1
+            index = self.write_index(meta["_index"])
+            if kind == "delete":
+                found = self.delete(meta["_id"], index)
+                items.append({kind: {"_index": index, "_id": meta["_id"], "status": 200 if found else 404}})
+                continue
+            doc_id = self.add(lines[position], meta.get("_id"), index)
+            position += 1
+            items.append({kind: {"_index": index, "_id": doc_id, "status": 201}})
+        return {"took": 1, "errors": False, "items": items}
+
+    def reindex(self, body: dict) -> dict:
+        source = self.documents(body["source"]["index"])
+        dest = self.write_index(body["dest"]["index"])
+        use_source_id = "script" in body
+        for doc_id, document in source.items():
+            self.add(document, document.get("id") if use_source_id and document.get("id") else doc_id, dest)
+        return {"total": len(source), "created": len(source), "failures": []}
+
+    def _handler(self):
+        search = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _raw(self) -> bytes:
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _reply(self, status: int, document) -> None:
+                payload = json.dumps(document).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _route(self, method: str) -> None:
+                search.latency.pause()
+                path = self.path.split("?")[0].strip("/")
+                parts = path.split("/")
+                raw = self._raw()
+                endpoint = parts[1] if len(parts) > 1 else parts[0]
+                with search.lock:
+                    search.requests[endpoint] = search.requests.get(endpoint, 0) + 1
+                body = json.loads(raw) if raw and parts[0] != "_bulk" else {}
+
+                if parts[0] == "_bulk":
+                    self._reply(200, search.bulk(raw))
+                elif parts[0] == "_reindex":
+                    self._reply(200, search.reindex(body))
+                elif parts[0] == "_aliases":
+                    search.update_aliases(body["actions"])
+                    self._reply(200, {"acknowledged": True})
+                elif parts[0] == "_alias":
+                    targets = search.aliases.get(parts[1])
+                    if targets:
+                        self._reply(200, {index: {"aliases": {parts[1]: {}}} for index in targets})
+                    else:
+                        self._reply(404, {"error": f"alias [{parts[1]}] missing", "status": 404})
+                elif parts[0] == "_cat":
+                    pattern = parts[2] if len(parts) > 2 else "*"
+                    with search.lock:
+                        self._reply(200, [{"index": name, "docs.count": str(len(index["documents"]))}
+                                          for name, index in search.indices.items()
+                                          if fnmatch.fnmatch(name, pattern)])
+                elif len(parts) == 1:
+                    self._index(method, parts[0], body)
+                elif parts[1] == "_search":
+                    self._reply(200, search.search(body, parts[0]))
+                elif parts[1] == "_count":
+                    self._reply(200, {"count": len(search.documents(parts[0]))})
+                elif parts[1] == "_refresh":
+                    self._reply(200, {"_shards": {"failed": 0}})
+                elif parts[1] == "_settings":
+                    self._settings(method, parts[0], body)
+                elif parts[1] == "_doc" and method in ("POST", "PUT"):
+                    doc_id = search.add(body, parts[2] if len(parts) > 2 else None, parts[0])
+                    self._reply(201, {"_id": doc_id, "result": "created"})
+                elif parts[1] == "_doc" and method == "DELETE" and len(parts) == 3:
+                    found = search.delete(parts[2], parts[0])
+                    self._reply(200 if found else 404, {"_id": parts[2],
+                                                       "result": "deleted" if found else "not_found"})
+                else:
+                    self._reply(400, {"error": f"unsupported request {method} {self.path}"})
+
+            def _index(self, method: str, name: str, body: dict) -> None:
+                if method == "PUT":
+                    if search.create_index(name, body):
+                        self._reply(200, {"acknowledged": True, "index": name})
+                    else:
+                        self._reply(400, {"error": {"type": "resource_already_exists_exception"}})
+                    return
+                targets = search.resolve(name)
+                if not targets:
+                    self._reply(404, {"error": {"type": "index_not_found_exception"}, "status": 404})
+                elif method == "DELETE":
+                    with search.lock:
+                        for index in targets:
+                            del search.indices[index]
+                    self._reply(200, {"acknowledged": True})
+                else:
+                    with search.lock:
+                        self._reply(200, {index: {"settings": {"index": search.indices[index]["settings"]},
+                                                  "mappings": search.indices[index]["mappings"]}
+                                          for index in targets})
+
+            def _settings(self, method: str, name: str, body: dict) -> None:
+                targets = search.resolve(name)
+                with search.lock:
+                    if method == "PUT":
+                        for index in targets:
+                            search.indices[index]["settings"].update(
+                                {key: str(value) for key, value in body.get("index", body).items()})
+                        self._reply(200, {"acknowledged": True})
+                    else:
+                        self._reply(200, {index: {"settings": {"index": dict(search.indices[index]["settings"])}}
+                                          for index in targets})
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def do_PUT(self):
+                self._route("PUT")
+
+            def do_DELETE(self):
+                self._route("DELETE")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeOpenSearch":
+        threading.Thread(target=self.server.serve_forever, name="fake-opensearch", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "FakeOpenSearch":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,314 @@
+"""
+End-to-end load test of the chat pipeline, run in one process with no network:
+
+    lf0 -> Lex (fake) -> lf1 -> SQS (fake) -> lf2 -> OpenSearch, DynamoDB, SES (fakes)
+
+The recorded chat sessions in sessions.jsonl are replayed at a fixed session
+arrival rate by a pool of concurrent users, while pollers feed the queue to
+lf2 in batches the way the SQS event source does. Each replay gets its own
+phone and email, so FIFO deduplication does not collapse repeats and each
+fulfilment can be matched to the email that answers it.
+
+Stages reported, in milliseconds:
+    turn        one chat message through lf0, i.e. what the user waits for
+    lf1         the code hook's part of a turn
+    QueueDelay  SentTimestamp to lf2 picking the message up, as lf2 emits it
+    lf2 batch   one lf2 invocation
+    fulfilment  from the fulfilment turn to its email being sent
+as well as every span the Lambdas emit, e.g. "OpenSearch Search".
+
+One process stands in for every Lambda container, so module state (the
+suggestion cache, the SES pool) is shared as in a single warm container. The
+numbers are for comparing commits, not for capacity planning.
+
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --sessions 500 --rate 50 --concurrency 16 --latency-ms 5
+"""
+import argparse
+import contextlib
+import copy
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from _util import load_lambda, percentile
+from fakes import FakeDynamoResource, FakeLex, FakeOpenSearch, FakeSes, FakeSqs, Latency
+
+SESSIONS_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.jsonl")
+
+# left out of the index so the "no suggestions" email is exercised too
+UNINDEXED_CUISINES: frozenset = frozenset({"brazilian"})
+
+RELATIVE_DATE = re.compile(r"^\+(\d+)d$")
+
+
+class Stats:
+    """Thread-safe latency samples, in milliseconds, grouped by stage."""
+
+    def __init__(self) -> None:
+        self.samples: dict = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    def add(self, stage: str, milliseconds: float) -> None:
+        with self.lock:
+            self.samples.setdefault(stage, []).append(milliseconds)
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                stage: {
+                    "count": len(values),
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "p99": percentile(values, 99),
+                    "max": max(values),
+                }
+                for stage, values in self.samples.items()
+            }
+
+
+def load_sessions(path: str) -> list:
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def personalise(session: dict, n: int, today) -> list:
+    """
+    Returns the turns of the n-th replay of a session, with relative dates
+    resolved and a phone and email unique to this replay.
+    """
+    turns: list = copy.deepcopy(session["turns"])
+    for turn in turns:
+        slots: dict = turn.setdefault("slots", {})
+        for name, value in slots.items():
+            match = RELATIVE_DATE.match(value)
+            if match:
+                slots[name] = (today + timedelta(days=int(match.group(1)))).isoformat()
+        if "phone" in slots:
+            slots["phone"] = f"+1555{n:07d}"
+        if "email" in slots:
+            slots["email"] = f"{session['session']}-{n}@example.com"
+    return turns
+
+
+def seed(search: FakeOpenSearch, dynamodb: FakeDynamoResource, table_name: str,
+         cuisines, cities, per_cuisine: int) -> None:
+    """
+    Indexes per_cuisine restaurants of each cuisine, spread over the cities
+    and keyed for the Cuisine/Location index like dynamodb/yelp_api.py does.
+    """
+    import validation
+
+    cities = sorted(cities)
+    table = dynamodb.Table(table_name)
+    for cuisine in sorted(cuisines):
+        if cuisine in UNINDEXED_CUISINES:
+            continue
+        for i in range(per_cuisine):
+            restaurant_id = f"{cuisine.replace(' ', '-')}-{i}"
+            city = cities[i % len(cities)]
+            cuisine_key, location_key = validation.suggestion_key(cuisine, city)
+            table.items[restaurant_id] = {
+                "id": restaurant_id,
+                "name": f"{cuisine.title()} Place {i}",
+                "Cuisine": cuisine,
+                "Location": city,
+                "CuisineKey": cuisine_key,
+                "LocationKey": location_key,
+                "rating": 4.0 + (i % 10) / 10,
+                "location": {"display_address": [f"{i} Main St", city.title()]},
+            }
+            search.add({"id": restaurant_id, "Cuisine": cuisine}, restaurant_id)
+
+
+def materialise(dynamodb: FakeDynamoResource, table_name: str) -> None:
+    """Materialises the seeded restaurants' candidates, like table_admin.py materialise."""
+    import candidates
+    import validation
+
+    pairs: dict = {}
+    for item in dynamodb.Table(table_name).items.values():
+        pairs.setdefault(validation.suggestion_key(item["Cuisine"], item["Location"]), []).append(item)
+    table = candidates.CandidateTable(dynamodb.Table(candidates.TABLE_NAME, ("cuisine", "location")))
+    for (cuisine, location), restaurants in pairs.items():
+        table.put(cuisine, location, restaurants)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end load test of the chat pipeline.")
+    parser.add_argument("--sessions", type=int, default=200, help="sessions to replay in total")
+    parser.add_argument("--rate", type=float, default=20, help="new sessions per second")
+    parser.add_argument("--concurrency", type=int, default=8, help="users chatting at once")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between a user's turns")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every fake AWS call")
+    parser.add_argument("--batch-size", type=int, default=10, help="SQS records per lf2 invocation")
+    parser.add_argument("--batch-window-ms", type=float, default=0,
+                        help="how long the poller waits to fill a batch")
+    parser.add_argument("--pollers", type=int, default=1, help="concurrent lf2 invocations")
+    parser.add_argument("--record-concurrency", type=int, default=1,
+                        help="records each lf2 invocation handles at once")
+    parser.add_argument("--restaurants", type=int, default=20, help="indexed restaurants per cuisine")
+    parser.add_argument("--ses-rate", type=float, default=1000, help="the simulated SES send quota")
+    parser.add_argument("--no-cache", action="store_true", help="disable lf2's suggestion cache")
+    parser.add_argument("--source", choices=("opensearch", "dynamodb", "materialised", "auto"),
+                        default="opensearch",
+                        help="where lf2 looks suggestions up")
+    parser.add_argument("--sessions-file", default=SESSIONS_FILE)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    os.environ.update(ENQUEUE_MODE="sync", AWS_DEFAULT_REGION="us-east-1",
+                      NO_PROXY="127.0.0.1,localhost", SES_MAX_SEND_RATE=str(args.ses_rate),
+                      SUGGESTION_SOURCE=args.source, RECORD_CONCURRENCY=str(args.record_concurrency))
+    os.environ.pop("SUGGESTION_CACHE_TABLE", None)
+    if args.no_cache:
+        os.environ["SUGGESTION_CACHE_SIZE"] = "0"
+
+    lf0 = load_lambda("lf0")
+    lf1 = load_lambda("lf1")
+    lf2 = load_lambda("lf2")
+    # the Lambdas and this script share the layer modules on sys.path
+    import instrumentation
+    import validation
+
+    stats = Stats()
+    latency = Latency(args.latency_ms)
+
+    def collect(metrics: dict, unit: str, dimensions: list, values: dict) -> None:
+        if "Latency" in metrics:
+            stats.add(f"{values['Dependency']} {values['Operation']}", metrics["Latency"])
+        elif "QueueDelay" in metrics:
+            stats.add("QueueDelay", metrics["QueueDelay"])
+
+    instrumentation.emit = collect
+
+    current = threading.local()
+    fulfilments: dict = {}
+    fulfilments_lock = threading.Lock()
+
+    def interpret(text: str) -> tuple:
+        turn = current.turn
+        source = "FulfillmentCodeHook" if turn.get("fulfill") else "DialogCodeHook"
+        return turn["intent"], turn.get("slots", {}), source
+
+    def on_send(address: str) -> None:
+        with fulfilments_lock:
+            started = fulfilments.pop(address, None)
+        if started is not None:
+            stats.add("fulfilment", (time.perf_counter() - started) * 1000)
+
+    sqs = FakeSqs(latency)
+    dynamodb = FakeDynamoResource(latency)
+    ses = FakeSes(latency, on_send=on_send)
+    lex = FakeLex(lf1.lambda_handler, interpret, latency,
+                  on_code_hook=lambda ms: stats.add("lf1", ms))
+    search = FakeOpenSearch(latency).start()
+    seed(search, dynamodb, lf2.RestaurantTable.TABLE_NAME, validation.VALID_CUISINES,
+         validation.VALID_CITIES, args.restaurants)
+    materialise(dynamodb, lf2.RestaurantTable.TABLE_NAME)
+
+    lf0._lex = lex
+    lf1.ENQUEUE.enqueuer._client = sqs
+    lf2._dynamodb = dynamodb
+    lf2.SES._client = ses
+    lf2.CLUSTER_HOST = search.url
+
+    sessions = load_sessions(args.sessions_file)
+    today = validation.today()
+    errors: list = []
+
+    def replay(n: int, start_at: float) -> None:
+        delay = start_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        session = sessions[n % len(sessions)]
+        for turn in personalise(session, n, today):
+            current.turn = turn
+            event = {"messages": [{"type": "unstructured", "unstructured": {"text": turn["text"]}}]}
+            start = time.perf_counter()
+            if turn.get("fulfill"):
+                with fulfilments_lock:
+                    fulfilments[turn["slots"]["email"]] = start
+            try:
+                lf0.lambda_handler(event, None)
+            except Exception as err:
+                errors.append(f"turn {session['session']}#{n}: {err!r}")
+            stats.add("turn", (time.perf_counter() - start) * 1000)
+            if args.think_ms:
+                time.sleep(args.think_ms / 1000)
+
+    done = threading.Event()
+
+    def poll() -> None:
+        while not done.is_set() or len(sqs):
+            records = sqs.receive(args.batch_size, wait=0.05)
+            deadline = time.perf_counter() + args.batch_window_ms / 1000
+            while records and len(records) < args.batch_size and time.perf_counter() < deadline:
+                records += sqs.receive(args.batch_size - len(records),
+                                       wait=max(0.0, deadline - time.perf_counter()))
+            if not records:
+                continue
+            start = time.perf_counter()
+            try:
+                lf2.lambda_handler({"Records": records}, None)
+            except Exception as err:
+                errors.append(f"lf2: {err!r}")
+            stats.add("lf2 batch", (time.perf_counter() - start) * 1000)
+
+    pollers = [threading.Thread(target=poll, name=f"lf2-poller-{i}", daemon=True)
+               for i in range(args.pollers)]
+    # lf0 prints every event it handles
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        for poller in pollers:
+            poller.start()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as users:
+            for n in range(args.sessions):
+                users.submit(replay, n, started + n / args.rate)
+        chatted = time.perf_counter() - started
+        done.set()
+        for poller in pollers:
+            poller.join()
+        elapsed = time.perf_counter() - started
+    search.stop()
+
+    summary = stats.summary()
+    turns = summary.get("turn", {}).get("count", 0)
+    results: dict = {
+        "config": vars(args),
+        "elapsed_s": elapsed,
+        "sessions_per_s": args.sessions / chatted,
+        "turns_per_s": turns / chatted,
+        "enqueued": sqs.sent,
+        "deduplicated": sqs.duplicates,
+        "emails": ses.sent,
+        "unanswered": len(fulfilments),
+        "errors": len(errors),
+        "lookups": lf2.FLIGHT.stats(),
+        "stages": summary,
+    }
+
+    print(f"{args.sessions} sessions, {turns} turns in {elapsed:.2f}s: "
+          f"{results['sessions_per_s']:.1f} sessions/s, {results['turns_per_s']:.1f} turns/s")
+    print(f"{sqs.sent} enqueued ({sqs.duplicates} deduplicated), {ses.sent} emails sent, "
+          f"{len(fulfilments)} fulfilments unanswered, {len(errors)} errors")
+    print(f"lf2 lookups: {results['lookups']['unique']} unique, {results['lookups']['coalesced']} coalesced")
+    for error in errors[:5]:
+        print(f"    {error}")
+    print()
+    print(f"{'stage':<30} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, row in sorted(summary.items()):
+        print(f"{stage:<30} {row['count']:>7} {row['p50']:9.2f} {row['p95']:9.2f} "
+              f"{row['p99']:9.2f} {row['max']:9.2f}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
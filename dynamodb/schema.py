@@ -60,6 +60,14 @@ class RestaurantTable:
 
     TABLE_NAME: str = "yelp-restaurants"
 
+    # lets lf2 find restaurants for a (cuisine, location) without OpenSearch;
+    # the keys hold validation.suggestion_key values, see yelp_api.convert
+    CUISINE_LOCATION_INDEX: str = "CuisineLocationIndex"
+    CUISINE_KEY: str = "CuisineKey"
+    LOCATION_KEY: str = "LocationKey"
+    # what an email shows, see lf2's render.display_fields, and the ranking
+    INDEX_PROJECTION: list = ["name", "location", "rating", "review_count"]
+
     """Encapsulates an Amazon DynamoDB table of restaurant data."""
 
     def __init__(self, dyn_resource):
@@ -93,6 +101,154 @@ class RestaurantTable:
             self.table = table
         return exists
 
+    @classmethod
+    def cuisine_location_index(cls) -> dict:
+        """
+        The definition of the Cuisine/Location global secondary index.
+        """
+        return {
+            "IndexName": cls.CUISINE_LOCATION_INDEX,
+            "KeySchema": [
+                {"AttributeName": cls.CUISINE_KEY, "KeyType": "HASH"},
+                {"AttributeName": cls.LOCATION_KEY, "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": cls.INDEX_PROJECTION},
+        }
+
+    @classmethod
+    def attribute_definitions(cls) -> list:
+        return [
+            {"AttributeName": "id", "AttributeType": "S"},
+            {"AttributeName": cls.CUISINE_KEY, "AttributeType": "S"},
+            {"AttributeName": cls.LOCATION_KEY, "AttributeType": "S"},
+        ]
+
+    def create_table(self, table_name):
+        """
+        Creates the table, with its stream for the OpenSearch indexer and the
+        Cuisine/Location index, and waits for it to become active.
+        :param table_name: The name of the table to create.
+        :return: The newly created table.
+        """
+        try:
+            self.table = self.dyn_resource.create_table(
+                TableName=table_name,
+                KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+                AttributeDefinitions=self.attribute_definitions(),
+                GlobalSecondaryIndexes=[self.cuisine_location_index()],
+                BillingMode="PAY_PER_REQUEST",
+                StreamSpecification={"StreamEnabled": True, "StreamViewType": "NEW_AND_OLD_IMAGES"},
+            )
+            self.table.wait_until_exists()
+        except ClientError as err:
+            logger.error(
+                "Couldn't create table %s. Here's why: %s: %s", table_name,
+                err.response['Error']['Code'], err.response['Error']['Message'])
+            raise
+        return self.table
+
+    def add_cuisine_location_index(self) -> bool:
+        """
+        Adds the Cuisine/Location index to an existing table. DynamoDB builds
+        it in the background; items without both key attributes are left out.
+        :return: True when the index was added, False when it already existed.
+        """
+        if self.cuisine_location_index_status() is not None:
+            return False
+        try:
+            self.table.update(
+                AttributeDefinitions=self.attribute_definitions(),
+                GlobalSecondaryIndexUpdates=[{"Create": self.cuisine_location_index()}],
+            )
+        except ClientError as err:
+            logger.error(
+                "Couldn't add index %s to table %s. Here's why: %s: %s",
+                self.CUISINE_LOCATION_INDEX, self.table.name,
+                err.response['Error']['Code'], err.response['Error']['Message'])
+            raise
+        return True
+
+    def cuisine_location_index_status(self):
+        """
+        :return: the IndexStatus of the Cuisine/Location index, e.g. 'ACTIVE' or
+                 'CREATING', or None when the table has no such index.
+        """
+        for index in self.table.global_secondary_indexes or []:
+            if index["IndexName"] == self.CUISINE_LOCATION_INDEX:
+                return index.get("IndexStatus")
+        return None
+
+    def backfill_index_keys(self, key_function) -> int:
+        """
+        Writes the index key attributes onto items stored before they existed.
+        :param key_function: maps (Cuisine, Location) to the index keys
+        :return: The number of items updated.
+        """
+        updated: int = 0
+        kwargs: dict = {
+            "ProjectionExpression": "id, Cuisine, #loc, #ck",
+            "ExpressionAttributeNames": {"#loc": "Location", "#ck": self.CUISINE_KEY},
+        }
+        while True:
+            response = self.table.scan(**kwargs)
+            for item in response["Items"]:
+                if self.CUISINE_KEY in item or not item.get("Cuisine") or not item.get("Location"):
+                    continue
+                cuisine_key, location_key = key_function(item["Cuisine"], item["Location"])
+                self.table.update_item(
+                    Key={"id": item["id"]},
+                    UpdateExpression="SET #ck = :ck, #lk = :lk",
+                    ExpressionAttributeNames={"#ck": self.CUISINE_KEY, "#lk": self.LOCATION_KEY},
+                    ExpressionAttributeValues={":ck": cuisine_key, ":lk": location_key},
+                )
+                updated += 1
+            if "LastEvaluatedKey" not in response:
+                return updated
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def query_cuisine_location(self, cuisine_key: str, location_key: str):
+        """
+        Yields every restaurant of a (cuisine, location) pair from the
+        Cuisine/Location index, with the attributes it projects. The index is
+        eventually consistent, so items written a moment ago may be missing.
+        :param cuisine_key: the pair's keys, from validation.suggestion_key
+        """
+        kwargs: dict = {
+            "IndexName": self.CUISINE_LOCATION_INDEX,
+            "KeyConditionExpression": "#ck = :ck AND #lk = :lk",
+            "ExpressionAttributeNames": {"#ck": self.CUISINE_KEY, "#lk": self.LOCATION_KEY},
+            "ExpressionAttributeValues": {":ck": cuisine_key, ":lk": location_key},
+        }
+        while True:
+            try:
+                response = self.table.query(**kwargs)
+            except ClientError as err:
+                logger.error(
+                    "Couldn't query index %s of table %s. Here's why: %s: %s",
+                    self.CUISINE_LOCATION_INDEX, self.table.name,
+                    err.response['Error']['Code'], err.response['Error']['Message'])
+                raise
+            yield from response["Items"]
+            if "LastEvaluatedKey" not in response:
+                return
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def scan_attributes(self, attributes: list):
+        """
+        Yields every item of the table with only the named attributes.
+        :param attributes: the attribute names, reserved words included
+        """
+        kwargs: dict = {
+            "ProjectionExpression": ", ".join(f"#a{i}" for i in range(len(attributes))),
+            "ExpressionAttributeNames": {f"#a{i}": name for i, name in enumerate(attributes)},
+        }
+        while True:
+            response = self.table.scan(**kwargs)
+            yield from response["Items"]
+            if "LastEvaluatedKey" not in response:
+                return
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
     def write_batch(self, restaurants):
         """
         Fills an Amazon DynamoDB table with the specified data, using the Boto3
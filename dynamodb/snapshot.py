@@ -0,0 +1,246 @@
+"""
+Exports the yelp-restaurants table to a compressed snapshot file, and imports
+a snapshot back, so a dev or test table (e.g. DynamoDB Local) can be filled
+without calling Yelp.
+
+A snapshot holds one item per line as JSON, compressed with gzip, or with
+Zstandard when the file name ends in .zst and the zstandard package is
+installed. Export reads the table with a segmented parallel Scan; import
+streams the file through batch writers on a few threads behind a bounded
+queue, so neither holds more than a few pages of items in memory.
+
+    python dynamodb/snapshot.py export restaurants.jsonl.gz
+    python dynamodb/snapshot.py --endpoint-url http://localhost:8000 import restaurants.jsonl.gz
+"""
+import gzip
+import io
+import json
+import logging
+import queue
+import threading
+import time
+from decimal import Decimal
+from typing import Callable, Iterator, List, Optional
+
+import boto3
+import click
+
+from schema import RestaurantTable
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def open_snapshot(path: str, mode: str):
+    """
+    Opens a snapshot for reading ("r") or writing ("w") as text, compressed
+    according to its extension.
+    """
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise click.ClickException("install zstandard to use .zst snapshots, or use .gz")
+        return zstandard.open(path, mode + "t", encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    return io.open(path, mode, encoding="utf-8")
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    # the table holds no sets or binary attributes
+    raise TypeError(f"Can't snapshot a {type(value).__name__}")
+
+
+def dumps(item: dict) -> str:
+    return json.dumps(item, separators=(",", ":"), default=_json_default)
+
+
+def loads(line: str) -> dict:
+    # floats become Decimal, as the DynamoDB api requires, see yelp_api.convert
+    return json.loads(line, parse_float=Decimal)
+
+
+def resource_factory(endpoint_url: Optional[str], region: Optional[str]) -> Callable:
+    """
+    Returns a function that makes a DynamoDB resource, one per thread, as
+    resources are not thread-safe.
+    """
+    def factory():
+        return boto3.session.Session().resource("dynamodb", endpoint_url=endpoint_url, region_name=region)
+    return factory
+
+
+def scan_segments(table_factory: Callable, segments: int, pages: queue.Queue, errors: list) -> List[threading.Thread]:
+    """
+    Starts one thread per Scan segment, putting each page of items on pages
+    and _DONE when the segment is finished.
+    """
+    def scan(segment: int) -> None:
+        try:
+            table = table_factory()
+            kwargs: dict = {"Segment": segment, "TotalSegments": segments}
+            while True:
+                response = table.scan(**kwargs)
+                pages.put(response["Items"])
+                if "LastEvaluatedKey" not in response:
+                    break
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except BaseException as err:
+            logger.error("Scan segment %d failed: %s", segment, err)
+            errors.append(err)
+        finally:
+            pages.put(_DONE)
+
+    # daemons, so a failed export does not wait on scans blocked on a full queue
+    threads = [threading.Thread(target=scan, args=(segment,), name=f"scan-{segment}", daemon=True)
+               for segment in range(segments)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def export_table(table_factory: Callable, out, segments: int = 8) -> int:
+    """
+    Writes every item of a table to out, one JSON document per line.
+
+    :param table_factory: returns a Boto3 DynamoDB Table; called once per segment
+    :param out: a text file
+    :return: the number of items written
+    """
+    pages: queue.Queue = queue.Queue(maxsize=segments * 2)
+    errors: list = []
+    threads = scan_segments(table_factory, segments, pages, errors)
+    written: int = 0
+    finished: int = 0
+    while finished < segments:
+        page = pages.get()
+        if page is _DONE:
+            finished += 1
+            continue
+        for item in page:
+            out.write(dumps(item) + "\n")
+        written += len(page)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return written
+
+
+def read_items(lines) -> Iterator[dict]:
+    for line in lines:
+        if line.strip():
+            yield loads(line)
+
+
+def import_items(table_factory: Callable, items: Iterator[dict], concurrency: int = 4,
+                 chunk_size: int = 100) -> int:
+    """
+    Writes items to a table with batch writers on concurrency threads.
+
+    :param table_factory: returns a Boto3 DynamoDB Table; called once per thread
+    :param items: the items, read lazily
+    :param chunk_size: items handed to a writer thread at a time
+    :return: the number of items written
+    """
+    chunks: queue.Queue = queue.Queue(maxsize=concurrency * 2)
+    errors: list = []
+    counts: list = [0] * concurrency
+
+    def write(worker: int) -> None:
+        done: bool = False
+        try:
+            with table_factory().batch_writer() as writer:
+                while True:
+                    chunk = chunks.get()
+                    if chunk is _DONE:
+                        done = True
+                        # the batch writer flushes its last batch on the way out
+                        return
+                    if errors:
+                        continue
+                    for item in chunk:
+                        writer.put_item(Item=item)
+                    counts[worker] += len(chunk)
+        except BaseException as err:
+            logger.error("A batch write failed: %s", err)
+            errors.append(err)
+            # keep draining so the reader never blocks on a full queue
+            while not done and chunks.get() is not _DONE:
+                pass
+
+    threads = [threading.Thread(target=write, args=(worker,), name=f"write-{worker}")
+               for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        chunk: list = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                chunks.put(chunk)
+                chunk = []
+            if errors:
+                break
+        if chunk and not errors:
+            chunks.put(chunk)
+    finally:
+        for _ in threads:
+            chunks.put(_DONE)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return sum(counts)
+
+
+@click.group()
+@click.option("--endpoint-url", default=None, help="A DynamoDB endpoint, e.g. http://localhost:8000 for DynamoDB Local")
+@click.option("--region", default=None, help="The AWS region, defaults to the configured one")
+@click.pass_context
+def cli(ctx, endpoint_url: Optional[str], region: Optional[str]):
+    """Exports and imports snapshots of the yelp-restaurants table."""
+    logging.basicConfig(level=logging.INFO)
+    ctx.obj = resource_factory(endpoint_url, region)
+
+
+@cli.command("export")
+@click.argument("path")
+@click.option("--table", "-t", default=RestaurantTable.TABLE_NAME, help="The table to export")
+@click.option("--segments", "-s", default=8, help="Parallel Scan segments")
+@click.pass_obj
+def export_command(resource: Callable, path: str, table: str, segments: int):
+    """Writes every item of the table to PATH (.jsonl.gz or .jsonl.zst)."""
+    started = time.monotonic()
+    with open_snapshot(path, "w") as out:
+        written = export_table(lambda: resource().Table(table), out, segments)
+    click.echo(f"Exported {written} items from {table} to {path} in {time.monotonic() - started:.1f}s")
+
+
+@cli.command("import")
+@click.argument("path")
+@click.option("--table", "-t", default=RestaurantTable.TABLE_NAME, help="The table to fill")
+@click.option("--create/--no-create", default=True, help="Create the table, with its index, when it does not exist")
+@click.option("--concurrency", "-c", default=4, help="Batch writer threads")
+@click.pass_obj
+def import_command(resource: Callable, path: str, table: str, create: bool, concurrency: int):
+    """Writes every item of the snapshot at PATH to the table."""
+    rest_table = RestaurantTable(resource())
+    if not rest_table.exists(table):
+        if not create:
+            raise click.ClickException(f"{table} does not exist")
+        rest_table.create_table(table)
+        click.echo(f"Created {table}")
+
+    started = time.monotonic()
+    with open_snapshot(path, "r") as lines:
+        written = import_items(lambda: resource().Table(table), read_items(lines), concurrency)
+    click.echo(f"Imported {written} items from {path} into {table} in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,94 @@
+"""
+Creates and migrates the yelp-restaurants table, and the yelp-suggestions
+table of candidates materialised from it.
+
+    python dynamodb/table_admin.py create
+    python dynamodb/table_admin.py add-index
+    python dynamodb/table_admin.py create-candidates
+    python dynamodb/table_admin.py materialise
+"""
+import logging
+import os
+import sys
+
+import boto3
+import click
+
+from schema import RestaurantTable
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdas", "common"))
+
+from candidates import TABLE_NAME as CANDIDATE_TABLE_NAME, CandidateTable  # noqa: E402
+from validation import suggestion_key  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+@click.group()
+def cli():
+    """Manages the yelp-restaurants and yelp-suggestions tables."""
+    logging.basicConfig(level=logging.INFO)
+
+
+@cli.command()
+@click.option("--table", "-t", default=RestaurantTable.TABLE_NAME, help="The table to create")
+def create(table: str):
+    """Creates the table with its stream and the Cuisine/Location index."""
+    rest_table = RestaurantTable(boto3.resource("dynamodb"))
+    if rest_table.exists(table):
+        raise click.ClickException(f"{table} already exists")
+    rest_table.create_table(table)
+    click.echo(f"Created {table}")
+
+
+@cli.command("add-index")
+@click.option("--table", "-t", default=RestaurantTable.TABLE_NAME, help="The table to migrate")
+@click.option("--backfill-keys/--no-backfill-keys", default=True,
+              help="Write the index keys onto items stored before they existed")
+def add_index(table: str, backfill_keys: bool):
+    """Adds the Cuisine/Location index to an existing table."""
+    rest_table = RestaurantTable(boto3.resource("dynamodb"))
+    if not rest_table.exists(table):
+        raise click.ClickException(f"{table} does not exist")
+    if rest_table.add_cuisine_location_index():
+        click.echo(f"Adding {RestaurantTable.CUISINE_LOCATION_INDEX}, DynamoDB builds it in the background")
+    else:
+        click.echo(f"{RestaurantTable.CUISINE_LOCATION_INDEX} already exists")
+    if backfill_keys:
+        click.echo(f"Wrote the index keys onto {rest_table.backfill_index_keys(suggestion_key)} items")
+
+
+@cli.command("create-candidates")
+@click.option("--table", "-t", default=CANDIDATE_TABLE_NAME, help="The table to create")
+def create_candidates(table: str):
+    """Creates the table of materialised candidates."""
+    CandidateTable.create(boto3.resource("dynamodb"), table)
+    click.echo(f"Created {table}")
+
+
+@cli.command()
+@click.option("--table", "-t", default=RestaurantTable.TABLE_NAME, help="The table to read")
+def materialise(table: str):
+    """
+    Rebuilds the candidates of every (cuisine, location) pair from a scan of
+    the table, e.g. after creating the candidates table.
+    """
+    dynamodb = boto3.resource("dynamodb")
+    rest_table = RestaurantTable(dynamodb)
+    if not rest_table.exists(table):
+        raise click.ClickException(f"{table} does not exist")
+
+    pairs: dict = {}
+    for item in rest_table.scan_attributes(["id", "name", "location", "rating", "review_count",
+                                            "Cuisine", "Location"]):
+        if item.get("Cuisine") and item.get("Location"):
+            pairs.setdefault(suggestion_key(item["Cuisine"], item["Location"]), []).append(item)
+
+    candidate_table = CandidateTable.from_env(dynamodb)
+    for (cuisine, location), restaurants in sorted(pairs.items()):
+        written = candidate_table.put(cuisine, location, restaurants)
+        click.echo(f"{cuisine} in {location}: {len(written)} of {len(restaurants)} restaurants")
+
+
+if __name__ == "__main__":
+    cli()
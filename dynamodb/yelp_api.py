@@ -1,8 +1,11 @@
 import json
 import logging
+import os
+import sys
 import time
 from copy import deepcopy
 from datetime import datetime
+from typing import Optional
 
 from decimal import Decimal
 import click
@@ -10,6 +13,12 @@ import boto3
 
 from schema import YelpAPI, RestaurantTable
 
+# the index keys and candidates are built like lf2 reads them, with the Lambdas' shared code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdas", "common"))
+
+from candidates import CandidateTable  # noqa: E402
+from validation import suggestion_key  # noqa: E402
+
 logging = logging.getLogger(__name__)
 
 
@@ -18,13 +27,17 @@ logging = logging.getLogger(__name__)
 @click.option("--limit", "-l", default=1000)
 @click.option("--cuisine", "-c", required=True, help="The desired cuisine")
 @click.option("--location", "-loc", required=True, help="The location to search in", default="New York City")
-def main(location: str, cuisine: str, limit: int, persist: bool):
+@click.option("--materialise/--no-materialise", default=False,
+              help="After persisting, rebuild the pair's ranked candidates for lf2; needs the "
+                   "Cuisine/Location index and the candidates table, see table_admin.py")
+def main(location: str, cuisine: str, limit: int, persist: bool, materialise: bool):
     """
     Retrieves business from the Yelp API.
 
     :param location: '--location', '-loc'
     :param cuisine: '--cuisine', '-c'
     :param limit: '--limit', '-l'
+    :param materialise: '--materialise/--no-materialise'
     """
     click.echo(
         f"Querying Yelp for:\nlocation: {location}\ncuisine: {cuisine}\nlimit: {limit}")
@@ -36,18 +49,28 @@ def main(location: str, cuisine: str, limit: int, persist: bool):
 
     persisted: bool = False
     if persist:
-        persisted = persist_businesses(convert(businesses, location, cuisine))
+        converted = convert(businesses, location, cuisine)
+        # persist_businesses empties the list it is given
+        persisted = persist_businesses(list(converted))
         click.echo(f"Successfully persisted: {persisted}")
+        if persisted and materialise:
+            candidates = materialise_candidates(converted, location, cuisine)
+            if candidates is not None:
+                click.echo(f"Materialised {len(candidates)} candidates for {cuisine} in {location}")
 
     return 0 if not persist or (persist and persisted) else -1
 
 
 def convert(rest_list: list, location: str, cuisine: str) -> list:
 
+    cuisine_key, location_key = suggestion_key(cuisine, location)
+
     def mapper(item):
         item['location_ref'] = deepcopy(item['location'])
         item['Location'] = location
         item['Cuisine'] = cuisine
+        item[RestaurantTable.CUISINE_KEY] = cuisine_key
+        item[RestaurantTable.LOCATION_KEY] = location_key
         item['insertedAtTimestamp'] = str(datetime.timestamp(datetime.now()))
         return item
 
@@ -57,6 +80,37 @@ def convert(rest_list: list, location: str, cuisine: str) -> list:
     return new_list
 
 
+def materialise_candidates(biz_list: list, location: str, cuisine: str) -> Optional[list]:
+    """
+    Ranks every restaurant stored for (cuisine, location), those of earlier
+    runs found through the Cuisine/Location index as well as biz_list, and
+    writes the best of them to the candidates table. Tables not yet migrated
+    with table_admin.py are skipped with a warning, as the businesses have
+    already been persisted by then.
+
+    :return: the candidates written, or None when skipped
+    """
+    dynamodb = boto3.resource("dynamodb")
+    rest_table = RestaurantTable(dynamodb)
+    if not rest_table.exists(RestaurantTable.TABLE_NAME):
+        click.echo(f"Not materialising: {RestaurantTable.TABLE_NAME} does not exist", err=True)
+        return None
+    status = rest_table.cuisine_location_index_status()
+    if status != "ACTIVE":
+        # without the index, earlier runs' restaurants would be left out of the ranking
+        click.echo(f"Not materialising: {RestaurantTable.CUISINE_LOCATION_INDEX} is "
+                   f"{status.lower() if status else 'missing'}, see table_admin.py add-index", err=True)
+        return None
+    candidate_table = CandidateTable.from_env(dynamodb)
+    if not candidate_table.exists():
+        click.echo(f"Not materialising: {candidate_table.table.name} does not exist, "
+                   "see table_admin.py create-candidates", err=True)
+        return None
+    stored = list(rest_table.query_cuisine_location(*suggestion_key(cuisine, location)))
+    # this run's businesses last, so they replace their stored copies
+    return candidate_table.put(cuisine, location, stored + biz_list)
+
+
 def persist_businesses(biz_list: list) -> bool:
     rest_table = RestaurantTable(boto3.resource("dynamodb"))
     if not rest_table.exists(RestaurantTable.TABLE_NAME):
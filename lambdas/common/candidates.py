@@ -0,0 +1,147 @@
+"""
+Ranked suggestion candidates per (cuisine, location), materialised at ingest.
+
+The catalogue only changes when dynamodb/yelp_api.py runs, so the ingest ranks
+each (cuisine, location)'s restaurants by rating, then review count, and
+stores the best of them, with the fields an email shows, in one item of the
+candidates table. lf2 then answers a request with a single GetItem, without
+the search cluster. The table's partition key is the cuisine and its sort key
+the location, both normalised with validation.suggestion_key.
+
+Configuration (environment):
+    CANDIDATE_TABLE     the candidates table, defaults to yelp-suggestions
+"""
+import logging
+import os
+import time
+from typing import Iterable, Optional
+
+from instrumentation import span
+from lazy import lazy_import
+from validation import suggestion_key
+
+botocore_exceptions = lazy_import("botocore.exceptions")
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME: str = "yelp-suggestions"
+
+# keeps an item well under DynamoDB's 400 KB limit
+MAX_CANDIDATES: int = 50
+
+
+def candidate_fields(restaurant: dict) -> dict:
+    """
+    Picks what a candidate keeps of a restaurant record: its id, ranking and
+    the fields render.display_fields reads.
+    """
+    location = restaurant.get("location") or {}
+    return {
+        "id": restaurant["id"],
+        "name": restaurant.get("name"),
+        "location": {"display_address": location.get("display_address") or [""]},
+        "rating": restaurant.get("rating"),
+        "review_count": restaurant.get("review_count"),
+    }
+
+
+def rank_candidates(restaurants: Iterable[dict], limit: int = MAX_CANDIDATES) -> list:
+    """
+    Ranks restaurants by rating, then review count, dropping duplicate ids.
+
+    :return: the best limit candidates, best first
+    """
+    unique: dict = {}
+    for restaurant in restaurants:
+        if restaurant.get("id"):
+            unique[restaurant["id"]] = restaurant
+    ranked = sorted(unique.values(), reverse=True,
+                    key=lambda restaurant: (restaurant.get("rating") or 0, restaurant.get("review_count") or 0))
+    return [candidate_fields(restaurant) for restaurant in ranked[:limit]]
+
+
+class CandidateTable:
+    """Encapsulates the DynamoDB table of materialised candidates."""
+
+    def __init__(self, table) -> None:
+        """
+        :param table: a Boto3 DynamoDB Table with partition key 'cuisine' and sort key 'location'
+        """
+        self.table = table
+
+    @classmethod
+    def from_env(cls, dyn_resource) -> "CandidateTable":
+        """
+        :param dyn_resource: a Boto3 DynamoDB resource
+        """
+        return cls(dyn_resource.Table(os.getenv("CANDIDATE_TABLE", TABLE_NAME)))
+
+    @staticmethod
+    def create(dyn_resource, table_name: str = TABLE_NAME):
+        """
+        Creates the table and waits for it to become active.
+
+        :return: the new Boto3 DynamoDB Table
+        """
+        table = dyn_resource.create_table(
+            TableName=table_name,
+            KeySchema=[{"AttributeName": "cuisine", "KeyType": "HASH"},
+                       {"AttributeName": "location", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "cuisine", "AttributeType": "S"},
+                                  {"AttributeName": "location", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        table.wait_until_exists()
+        return table
+
+    def exists(self) -> bool:
+        """
+        :return: True when the table exists; otherwise, False.
+        """
+        try:
+            self.table.load()
+        except botocore_exceptions.ClientError as err:
+            if err.response["Error"]["Code"] == "ResourceNotFoundException":
+                return False
+            logger.error("Couldn't check for existence of %s. Here's why: %s: %s", self.table.name,
+                         err.response["Error"]["Code"], err.response["Error"]["Message"])
+            raise
+        return True
+
+    def get(self, cuisine: str, location: str) -> Optional[list]:
+        """
+        :return: the ranked candidates, or None when the pair has not been
+                 materialised or the read failed
+        """
+        cuisine, location = suggestion_key(cuisine, location)
+        try:
+            with span("DynamoDB", "GetItem"):
+                response = self.table.get_item(Key={"cuisine": cuisine, "location": location})
+        except botocore_exceptions.ClientError as err:
+            logger.error("Couldn't read the candidates for %s in %s. Here's why: %s: %s", cuisine, location,
+                         err.response["Error"]["Code"], err.response["Error"]["Message"])
+            return None
+        item = response.get("Item")
+        return item["candidates"] if item is not None else None
+
+    def put(self, cuisine: str, location: str, restaurants: Iterable[dict]) -> list:
+        """
+        Ranks a pair's restaurants and replaces its candidates with the best of them.
+
+        :param restaurants: every restaurant of the pair, as stored in yelp-restaurants
+        :return: the candidates written
+        """
+        cuisine, location = suggestion_key(cuisine, location)
+        candidates = rank_candidates(restaurants)
+        try:
+            self.table.put_item(Item={
+                "cuisine": cuisine,
+                "location": location,
+                "candidates": candidates,
+                "materialisedAt": int(time.time()),
+            })
+        except botocore_exceptions.ClientError as err:
+            logger.error("Couldn't write the candidates for %s in %s. Here's why: %s: %s", cuisine, location,
+                         err.response["Error"]["Code"], err.response["Error"]["Message"])
+            raise
+        return candidates
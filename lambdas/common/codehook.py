@@ -0,0 +1,241 @@
+"""
+A small framework for Lex code hooks, shared by every bot we run.
+
+The event is wrapped once in a version adapter (LexV1Request for the V1
+event format, LexV2Request for V2), routed through a dictionary of registered
+intent handlers, and answered through the adapter's response builders, so a
+handler reads and answers the same way whichever Lex version invoked it.
+"""
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
+
+class UnsupportedIntentError(Exception):
+    """Raised when no handler is registered for the requested intent."""
+
+
+def plain_text(content: str) -> dict:
+    return {'contentType': 'PlainText', 'content': content}
+
+
+class IntentRequest(ABC):
+    """
+    The parts of a code hook event the handlers use. Subclasses parse one
+    Lex version's event format and build responses in that version's shape.
+    """
+
+    __slots__ = ("event", "intent", "intent_name", "slots", "session_attributes",
+                 "invocation_source", "confirmation_status", "request_id")
+
+    @abstractmethod
+    def slot(self, name: str) -> Optional[str]:
+        """Returns the interpreted value of a slot, or None if it is unfilled."""
+
+    @abstractmethod
+    def set_slot(self, name: str, value: Optional[str]) -> None:
+        """Overwrites (or, with None, clears) the value of a slot."""
+
+    @abstractmethod
+    def elicit_slot(self, slot_to_elicit: str, message: dict, slots: Optional[dict] = None) -> dict:
+        pass
+
+    @abstractmethod
+    def confirm_intent(self, slots: dict, message: dict) -> dict:
+        pass
+
+    @abstractmethod
+    def close(self, fulfillment_state: str, message: dict) -> dict:
+        pass
+
+    @abstractmethod
+    def delegate(self, slots: Optional[dict] = None) -> dict:
+        pass
+
+
+class LexV1Request(IntentRequest):
+    """A Lex V1 event, where slots map directly to their values."""
+
+    __slots__ = ()
+
+    def __init__(self, event: dict) -> None:
+        self.event: dict = event
+        self.intent: dict = event.get('currentIntent') or {}
+        self.intent_name: Optional[str] = self.intent.get('name')
+        self.slots: dict = self.intent.get('slots') or {}
+        self.session_attributes: dict = event.get('sessionAttributes') or {}
+        self.invocation_source: Optional[str] = event.get('invocationSource')
+        self.confirmation_status: Optional[str] = self.intent.get('confirmationStatus')
+        self.request_id: Optional[str] = event.get('userId')
+
+    def slot(self, name: str) -> Optional[str]:
+        return self.slots.get(name)
+
+    def set_slot(self, name: str, value: Optional[str]) -> None:
+        self.slots[name] = value
+
+    def elicit_slot(self, slot_to_elicit: str, message: dict, slots: Optional[dict] = None) -> dict:
+        return {
+            'sessionAttributes': self.session_attributes,
+            'dialogAction': {
+                'type': 'ElicitSlot',
+                'intentName': self.intent_name,
+                'slots': self.slots if slots is None else slots,
+                'slotToElicit': slot_to_elicit,
+                'message': message
+            }
+        }
+
+    def confirm_intent(self, slots: dict, message: dict) -> dict:
+        return {
+            'sessionAttributes': self.session_attributes,
+            'dialogAction': {
+                'type': 'ConfirmIntent',
+                'intentName': self.intent_name,
+                'slots': slots,
+                'message': message
+            }
+        }
+
+    def close(self, fulfillment_state: str, message: dict) -> dict:
+        return {
+            'sessionAttributes': self.session_attributes,
+            'dialogAction': {
+                'type': 'Close',
+                'fulfillmentState': fulfillment_state,
+                'message': message
+            }
+        }
+
+    def delegate(self, slots: Optional[dict] = None) -> dict:
+        return {
+            'sessionAttributes': self.session_attributes,
+            'dialogAction': {
+                'type': 'Delegate',
+                'slots': self.slots if slots is None else slots
+            }
+        }
+
+
+class LexV2Request(IntentRequest):
+    """A Lex V2 event, where each slot holds a value object."""
+
+    __slots__ = ()
+
+    def __init__(self, event: dict) -> None:
+        session_state: dict = event.get('sessionState') or {}
+        self.event: dict = event
+        self.intent: dict = session_state.get('intent') or {}
+        self.intent_name: Optional[str] = self.intent.get('name')
+        self.slots: dict = self.intent.get('slots') or {}
+        self.session_attributes: dict = session_state.get('sessionAttributes') or {}
+        self.invocation_source: Optional[str] = event.get('invocationSource')
+        self.confirmation_status: Optional[str] = self.intent.get('confirmationState')
+        self.request_id: Optional[str] = session_state.get('originatingRequestId')
+
+    def slot(self, name: str) -> Optional[str]:
+        slot = self.slots.get(name)
+        if not slot:
+            return None
+        value = slot.get('value')
+        if not value:
+            return None
+        return value.get('interpretedValue')
+
+    def set_slot(self, name: str, value: Optional[str]) -> None:
+        if value is None:
+            self.slots[name] = None
+        elif self.slots.get(name):
+            self.slots[name]['value']['interpretedValue'] = value
+        else:
+            self.slots[name] = {'value': {'originalValue': value, 'interpretedValue': value,
+                                          'resolvedValues': [value]}}
+
+    def elicit_slot(self, slot_to_elicit: str, message: dict, slots: Optional[dict] = None) -> dict:
+        return {
+            'sessionState': {
+                'sessionAttributes': self.session_attributes,
+                'dialogAction': {
+                    'type': 'ElicitSlot',
+                    'slotToElicit': slot_to_elicit,
+                },
+                'intent': {
+                    'name': self.intent_name,
+                    'slots': self.slots if slots is None else slots,
+                }
+            },
+            'messages': [message]
+        }
+
+    def confirm_intent(self, slots: dict, message: dict) -> dict:
+        return {
+            'sessionState': {
+                'sessionAttributes': self.session_attributes,
+                'dialogAction': {
+                    'type': 'ConfirmIntent',
+                },
+                'intent': {
+                    'name': self.intent_name,
+                    'slots': slots,
+                }
+            },
+            'messages': [message]
+        }
+
+    def close(self, fulfillment_state: str, message: dict) -> dict:
+        return {
+            'sessionState': {
+                'sessionAttributes': self.session_attributes,
+                'dialogAction': {
+                    'type': 'Close',
+                },
+                'intent': {
+                    'name': self.intent_name,
+                    'state': fulfillment_state,
+                }
+            },
+            'messages': [message]
+        }
+
+    def delegate(self, slots: Optional[dict] = None) -> dict:
+        return {
+            'sessionState': {
+                'sessionAttributes': self.session_attributes,
+                'dialogAction': {
+                    'type': 'Delegate',
+                },
+                'intent': {
+                    'name': self.intent_name,
+                    'slots': self.slots if slots is None else slots,
+                    'state': 'ReadyForFulfillment',
+                }
+            }
+        }
+
+
+class Dispatcher:
+    """Routes code hook events to the handler registered for their intent."""
+
+    def __init__(self, request_class: type = LexV2Request) -> None:
+        """
+        :param request_class: the adapter for the bot's Lex version
+        """
+        self.request_class: type = request_class
+        self.handlers: dict = {}
+
+    def intent(self, name: str) -> Callable:
+        """
+        Registers the decorated function as the handler for an intent.
+
+        :param name: the name of the intent
+        """
+        def register(handler: Callable) -> Callable:
+            self.handlers[name] = handler
+            return handler
+        return register
+
+    def dispatch(self, event: dict) -> dict:
+        request = self.request_class(event)
+        handler = self.handlers.get(request.intent_name)
+        if handler is None:
+            raise UnsupportedIntentError(f"Intent with name {request.intent_name} not supported")
+        return handler(request)
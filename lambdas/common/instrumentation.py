@@ -0,0 +1,119 @@
+"""
+Lightweight latency instrumentation shared by every Lambda in the pipeline.
+
+Each external call is wrapped in a span, which on exit prints one CloudWatch
+Embedded Metric Format (EMF) line to stdout. CloudWatch turns these lines
+into a Latency metric with Service/Dependency/Operation dimensions, which
+can be graphed at p50/p99. The request's correlation id is written as a
+property rather than a dimension, so a single chat can be followed through
+Logs Insights without creating a metric series per request.
+
+Configuration (environment):
+    METRICS_NAMESPACE   the CloudWatch namespace, defaults to DiningConcierge
+    METRICS_DISABLED    set to "true" to stop emitting metrics
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from uuid import uuid4
+
+NAMESPACE: str = os.getenv("METRICS_NAMESPACE", "DiningConcierge")
+SERVICE: str = os.getenv("AWS_LAMBDA_FUNCTION_NAME", "local")
+ENABLED: bool = os.getenv("METRICS_DISABLED", "false").lower() != "true"
+
+SPAN_DIMENSIONS: list = [["Service", "Dependency", "Operation"], ["Service", "Dependency"]]
+COUNT_DIMENSIONS: list = [["Service"]]
+
+_correlation_id: ContextVar = ContextVar("correlation_id", default=None)
+
+
+def new_correlation_id() -> str:
+    return uuid4().hex
+
+
+def set_correlation_id(correlation_id: Optional[str]) -> None:
+    """Sets the correlation id reported by spans in the current context."""
+    _correlation_id.set(correlation_id)
+
+
+def get_correlation_id() -> Optional[str]:
+    return _correlation_id.get()
+
+
+def emit(metrics: dict, unit: str, dimensions: list, values: dict) -> None:
+    """
+    Prints one EMF line.
+
+    :param metrics: maps each metric name to its value
+    :param unit: the CloudWatch unit of the metrics
+    :param dimensions: the EMF dimension sets
+    :param values: the dimension values and any extra properties
+    """
+    if not ENABLED:
+        return
+    document: dict = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": dimensions,
+                "Metrics": [{"Name": name, "Unit": unit} for name in metrics],
+            }],
+        },
+        "Service": SERVICE,
+        **values,
+        **metrics,
+    }
+    sys.stdout.write(json.dumps(document, separators=(",", ":"), default=str) + "\n")
+
+
+@contextmanager
+def span(dependency: str, operation: str, correlation_id: Optional[str] = None):
+    """
+    Times the enclosed call to an external dependency.
+
+        with span("SQS", "SendMessageBatch"):
+            client.send_message_batch(...)
+
+    :param dependency: the service called, e.g. "OpenSearch"
+    :param operation: the call made, e.g. "Search"
+    :param correlation_id: overrides the context's correlation id
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        emit(
+            {"Latency": (time.perf_counter() - start) * 1000},
+            "Milliseconds",
+            SPAN_DIMENSIONS,
+            {
+                "Dependency": dependency,
+                "Operation": operation,
+                "Status": status,
+                "CorrelationId": correlation_id or _correlation_id.get(),
+            },
+        )
+
+
+def emit_counts(counts: dict) -> None:
+    """
+    Emits counters, e.g. cache hits, as Count metrics for this service.
+    """
+    emit(counts, "Count", COUNT_DIMENSIONS, {})
+
+
+def emit_duration(name: str, milliseconds: float, correlation_id: Optional[str] = None) -> None:
+    """
+    Emits a duration measured outside a span, e.g. the time a message waited in SQS.
+    """
+    emit({name: milliseconds}, "Milliseconds", COUNT_DIMENSIONS,
+         {"CorrelationId": correlation_id or _correlation_id.get()})
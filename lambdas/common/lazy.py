@@ -0,0 +1,48 @@
+"""
+Deferred imports for heavy dependencies.
+
+boto3 alone takes a few hundred milliseconds to import, which is paid on
+every cold start even when the invocation never calls AWS (e.g. lf1 dialog
+turns). lazy_import returns the module immediately but only executes it on
+first attribute access:
+
+    boto3 = lazy_import("boto3")
+    ...
+    boto3.client("sqs")  # the import happens here
+"""
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+
+
+class _DeferredModule(ModuleType):
+    """
+    Stands in for a module until one of its attributes is read, then imports
+    it. importlib.util.LazyLoader is not used as, before Python 3.12, a thread
+    reading an attribute while another is executing the module can see it
+    half-initialised; the regular import system makes concurrent importers wait.
+    """
+
+    def __getattr__(self, attr: str):
+        # only reached for attributes not copied from the module yet
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Returns a module that is imported on first attribute access.
+
+    :param name: the absolute module name, e.g. "botocore.exceptions"
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    # finding a submodule's spec would import its parent package, so only
+    # the top-level package is checked for now
+    package = name.partition(".")[0]
+    if importlib.util.find_spec(package) is None:
+        raise ModuleNotFoundError(f"No module named {package!r}", name=package)
+    return _DeferredModule(name)
@@ -0,0 +1,145 @@
+"""
+The dining request exchanged between lf1 and lf2 over SQS.
+
+Requests are carried in the message body as compact, versioned JSON, e.g.
+
+    {"v":1,"l":"new york","c":"italian","d":"2023-03-02","t":"19:00","n":4,"p":"...","e":"..."}
+
+Messages written before the schema existed carried each field as its own
+MessageAttribute; decode_record still accepts those during the rollout.
+
+The modules in lambdas/common are shipped to every Lambda as a layer, so they
+are imported as top-level modules.
+"""
+import hashlib
+import json
+import time
+from typing import Optional
+
+SCHEMA_VERSION: int = 1
+
+FIELDS: tuple = ("location", "cuisine", "date", "time", "count", "phone", "email")
+
+_SHORT_KEYS: dict = {
+    "location": "l",
+    "cuisine": "c",
+    "date": "d",
+    "time": "t",
+    "count": "n",
+    "phone": "p",
+    "email": "e",
+    # not part of FIELDS: it traces a request and must not affect deduplication
+    "correlation_id": "i",
+}
+_LONG_KEYS: dict = {short: name for name, short in _SHORT_KEYS.items()}
+
+
+class RequestDecodeError(ValueError):
+    """Raised when an SQS record holds neither a compact nor a legacy request."""
+
+
+def encode_request(request: dict) -> str:
+    """
+    Serialises a request into the compact message body.
+
+    :param request: a dict with the keys in FIELDS
+    """
+    payload: dict = {"v": SCHEMA_VERSION}
+    for name, value in request.items():
+        if value is not None:
+            payload[_SHORT_KEYS.get(name, name)] = value
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def decode_body(body: str) -> Optional[dict]:
+    """
+    Parses a compact message body.
+
+    :return: the request, or None if the body is not a compact request
+    """
+    if not body or body[0] != "{":
+        return None
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict) or "v" not in payload:
+        return None
+    if payload["v"] > SCHEMA_VERSION:
+        raise RequestDecodeError(f"unsupported request schema version {payload['v']}")
+    return {_LONG_KEYS.get(key, key): value for key, value in payload.items() if key != "v"}
+
+
+def decode_attributes(attributes: dict) -> dict:
+    """
+    Parses the legacy one-attribute-per-field format as delivered to a
+    Lambda SQS event source.
+    """
+    try:
+        request: dict = {name: attributes[name]["stringValue"] for name in FIELDS}
+    except KeyError as err:
+        raise RequestDecodeError(f"missing message attribute {err}") from None
+    request["count"] = int(request["count"])
+    return request
+
+
+def decode_record(record: dict) -> dict:
+    """
+    Extracts the request from an SQS event record in either format.
+
+    :param record: a record from a Lambda SQS event
+    """
+    request = decode_body(record.get("body", ""))
+    if request is not None:
+        return request
+    return decode_attributes(record.get("messageAttributes") or {})
+
+
+def legacy_attributes(request: dict) -> dict:
+    """
+    Builds the legacy MessageAttributes for a request, for dual-writing while
+    consumers that only understand attributes are still deployed.
+    """
+    return {
+        name: {
+            "DataType": "Number" if name == "count" else "String",
+            "StringValue": str(request[name]),
+        }
+        for name in FIELDS
+    }
+
+
+def _normalise(value) -> str:
+    return " ".join(str(value).lower().split())
+
+
+def deduplication_id(request: dict, window_seconds: int = 300, now: Optional[float] = None) -> str:
+    """
+    Derives a FIFO deduplication id from the request contents, so retries and
+    double-submits of the same request within one time window are dropped by
+    SQS instead of being processed twice by lf2.
+
+    Windows are aligned to multiples of window_seconds, so two identical
+    submissions that straddle a boundary are still both delivered.
+
+    :param request: a dict with the keys in FIELDS
+    :param window_seconds: the length of the deduplication window
+    :param now: the current epoch time, defaults to time.time()
+    """
+    window = int((time.time() if now is None else now) // window_seconds)
+    content = "\x1f".join(_normalise(request.get(name, "")) for name in FIELDS)
+    return hashlib.sha256(f"{window}\x1f{content}".encode()).hexdigest()
+
+
+def group_id(request: dict, fallback: Optional[str] = None) -> str:
+    """
+    Derives a FIFO message group per user: one user's requests stay in order,
+    while different users' requests can be consumed in parallel.
+
+    :param request: a dict with the keys in FIELDS
+    :param fallback: used when the request identifies no user
+    """
+    user = request.get("email") or request.get("phone")
+    if not user:
+        return fallback or "anonymous"
+    return hashlib.sha256(_normalise(user).encode()).hexdigest()[:32]
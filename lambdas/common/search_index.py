@@ -0,0 +1,99 @@
+"""
+The definition of the restaurants search index, shared by everything that
+writes to or reads from it.
+
+Readers and writers address the index through the INDEX_ALIAS alias, which
+points at one versioned index ("restaurants-v1", "restaurants-v2", ...), so an
+index can be rebuilt with a new mapping and swapped in without downtime.
+Every document is built from a DynamoDB restaurant item by build_document,
+whether it arrives through the table's stream or a full backfill.
+"""
+from decimal import Decimal
+from typing import Optional
+
+INDEX_ALIAS: str = "restaurants"
+
+INDEX_SETTINGS: dict = {
+    "number_of_shards": 1,
+    "number_of_replicas": 1,
+    "refresh_interval": "1s",
+    "analysis": {
+        "normalizer": {
+            "lowercase": {"type": "custom", "filter": ["lowercase", "asciifolding"]},
+        },
+    },
+}
+
+# only these fields are indexed, the rest of a document is kept in _source
+INDEX_MAPPINGS: dict = {
+    "dynamic": False,
+    "properties": {
+        "id": {"type": "keyword"},
+        "Cuisine": {"type": "keyword", "normalizer": "lowercase"},
+        "Location": {"type": "keyword", "normalizer": "lowercase"},
+        "coordinates": {"type": "geo_point"},
+        "rating": {"type": "float"},
+        "review_count": {"type": "integer"},
+    },
+}
+
+
+# the item attributes build_document reads; a change to any other attribute
+# leaves a restaurant's document as it was
+INDEXED_ATTRIBUTES: tuple = ("id", "Cuisine", "Location", "rating", "review_count", "coordinates")
+
+
+def versioned_name(version: int) -> str:
+    return f"{INDEX_ALIAS}-v{version}"
+
+
+def build_document(item: dict) -> Optional[dict]:
+    """
+    Builds the search document for a restaurant.
+
+    :param item: the restaurant as stored in DynamoDB, e.g. from a Scan or a
+                 deserialised stream image
+    :return: the document, or None when the item has no id
+    """
+    if not item.get("id"):
+        return None
+    document: dict = {"id": item["id"]}
+    for field in ("Cuisine", "Location"):
+        if item.get(field):
+            document[field] = item[field]
+    if item.get("rating") is not None:
+        document["rating"] = float(item["rating"])
+    if item.get("review_count") is not None:
+        document["review_count"] = int(item["review_count"])
+    coordinates = item.get("coordinates") or {}
+    if coordinates.get("latitude") is not None and coordinates.get("longitude") is not None:
+        document["coordinates"] = {"lat": float(coordinates["latitude"]),
+                                   "lon": float(coordinates["longitude"])}
+    return document
+
+
+def deserialise_image(image: dict) -> dict:
+    """
+    Converts a DynamoDB stream image, whose values are typed ({"S": "..."}),
+    into a plain item. Numbers become Decimal, as boto3 would return them.
+    """
+    return {name: _attribute(value) for name, value in image.items()}
+
+
+def _attribute(value: dict):
+    (kind, data), = value.items()
+    if kind in ("S", "B", "BOOL"):
+        return data
+    if kind == "N":
+        return Decimal(data)
+    if kind == "NULL":
+        return None
+    if kind == "M":
+        return deserialise_image(data)
+    if kind == "L":
+        return [_attribute(element) for element in data]
+    if kind == "SS" or kind == "BS":
+        return set(data)
+    if kind == "NS":
+        return {Decimal(number) for number in data}
+    raise ValueError(f"unknown DynamoDB attribute type {kind}")
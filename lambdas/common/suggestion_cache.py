@@ -0,0 +1,195 @@
+"""
+A two-tier cache of suggestion candidates keyed by (cuisine, location).
+
+The first tier is an in-process LRU with a short TTL that survives across warm
+invocations of one container. The optional second tier is a DynamoDB table
+shared by every container, with a DynamoDB TTL attribute; its partition key is
+the cuisine and its sort key the location, so every entry for a cuisine can be
+invalidated by the ddb-to-opensearch stream handler when a restaurant changes.
+
+Configuration (environment):
+    SUGGESTION_CACHE_TABLE      the shared tier's table; the tier is off when unset
+    SUGGESTION_CACHE_SIZE       entries kept in the in-process tier
+    SUGGESTION_CACHE_TTL        seconds an in-process entry lives
+    SUGGESTION_CACHE_SHARED_TTL seconds a shared entry lives
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from lazy import lazy_import
+from validation import suggestion_key
+
+botocore_exceptions = lazy_import("botocore.exceptions")
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(cuisine: str, location: str) -> Tuple[str, str]:
+    """
+    Normalises a (cuisine, location) pair so that aliases such as
+    "New York City" and "nyc" share an entry.
+    """
+    return suggestion_key(cuisine, location)
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60) -> None:
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self.entries: OrderedDict = OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, predicate) -> None:
+        """Drops every entry whose key satisfies predicate."""
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+
+class DynamoCacheTier:
+    """The shared cache tier, stored in a DynamoDB table with a TTL attribute."""
+
+    TTL_ATTRIBUTE: str = "expiresAt"
+
+    def __init__(self, table, ttl: int = 3600) -> None:
+        """
+        :param table: a Boto3 DynamoDB Table with partition key 'cuisine' and sort key 'location'
+        :param ttl: seconds an entry lives
+        """
+        self.table = table
+        self.ttl: int = ttl
+
+    def get(self, key: Tuple[str, str]) -> Optional[list]:
+        cuisine, location = key
+        try:
+            response = self.table.get_item(Key={"cuisine": cuisine, "location": location})
+        except botocore_exceptions.ClientError as err:
+            logger.warning("Couldn't read cache entry %s. Here's why: %s: %s", key,
+                           err.response["Error"]["Code"], err.response["Error"]["Message"])
+            return None
+        item = response.get("Item")
+        # DynamoDB deletes expired items lazily, so check the expiry ourselves
+        if item is None or item[self.TTL_ATTRIBUTE] < time.time():
+            return None
+        return item["records"]
+
+    def put(self, key: Tuple[str, str], records: list) -> None:
+        cuisine, location = key
+        try:
+            self.table.put_item(Item={
+                "cuisine": cuisine,
+                "location": location,
+                "records": records,
+                self.TTL_ATTRIBUTE: int(time.time()) + self.ttl,
+            })
+        except botocore_exceptions.ClientError as err:
+            logger.warning("Couldn't write cache entry %s. Here's why: %s: %s", key,
+                           err.response["Error"]["Code"], err.response["Error"]["Message"])
+
+    def invalidate_cuisine(self, cuisine: str) -> int:
+        """
+        Deletes every entry for a cuisine.
+
+        :return: the number of entries deleted
+        """
+        deleted: int = 0
+        kwargs: dict = {
+            "KeyConditionExpression": "cuisine = :cuisine",
+            "ExpressionAttributeValues": {":cuisine": cuisine},
+            "ProjectionExpression": "cuisine, #loc",
+            "ExpressionAttributeNames": {"#loc": "location"},
+        }
+        while True:
+            response = self.table.query(**kwargs)
+            with self.table.batch_writer() as writer:
+                for item in response["Items"]:
+                    writer.delete_item(Key={"cuisine": item["cuisine"], "location": item["location"]})
+                    deleted += 1
+            if "LastEvaluatedKey" not in response:
+                return deleted
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+class SuggestionCache:
+    """Looks candidates up in the in-process tier, then the shared tier."""
+
+    def __init__(self, local: TTLCache, shared: Optional[DynamoCacheTier] = None) -> None:
+        self.local: TTLCache = local
+        self.shared: Optional[DynamoCacheTier] = shared
+        self.counters: dict = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+        self.counters_lock: threading.Lock = threading.Lock()
+
+    def _count(self, counter: str) -> None:
+        with self.counters_lock:
+            self.counters[counter] += 1
+
+    @classmethod
+    def from_env(cls, dyn_resource=None) -> "SuggestionCache":
+        """
+        :param dyn_resource: a Boto3 DynamoDB resource, required for the shared tier
+        """
+        local = TTLCache(int(os.getenv("SUGGESTION_CACHE_SIZE", "256")),
+                         float(os.getenv("SUGGESTION_CACHE_TTL", "60")))
+        shared = None
+        table_name = os.getenv("SUGGESTION_CACHE_TABLE")
+        if table_name and dyn_resource is not None:
+            shared = DynamoCacheTier(dyn_resource.Table(table_name),
+                                     int(os.getenv("SUGGESTION_CACHE_SHARED_TTL", "3600")))
+        return cls(local, shared)
+
+    def get(self, cuisine: str, location: str) -> Optional[list]:
+        key = cache_key(cuisine, location)
+        records = self.local.get(key)
+        if records is not None:
+            self._count("local_hits")
+            return records
+        if self.shared is not None:
+            records = self.shared.get(key)
+            if records is not None:
+                self._count("shared_hits")
+                self.local.put(key, records)
+                return records
+        self._count("misses")
+        return None
+
+    def put(self, cuisine: str, location: str, records: list) -> None:
+        key = cache_key(cuisine, location)
+        self.local.put(key, records)
+        if self.shared is not None:
+            self.shared.put(key, records)
+
+    def invalidate_cuisine(self, cuisine: str) -> None:
+        cuisine = cache_key(cuisine, "")[0]
+        self.local.invalidate(lambda key: key[0] == cuisine)
+        if self.shared is not None:
+            self.shared.invalidate_cuisine(cuisine)
+
+    def stats(self) -> dict:
+        """Returns the hit and miss counters since the container started."""
+        with self.counters_lock:
+            return dict(self.counters)
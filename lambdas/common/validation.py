@@ -0,0 +1,155 @@
+"""
+Precompiled lookup tables and parsers used to validate code hook slots.
+
+Everything in this module is built once at import time, so a warm container
+only pays for a dictionary lookup per slot on each dialog turn.
+"""
+import datetime
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+
+# users are treated as being in New York unless told otherwise
+TIMEZONE: ZoneInfo = ZoneInfo("America/New_York")
+
+
+VALID_CITIES: frozenset = frozenset([
+    'new york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio',
+    'san diego', 'dallas', 'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis',
+    'columbus', 'fort worth', 'charlotte', 'detroit', 'el paso', 'seattle', 'denver', 'washington dc',
+    'memphis', 'boston', 'nashville', 'baltimore', 'portland',
+])
+
+VALID_CUISINES: frozenset = frozenset([
+    'vegetarian', 'seafood', 'indian', 'chinese', 'american', 'italian', 'japanese',
+    'mexican', 'mediterranean', 'vegan', 'chicken', 'steak', 'noodles', 'fast food', 'deli',
+    'convenience', 'sandwiches', 'desserts', 'burgers', 'salad', 'coffee', 'thai', 'brazilian',
+])
+
+CITY_ALIASES: dict = {
+    'nyc': 'new york',
+    'ny': 'new york',
+    'new york city': 'new york',
+    'manhattan': 'new york',
+    'brooklyn': 'new york',
+    'queens': 'new york',
+    'bronx': 'new york',
+    'the bronx': 'new york',
+    'staten island': 'new york',
+    'la': 'los angeles',
+    'sf': 'san francisco',
+    'philly': 'philadelphia',
+    'dc': 'washington dc',
+    'washington': 'washington dc',
+    'washington d.c.': 'washington dc',
+}
+
+CUISINE_ALIASES: dict = {
+    'veggie': 'vegetarian',
+    'sushi': 'japanese',
+    'burger': 'burgers',
+    'sandwich': 'sandwiches',
+    'dessert': 'desserts',
+    'noodle': 'noodles',
+    'steakhouse': 'steak',
+    'fastfood': 'fast food',
+    'cafe': 'coffee',
+}
+
+
+def _build_lookup(canonical: frozenset, aliases: dict) -> dict:
+    """
+    Builds a single dictionary mapping every accepted spelling, canonical
+    or alias, to its canonical value.
+    """
+    lookup: dict = {value: value for value in canonical}
+    for alias, value in aliases.items():
+        if value not in canonical:
+            raise ValueError(f"alias {alias} maps to unknown value {value}")
+        lookup[alias] = value
+    return lookup
+
+
+CITY_LOOKUP: dict = _build_lookup(VALID_CITIES, CITY_ALIASES)
+CUISINE_LOOKUP: dict = _build_lookup(VALID_CUISINES, CUISINE_ALIASES)
+
+
+def normalise(value: str) -> str:
+    """
+    Lower-cases a value and collapses any runs of whitespace.
+    """
+    return " ".join(value.lower().split())
+
+
+def normalise_city(city: str) -> Optional[str]:
+    """
+    Returns the canonical name of a supported city, or None if unsupported.
+
+    :param city: the city as entered by the user
+    """
+    return CITY_LOOKUP.get(normalise(city))
+
+
+def normalise_cuisine(cuisine: str) -> Optional[str]:
+    """
+    Returns the canonical name of a supported cuisine, or None if unsupported.
+
+    :param cuisine: the cuisine as entered by the user
+    """
+    return CUISINE_LOOKUP.get(normalise(cuisine))
+
+
+def suggestion_key(cuisine: str, location: str) -> Tuple[str, str]:
+    """
+    Normalises a (cuisine, location) pair the same way everywhere it is used
+    as a key, so that aliases such as "New York City" and "nyc" match.
+    Unsupported values are only normalised, not rejected.
+    """
+    cuisine = normalise(cuisine)
+    location = normalise(location)
+    return CUISINE_LOOKUP.get(cuisine, cuisine), CITY_LOOKUP.get(location, location)
+
+
+def isvalid_city(city: str) -> bool:
+    return normalise_city(city) is not None
+
+
+def isvalid_cuisine(cuisine: str) -> bool:
+    return normalise_cuisine(cuisine) is not None
+
+
+def parse_date(date: str) -> Optional[datetime.date]:
+    """
+    Parses a Lex date slot. Lex always resolves dates to ISO-8601
+    (YYYY-MM-DD), so a single fromisoformat call is all that's needed.
+
+    :param date: the interpreted value of a date slot
+    :return: the parsed date, or None if it could not be parsed
+    """
+    try:
+        return datetime.date.fromisoformat(date)
+    except (TypeError, ValueError):
+        return None
+
+
+def today(tz: datetime.tzinfo = TIMEZONE) -> datetime.date:
+    """
+    Returns the current date in tz, without touching the process timezone.
+    """
+    return datetime.datetime.now(tz).date()
+
+
+def safe_int(n):
+    """
+    Safely convert n value to int.
+    """
+    if n is not None:
+        return int(n)
+    return n
+
+
+def build_validation_result(isvalid, violated_slot, message_content):
+    return {
+        'isValid': isvalid,
+        'violatedSlot': violated_slot,
+        'message': {'contentType': 'PlainText', 'content': message_content}
+    }
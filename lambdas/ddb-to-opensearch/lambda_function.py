@@ -1,64 +1,156 @@
-import boto3
 import requests
+import logging
 import os
 from requests.auth import HTTPBasicAuth
 
+from candidates import candidate_fields
+from instrumentation import emit_counts, set_correlation_id, span
+from lazy import lazy_import
+from search_index import INDEX_ALIAS, build_document, deserialise_image
+from suggestion_cache import SuggestionCache
+
+# boto3 is only needed to invalidate the shared suggestion cache
+boto3 = lazy_import("boto3")
+
+logger = logging.getLogger(__name__)
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
+
 region: str = "us-east-1"
 service: str = "es"
 
 basicauth = HTTPBasicAuth(os.getenv("OS_USER"), os.getenv("OS_PASSWORD"))
 
 host: str = "https://search-csgy9223a-hw1-dining-wt7iphrqwwnp6pzz4i37djulsq.us-east-1.es.amazonaws.com"
-index: str = "restaurants"
+index: str = INDEX_ALIAS
 datatype: str = "_doc"
 url: str = host + "/" + index + "/" + datatype + "/"
 
 headers: dict = {"Content-Type": "application/json"}
 
+_cache = None
+
+
+def get_cache() -> SuggestionCache:
+    """
+    The suggestion cache whose shared tier is invalidated when restaurants
+    change. Without SUGGESTION_CACHE_TABLE there is nothing to invalidate.
+    """
+    global _cache
+    if _cache is None:
+        _cache = SuggestionCache.from_env(boto3.resource("dynamodb"))
+    return _cache
+
 
 def try_old_image(record):
     try:
         return record['dynamodb']['OldImage']['Cuisine']['S']
     except:
-        print(f"OldImage failed for {record}")
+        logger.debug("No old Cuisine in record %s", record.get('eventID'))
         return None
 
 
+def parse_record(record):
+    """
+    Extracts the restaurant id and cuisines from a stream record.
+
+    :param record: a record from a DynamoDB stream event
+    :return: (id, cuisine, old cuisine); id is None when the record has no
+             key, and the old cuisine is only read for MODIFY events
+    """
+    id = None
+    cuisine = None
+    try:
+        id: str = record['dynamodb']['Keys']['id']['S']
+    except:
+        logger.warning("Unable to parse the id of record %s", record.get('eventID'))
+
+    try:
+        cuisine: str = record['dynamodb']['NewImage']['Cuisine']['S']
+    except Exception:
+        logger.debug("No new Cuisine in record %s", record.get('eventID'))
+        cuisine = try_old_image(record)
+
+    old_cuisine = try_old_image(record) if id and record['eventName'] == 'MODIFY' else None
+    return id, cuisine, old_cuisine
+
+
+# event_filter.json keeps Lambda from being invoked for records that are not
+# restaurants (INSERTs and MODIFYs with no Cuisine in either image), but an
+# event filter matches each image against fixed patterns and cannot compare
+# the old image with the new one, so MODIFYs that change no indexed field can
+# only be dropped here.
+def compare_images(record, item, document):
+    """
+    Works out what a MODIFY changed, from its old and new images.
+
+    :param item: the deserialised new image, with its id
+    :param document: the search document built from the new image
+    :return: (whether the search document changed, whether the fields a
+             suggestion shows changed); both True when there is no old image
+    """
+    old_image = record['dynamodb'].get('OldImage')
+    if record['eventName'] != 'MODIFY' or not old_image:
+        return True, True
+    old_item = dict(deserialise_image(old_image), id=item['id'])
+    # the new document falls back to the old cuisine in the same way
+    old_document = build_document(dict(old_item, Cuisine=old_item.get('Cuisine') or document.get('Cuisine')))
+    reindex = old_document != document
+    return reindex, reindex or candidate_fields(old_item) != candidate_fields(item)
+
+
 def lambda_handler(event, context):
-    print(f"event:\n{event}")
+    # records hold whole restaurant images, so only their ids are logged
+    logger.debug("%d record(s)", len(event['Records']))
     deleted: int = 0
     inserted: int = 0
+    skipped: int = 0
+    changed_cuisines: set = set()
     for record in event['Records']:
-        print(f"record: {record}")
-        id = None
-        cuisine = None
-        try:
-            id: str = record['dynamodb']['Keys']['id']['S']
-        except:
-            print(f"Unable to parse id from record\n{record}")
-
-        try:
-            cuisine: str = record['dynamodb']['NewImage']['Cuisine']['S']
-        except Exception as e:
-            print(f"unable to parse cusine, e {e}")
-            cuisine = try_old_image(record)
-
+        logger.debug("record %s: %s", record.get('eventID'), record.get('eventName'))
+        id, cuisine, old_cuisine = parse_record(record)
         if not id:
             continue
 
+        set_correlation_id(record.get('eventID'))
+        reindex = refresh = True
+        if record['eventName'] != 'REMOVE':
+            item = dict(deserialise_image(record['dynamodb'].get('NewImage') or {}), id=id)
+            document = build_document(dict(item, Cuisine=cuisine))
+            reindex, refresh = compare_images(record, item, document)
+
+        # cached suggestions show more than is indexed, e.g. the name
+        if refresh:
+            if cuisine:
+                changed_cuisines.add(cuisine)
+            if old_cuisine:
+                changed_cuisines.add(old_cuisine)
+
+        if not reindex:
+            # e.g. a refresh that only moved insertedAtTimestamp
+            skipped += 1
+            continue
+
         if record['eventName'] == 'REMOVE':
-            r = requests.delete(url + id, auth=basicauth)
+            with span("OpenSearch", "Delete"):
+                r = requests.delete(url + id, auth=basicauth)
             deleted += 1
             if r.status_code != 200:
-                print(f"{r.status_code} status returned from DEL {url + id}")
+                logger.error("Couldn't delete document %s. Here's why: %s", id, r.status_code)
 
         else:
-            # for each added restaurant, update our index with its ID and cuisine
-            document = {"id": id, "Cuisine": cuisine}
-            r = requests.post(url, json=document,
-                              headers=headers, auth=basicauth)
+            # the restaurant id is the document id, so an update overwrites
+            # the previous version and a REMOVE can find it
+            with span("OpenSearch", "Index"):
+                r = requests.put(url + id, json=document,
+                                 headers=headers, auth=basicauth)
             inserted += 1
-            if r.status_code != 200:
-                print(f"{r.status_code} returned from POST {url} - json: {document}")
+            if r.status_code not in (200, 201):
+                logger.error("Couldn't index document %s. Here's why: %s", id, r.status_code)
+
+    if changed_cuisines and os.getenv("SUGGESTION_CACHE_TABLE"):
+        cache = get_cache()
+        for changed in changed_cuisines:
+            cache.invalidate_cuisine(changed)
 
-    return f"inserted {inserted}, deleted: {deleted}"
+    emit_counts({"DocumentsWritten": inserted, "DocumentsDeleted": deleted, "DocumentsSkipped": skipped})
+    return f"inserted {inserted}, deleted: {deleted}, skipped: {skipped}"
@@ -3,6 +3,10 @@ from datetime import datetime
 from uuid import uuid4
 import boto3
 
+from instrumentation import new_correlation_id, span
+
+_lex = None
+
 
 def create_error(code: int, message: str) -> dict:
     return dict(
@@ -61,19 +65,34 @@ def parse_response(response: dict):
         return [message]
 
 
+def get_lex_client():
+    """
+    Returns the Lex runtime client, created once per container so warm
+    invocations reuse its connection pool.
+    """
+    global _lex
+    if _lex is None:
+        _lex = boto3.client('lexv2-runtime')
+    return _lex
+
+
 def post_to_bot(event):
-    client = boto3.client('lexv2-runtime')
+    client = get_lex_client()
 
     msg: str = event['messages'][0]['unstructured']['text']
     print(f"Parsed message: {msg}")
 
-    response = client.recognize_text(
-        botId='EZOWQCMXTB',
-        botAliasId='49P3WS4KR0',
-        localeId='en_US',
-        sessionId='testsession',
-        text=msg,
-    )
+    # the code hook receives requestAttributes, which carries the id down the pipeline
+    correlation_id: str = new_correlation_id()
+    with span("Lex", "RecognizeText", correlation_id=correlation_id):
+        response = client.recognize_text(
+            botId='EZOWQCMXTB',
+            botAliasId='49P3WS4KR0',
+            localeId='en_US',
+            sessionId='testsession',
+            text=msg,
+            requestAttributes={'correlationId': correlation_id},
+        )
     print(f"received response from lex: {response}")
 
     return parse_response(response)
@@ -0,0 +1,263 @@
+"""
+Batched SQS enqueue for lf1 fulfillment.
+
+Messages are buffered during an invocation and sent with SendMessageBatch.
+In "deferred" mode the buffer is handed to an internal Lambda extension
+thread, which flushes it after the runtime has already returned the response
+to Lex, so the SQS round trip is no longer part of the user-facing latency.
+
+Configuration (environment):
+    SQS_QUEUE_URL   the queue to send to
+    SQS_REGION      the queue's region (defaults to AWS_REGION)
+    ENQUEUE_MODE    "sync" (default) or "deferred"
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import List, Optional
+
+from instrumentation import span
+from lazy import lazy_import
+
+# boto3 is only loaded by the first flush, dialog turns never pay for it, and
+# urllib.request only when the deferred-mode extension registers
+boto3 = lazy_import("boto3")
+botocore_exceptions = lazy_import("botocore.exceptions")
+urllib_request = lazy_import("urllib.request")
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_URL: str = "https://sqs.us-east-1.amazonaws.com/979351636556/YelpRestaurants.fifo"
+DEFAULT_REGION: str = "us-east-1"
+EXTENSION_NAME: str = "lf1-enqueue"
+
+
+def describe(entries: list) -> list:
+    """
+    Identifies entries in logs by their deduplication ids, a hash of the
+    request, as the bodies hold the user's phone number and email.
+    """
+    return [entry.get("MessageDeduplicationId") for entry in entries]
+
+
+class EnqueueError(RuntimeError):
+    """Raised when buffered messages could not be sent."""
+
+    def __init__(self, entries: list) -> None:
+        super().__init__(f"{len(entries)} message(s) could not be sent")
+        self.entries: list = entries
+
+
+class SqsEnqueuer:
+    """Buffers SQS message entries and sends them in batches of up to ten."""
+
+    MAX_BATCH: int = 10
+
+    def __init__(self, queue_url: str, region: str, max_attempts: int = 3,
+                 base_delay: float = 0.05, client=None) -> None:
+        """
+        :param queue_url: the URL of the queue to send to
+        :param region: the region the queue lives in
+        :param max_attempts: attempts per batch before entries are dropped
+        :param base_delay: base of the exponential, fully jittered backoff, in seconds
+        :param client: an SQS client; created on first use when omitted
+        """
+        self.queue_url: str = queue_url
+        self.region: str = region
+        self.max_attempts: int = max_attempts
+        self.base_delay: float = base_delay
+        self._client = client
+        self.pending: list = []
+
+    @classmethod
+    def from_env(cls) -> "SqsEnqueuer":
+        return cls(
+            queue_url=os.getenv("SQS_QUEUE_URL", DEFAULT_QUEUE_URL),
+            region=os.getenv("SQS_REGION", os.getenv("AWS_REGION", DEFAULT_REGION)),
+        )
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client("sqs", region_name=self.region)
+        return self._client
+
+    def enqueue(self, entry: dict) -> None:
+        """
+        Buffers a message until the next flush.
+
+        :param entry: SendMessageBatch entry fields, without an Id
+        """
+        self.pending.append(entry)
+
+    def enqueue_many(self, entries: list) -> None:
+        self.pending.extend(entries)
+
+    def flush(self) -> List[dict]:
+        """
+        Sends every buffered message.
+
+        :return: the entries that could not be sent
+        """
+        entries, self.pending = self.pending, []
+        return self.send_batch(entries)
+
+    def send_batch(self, entries: list) -> List[dict]:
+        """
+        Sends entries in chunks of MAX_BATCH, retrying retryable failures.
+
+        :return: the entries that could not be sent
+        """
+        failed: list = []
+        for start in range(0, len(entries), self.MAX_BATCH):
+            failed.extend(self._send_chunk(entries[start:start + self.MAX_BATCH]))
+        return failed
+
+    def _backoff(self, attempt: int) -> None:
+        time.sleep(random.uniform(0, self.base_delay * (2 ** attempt)))
+
+    def _send_chunk(self, chunk: list) -> List[dict]:
+        remaining: dict = {str(i): entry for i, entry in enumerate(chunk)}
+        rejected: list = []
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self._backoff(attempt)
+            try:
+                with span("SQS", "SendMessageBatch"):
+                    response = self.client.send_message_batch(
+                        QueueUrl=self.queue_url,
+                        Entries=[{"Id": id, **entry} for id, entry in remaining.items()],
+                    )
+            except botocore_exceptions.ClientError as err:
+                logger.warning("SendMessageBatch failed on attempt %d: %s: %s", attempt + 1,
+                               err.response["Error"]["Code"], err.response["Error"]["Message"])
+                continue
+
+            retry: dict = {}
+            for failure in response.get("Failed", []):
+                if failure.get("SenderFault"):
+                    logger.error("SQS rejected message %s (%s): %s: %s", failure["Id"],
+                                 remaining[failure["Id"]].get("MessageDeduplicationId"),
+                                 failure.get("Code"), failure.get("Message"))
+                    rejected.append(remaining[failure["Id"]])
+                else:
+                    retry[failure["Id"]] = remaining[failure["Id"]]
+            remaining = retry
+            if not remaining:
+                return rejected
+
+        logger.error("Dropping %d message(s) after %d attempts: %s", len(remaining), self.max_attempts,
+                     describe(list(remaining.values())))
+        return rejected + list(remaining.values())
+
+
+class PostResponseFlusher:
+    """
+    An internal Lambda extension that flushes an SqsEnqueuer after each
+    invocation's response has been returned.
+
+    The execution environment is only frozen once the extension asks for its
+    next event, so the flush runs to completion after the handler returns.
+    """
+
+    def __init__(self, enqueuer: SqsEnqueuer, runtime_api: str) -> None:
+        self.enqueuer: SqsEnqueuer = enqueuer
+        self.base_url: str = f"http://{runtime_api}/2020-01-01/extension"
+        self.work: queue.Queue = queue.Queue()
+        self.extension_id: Optional[str] = None
+
+    def register(self) -> None:
+        """Registers with the Extensions API. Must be called during init."""
+        request = urllib_request.Request(
+            self.base_url + "/register",
+            data=json.dumps({"events": ["INVOKE"]}).encode(),
+            headers={"Lambda-Extension-Name": EXTENSION_NAME},
+            method="POST",
+        )
+        with urllib_request.urlopen(request) as response:
+            self.extension_id = response.headers["Lambda-Extension-Identifier"]
+
+    def start(self) -> None:
+        self.register()
+        threading.Thread(target=self._run, name=EXTENSION_NAME, daemon=True).start()
+
+    def _next_event(self) -> None:
+        request = urllib_request.Request(
+            self.base_url + "/event/next",
+            headers={"Lambda-Extension-Identifier": self.extension_id},
+        )
+        with urllib_request.urlopen(request) as response:
+            response.read()
+
+    def _run(self) -> None:
+        while True:
+            self._next_event()
+            # one item is handed over at the end of every invocation
+            entries = self.work.get()
+            if not entries:
+                continue
+            # the thread must survive any failure, or later invocations hang
+            # waiting for it to ask for the next event
+            # only ids are logged; the error itself may quote an entry, so
+            # only its type is
+            try:
+                failed = self.enqueuer.send_batch(entries)
+            except Exception as err:
+                logger.error("Couldn't send %d message(s) %s: %s", len(entries), describe(entries),
+                             type(err).__name__)
+                continue
+            if failed:
+                logger.error("Couldn't send %d message(s) %s", len(failed), describe(failed))
+
+    def hand_over(self, entries: list) -> None:
+        self.work.put(entries)
+
+
+class Enqueue:
+    """
+    The enqueue layer used by the handler: buffers during an invocation and
+    flushes at the end of it, either inline or after the response.
+    """
+
+    def __init__(self, enqueuer: SqsEnqueuer, mode: str = "sync") -> None:
+        self.enqueuer: SqsEnqueuer = enqueuer
+        self.flusher: Optional[PostResponseFlusher] = None
+        runtime_api = os.getenv("AWS_LAMBDA_RUNTIME_API")
+        if mode == "deferred" and runtime_api:
+            flusher = PostResponseFlusher(enqueuer, runtime_api)
+            try:
+                flusher.start()
+            except OSError as err:
+                logger.warning("Unable to register %s, flushing inline: %s", EXTENSION_NAME, err)
+            else:
+                self.flusher = flusher
+
+    @classmethod
+    def from_env(cls) -> "Enqueue":
+        return cls(SqsEnqueuer.from_env(), os.getenv("ENQUEUE_MODE", "sync"))
+
+    def enqueue(self, entry: dict) -> None:
+        self.enqueuer.enqueue(entry)
+
+    def enqueue_many(self, entries: list) -> None:
+        self.enqueuer.enqueue_many(entries)
+
+    def end_invocation(self) -> None:
+        """
+        Called once at the end of every invocation, whether or not anything
+        was enqueued, so the extension thread can release the environment.
+
+        :raises EnqueueError: in sync mode, when some messages could not be
+                              sent, so the user is not told the request was taken
+        """
+        if self.flusher is not None:
+            entries, self.enqueuer.pending = self.enqueuer.pending, []
+            self.flusher.hand_over(entries)
+        elif self.enqueuer.pending:
+            failed = self.enqueuer.flush()
+            if failed:
+                raise EnqueueError(failed)
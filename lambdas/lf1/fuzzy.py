@@ -0,0 +1,147 @@
+"""
+Typo-tolerant matching for the city and cuisine vocabularies.
+
+A BK-tree is built once per container over every accepted spelling (canonical
+values and aliases), so a misspelling such as "italain" can be corrected in
+the same dialog turn instead of re-eliciting the slot. Only misspellings a
+single edit away are corrected; values further off are offered back as
+suggestions, as they may well be a different city ("columbia", "columbus").
+"""
+from typing import List, Optional, Tuple
+
+from validation import CITY_LOOKUP, CUISINE_LOOKUP, normalise
+
+# the furthest a value may be from a single closest spelling to be corrected
+# without asking; matches up to max_distance away are only suggested
+MAX_CORRECTION_DISTANCE: int = 1
+
+
+def edit_distance(a: str, b: str) -> int:
+    """
+    Optimal string alignment distance: Levenshtein distance where swapping two
+    adjacent characters counts as a single edit.
+    """
+    if a == b:
+        return 0
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+
+    prev_prev: list = []
+    prev: list = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current: list = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(prev[j] + 1, current[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], prev_prev[j - 2] + 1)
+        prev_prev, prev = prev, current
+    return prev[-1]
+
+
+class BKTree:
+    """A Burkhard-Keller tree for nearest-neighbour lookups by edit distance."""
+
+    __slots__ = ("root",)
+
+    def __init__(self, words) -> None:
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """
+        Finds every word within max_distance of word.
+
+        :return: (distance, word) pairs sorted by distance
+        """
+        if self.root is None:
+            return []
+        results: list = []
+        stack: list = [self.root]
+        while stack:
+            candidate, children = stack.pop()
+            distance = edit_distance(word, candidate)
+            if distance <= max_distance:
+                results.append((distance, candidate))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        results.sort()
+        return results
+
+
+class FuzzyIndex:
+    """
+    Maps user input to a canonical vocabulary value, exactly, by alias or by
+    closest spelling.
+    """
+
+    def __init__(self, lookup: dict) -> None:
+        """
+        :param lookup: maps every accepted spelling to its canonical value
+        """
+        self.lookup: dict = lookup
+        self.tree: BKTree = BKTree(sorted(lookup))
+
+    @staticmethod
+    def max_distance(value: str) -> int:
+        """
+        Words of up to three letters must match exactly, those of up to six
+        may be a single edit away, and longer ones two.
+        """
+        if len(value) <= 3:
+            return 0
+        return 1 if len(value) <= 6 else 2
+
+    def match(self, value: str) -> Tuple[Optional[str], List[str]]:
+        """
+        Resolves a value against the vocabulary.
+
+        :param value: the value as entered by the user
+        :return: (canonical, suggestions). canonical is set when the value
+                 matches or has a single closest spelling within
+                 MAX_CORRECTION_DISTANCE; otherwise suggestions lists the
+                 closest canonical values, if any.
+        """
+        key = normalise(value)
+        canonical = self.lookup.get(key)
+        if canonical is not None:
+            return canonical, []
+
+        hits = self.tree.search(key, self.max_distance(key))
+        if not hits:
+            return None, []
+
+        best = hits[0][0]
+        suggestions: list = []
+        for distance, word in hits:
+            if distance != best:
+                break
+            if self.lookup[word] not in suggestions:
+                suggestions.append(self.lookup[word])
+
+        if len(suggestions) == 1 and best <= MAX_CORRECTION_DISTANCE:
+            return suggestions[0], []
+        return None, suggestions
+
+
+CITY_INDEX: FuzzyIndex = FuzzyIndex(CITY_LOOKUP)
+CUISINE_INDEX: FuzzyIndex = FuzzyIndex(CUISINE_LOOKUP)
@@ -1,181 +1,106 @@
 """
-This sample demonstrates an implementation of the Lex Code Hook Interface
-in order to serve a sample bot which manages reservations for hotel rooms and car rentals.
-Bot, Intent, and Slot models which are compatible with this sample can be found in the Lex Console
-as part of the 'BookTrip' template.
-
-For instructions on how to set up and test this bot, as well as additional samples,
-visit the Lex Getting Started documentation http://docs.aws.amazon.com/lex/latest/dg/getting-started.html.
+The Lex V2 code hook for the DiningConcierge bot. Dialog turns validate the
+DiningSuggestionIntent slots; fulfillment enqueues the request for lf2.
 """
 
-import json
-import datetime
-import time
 import os
-import dateutil.parser
 import logging
-import boto3
-from uuid import uuid4
-
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-
-
-# --- Helpers that build all of the responses ---
-
-
-def elicit_slot(session_attributes, intent_name, slots, slot_to_elicit, message):
-    return {
-        'sessionState': {
-            'sessionAttributes': session_attributes,
-            'dialogAction': {
-                'type': 'ElicitSlot',
-                'slotToElicit': slot_to_elicit,
-            },
-            'intent': {
-                'name': intent_name,
-                "slots": slots,
-            }
-        },
-        'messages': [
-            {
-                "contentType": "PlainText",
-                "content": message
-            }
-        ]
-    }
 
+from codehook import Dispatcher, IntentRequest, LexV2Request, plain_text
+from enqueue import Enqueue
+from request_schema import deduplication_id, encode_request, group_id, legacy_attributes
+from fuzzy import CITY_INDEX, CUISINE_INDEX
+from instrumentation import get_correlation_id, set_correlation_id
+from validation import (
+    build_validation_result,
+    parse_date,
+    safe_int,
+    today,
+)
 
-def close(session_attributes, fulfillment_state, message, intent_name):
-    response = {
-        'sessionState': {
-            'sessionAttributes': session_attributes,
-            'dialogAction': {
-                'type': 'Close',
-            },
-            'intent': {
-                'name': intent_name,
-                'state': "Fulfilled"
-            },
-            'messages': [
-                message
-            ]
-        }
-    }
+logger = logging.getLogger(__name__)
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
 
-    return response
-
-
-def delegate(session_attributes, slots, intent):
-    return {
-        "sessionState": {
-            'sessionAttributes': session_attributes,
-            'dialogAction': {
-                'type': 'Delegate',
-            },
-            "intent": {
-                "name": intent,
-                "slots": slots,
-                "state": "ReadyForFulfillment",
-            }
-        }
-    }
+# created during init so a deferred-mode extension can register in time
+ENQUEUE: Enqueue = Enqueue.from_env()
+
+# also write the legacy per-field MessageAttributes while older lf2 versions are deployed
+LEGACY_ATTRIBUTES: bool = os.getenv("SQS_LEGACY_ATTRIBUTES", "false").lower() == "true"
+
+# identical requests within this many seconds are deduplicated by SQS
+DEDUP_WINDOW_SECONDS: int = int(os.getenv("DEDUP_WINDOW_SECONDS", "300"))
+
+DINING_CONFIRMATION: dict = plain_text(
+    "Thanks, you're all set! You should receive my suggestions via SMS in a few minutes!")
+
+dispatcher: Dispatcher = Dispatcher(LexV2Request)
 
 
 # --- Helper Functions ---
 
 
-def safe_int(n):
+def did_you_mean(suggestions: list, fallback: str) -> str:
     """
-    Safely convert n value to int.
+    Builds the re-prompt offered alongside a rejected value.
     """
-    if n is not None:
-        return int(n)
-    return n
+    if not suggestions:
+        return fallback
+    return "Did you mean {}?".format(" or ".join(suggestions))
 
 
-def try_ex(func):
+def validate_dining(request: IntentRequest) -> dict:
     """
-    Call passed in function in try block. If KeyError is encountered return None.
-    This function is intended to be used to safely access dictionary.
+    Validates the DiningSuggestionIntent slots filled so far. Aliases (e.g.
+    "nyc") and unambiguous misspellings one edit away (e.g. "italain") are
+    rewritten to their canonical value in place, so the turn continues without
+    a re-prompt; values further off are re-elicited with "Did you mean ...?".
 
-    Note that this function would have negative impact on performance.
+    :param request: the code hook request
     """
+    location = request.slot('location')
+    cuisine = request.slot('cuisine')
+    date = request.slot('date')
+    count = request.slot('count')
+
+    if location is not None:
+        canonical, suggestions = CITY_INDEX.match(location)
+        if canonical is None:
+            return build_validation_result(
+                False,
+                "location",
+                "We currently do not support {} as a valid Location. {}".format(
+                    location, did_you_mean(suggestions, "Can you try a different city?"))
+            )
+        if canonical != location:
+            request.set_slot('location', canonical)
+
+    if cuisine is not None:
+        canonical, suggestions = CUISINE_INDEX.match(cuisine)
+        if canonical is None:
+            return build_validation_result(
+                False,
+                "cuisine",
+                "We currently do not support {} as a valid Cuisine. {}".format(
+                    cuisine, did_you_mean(suggestions, "Can you try a different one?"))
+            )
+        if canonical != cuisine:
+            request.set_slot('cuisine', canonical)
 
-    try:
-        return func()
-    except KeyError:
-        return None
-
-
-def isvalid_date(date):
-    try:
-        dateutil.parser.parse(date)
-        return True
-    except ValueError:
-        return False
-
-
-def build_validation_result(isvalid, violated_slot, message_content):
-    return {
-        'isValid': isvalid,
-        'violatedSlot': violated_slot,
-        'message': {'contentType': 'PlainText', 'content': message_content}
-    }
-
-
-def isvalid_city(city):
-    valid_cities = ['new york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio',
-                    'san diego', 'dallas', 'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis',
-                    'columbus', 'fort worth', 'charlotte', 'detroit', 'el paso', 'seattle', 'denver', 'washington dc',
-                    'memphis', 'boston', 'nashville', 'baltimore', 'portland']
-    return city.lower() in valid_cities
-
-
-def isvalid_cuisine(cuisine):
-    valid_cuisines = ['vegetarian', 'seafood', 'indian', 'chinese', 'american', 'italian', 'japanese',
-                      'mexican', 'mediterranean', 'vegan', 'chicken', 'steak', 'noodles', 'fast food', 'deli',
-                      'convenience', 'sandwiches', 'desserts', 'burgers', 'salad', 'coffee', 'thai', 'brazilian', ]
-    return cuisine.lower() in valid_cuisines
-
-
-def validate_dining(slots: dict) -> dict:
-    print(f"validate slots: {slots}")
-    location = try_ex(lambda: slots['Location'])
-    cuisine = try_ex(lambda: slots['Cuisine'])
-    date = try_ex(lambda: slots['date'])
-    time = try_ex(lambda: slots['time'])
-    count = try_ex(lambda: slots['count'])
-    phone = try_ex(lambda: slots['phone'])
-
-    if location and not isvalid_city(location['value']['interpretedValue']):
-        return build_validation_result(
-            False,
-            "Location",
-            "We currently do not support {} as a valid Location. Can you try a different city?".format(
-                location['value']['interpretedValue'])
-        )
-
-    if cuisine and not isvalid_cuisine(cuisine['value']['interpretedValue']):
-        return build_validation_result(
-            False,
-            "Cuisine",
-            "We currently do not support {} as a valid Cuisine. Can you try a different one?".format(
-                cuisine['value']['interpretedValue'])
-        )
-
-    if date:
-        if not isvalid_date(date['value']['interpretedValue']):
+    if date is not None:
+        reservation_date = parse_date(date)
+        if reservation_date is None:
             return build_validation_result(False, 'date', 'I did not understand your reservation date.  When would you like to make your reservation?')
-        if datetime.datetime.strptime(date['value']['interpretedValue'], '%Y-%m-%d').date() <= datetime.date.today():
+        if reservation_date <= today():
             return build_validation_result(False, 'date', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?')
 
-    if count is not None and (int(count['value']['interpretedValue']) < 1 or int(count['value']['interpretedValue']) > 8):
-        return build_validation_result(
-            False,
-            'count',
-            'You can make a reservations for from one to 8 guests.  How many guests will be attending?'
-        )
+    if count is not None:
+        guests = safe_int(count) if count.isdigit() else 0
+        if guests < 1 or guests > 8:
+            return build_validation_result(
+                False,
+                'count',
+                'You can make a reservations for from one to 8 guests.  How many guests will be attending?'
+            )
 
     return {'isValid': True}
 
@@ -183,177 +108,65 @@ def validate_dining(slots: dict) -> dict:
 """ --- Functions that control the bot's behavior --- """
 
 
-def handle_greet(intent_request):
+@dispatcher.intent('GreetingIntent')
+def handle_greet(request: IntentRequest) -> dict:
     """
     Handles the initial greeting
     """
-    logger.debug("Recieved GreetingIntent\nintent_request: {}".format(
-        json.dumps(intent_request)))
-
-    session_attributes = intent_request.get('sessionAttributes') if intent_request.get(
-        'sessionAttributes') is not None else {}
-    return close(
-        session_attributes,
-        'Fulfilled',
-        {
-            'contentType': 'PlainText',
-            'content': 'Hi there, how can I help you?'
-        },
-        intent_request['sessionState']['intent']['name']
-    )
+    return request.close('Fulfilled', plain_text('Hi there, how can I help you?'))
 
 
-def handle_dining_intent(intent_request: dict) -> dict:
+@dispatcher.intent('DiningSuggestionIntent')
+def handle_dining_intent(request: IntentRequest) -> dict:
+    slots: dict = request.slots
 
-    print("starting handle_dining_intent code hook")
-
-    location = try_ex(
-        lambda: intent_request['sessionState']['intent']['slots']['location'])
-    cuisine = try_ex(
-        lambda: intent_request['sessionState']['intent']['slots']['cuisine'])
-    date = try_ex(
-        lambda: intent_request['sessionState']['intent']['slots']['date'])
-    time = try_ex(
-        lambda: intent_request['sessionState']['intent']['slots']['time'])
-    count = try_ex(
-        lambda: intent_request['sessionState']['intent']['slots']['count'])
-    phone = try_ex(
-        lambda: intent_request['sessionState']['intent']['slots']['phone'])
-    email = try_ex(
-        lambda: intent_request['sessionState']['intent']['slots']['email'])
-
-    session_attributes = intent_request.get('sessionAttributes') if intent_request.get(
-        'sessionAttributes') is not None else {}
-
-    if intent_request['invocationSource'] == 'DialogCodeHook':
-        print("invocation source was DialogCodeHook")
+    if request.invocation_source == 'DialogCodeHook':
         # validate any slots which have been specified. If any are invalid re-elicit for their value
-        validation_result = validate_dining(
-            intent_request['sessionState']['intent']['slots'])
+        validation_result = validate_dining(request)
         if not validation_result['isValid']:
+            request.set_slot(validation_result['violatedSlot'], None)
 
-            slots = intent_request['sessionState']['intent']['slots']
-            slots[validation_result['violatedSlot']] = None
-
-            return elicit_slot(
-                session_attributes,
-                intent_request['sessionState']['intent']['name'],
-                slots,
-                validation_result['violatedSlot'],
-                validation_result['message'],
-            )
+            return request.elicit_slot(validation_result['violatedSlot'], validation_result['message'])
 
         # continue eliciting slots if need be
-        return delegate(session_attributes, intent_request['sessionState']['intent']['slots'],
-                        intent_request['sessionState']['intent']['name'])
-
-    elif intent_request['invocationSource'] == "FulfillmentCodeHook":
-        print("invocation was FulfillmentCodeHook")
-        send_message(location, cuisine, date, time, count, phone, email,
-                     request_id=intent_request['sessionState']['originatingRequestId'])
-        return close(
-            session_attributes,
-            "Fulfilled",
-            {
-                'contentType': 'PlainText',
-                'content': "Thanks, you're all set! You should receive my suggestions via SMS in a few minutes!"
-            },
-            intent_request['sessionState']['intent']['name'],
-        )
-
-    return close(
-        session_attributes,
-        'Fulfilled',
-        {
-            'contentType': 'PlainText',
-            'content': "Thanks, you're all set! You should receive my suggestions via SMS in a few minutes!"
-        },
-        intent_request['sessionState']['intent']['name']
-    )
-
-
-def send_message(location, cuisine, date, time, count, phone, email, request_id=None) -> None:
-    sqs = boto3.client('sqs')
-    queue_url = "https://sqs.us-east-1.amazonaws.com/979351636556/YelpRestaurants.fifo"
-
-    print(f"location: {location}\n cuisine: {cuisine}\n")
-
-    response = sqs.send_message(
-        QueueUrl=queue_url,
-        MessageAttributes={
-            "location": {
-                "DataType": "String",
-                "StringValue": location["value"]["interpretedValue"],
-            },
-            "cuisine": {
-                "DataType": "String",
-                "StringValue": cuisine["value"]["interpretedValue"],
-            },
-            "date": {
-                "DataType": "String",
-                "StringValue": str(date["value"]["interpretedValue"]),
-            },
-            "count": {
-                "DataType": "Number",
-                "StringValue": count["value"]["interpretedValue"],
-            },
-            "phone": {
-                "DataType": "String",
-                "StringValue": phone["value"]["interpretedValue"],
-            },
-            "email": {
-                "DataType": "String",
-                "StringValue": email["value"]["interpretedValue"],
-            },
-            "time": {
-                "DataType": "String",
-                "StringValue": time["value"]["interpretedValue"],
-            },
-        },
-        MessageBody=f"Queried for cuisine:{cuisine['value']['interpretedValue']} in location:{location['value']['interpretedValue']}",
-        MessageGroupId=request_id,
-        MessageDeduplicationId=str(uuid4()),
-    )
+        return request.delegate()
 
-    print(f"SQS Response: {response}")
+    if request.invocation_source == 'FulfillmentCodeHook':
+        send_message(slots['location'], slots['cuisine'], slots['date'], slots['time'],
+                     slots['count'], slots['phone'], slots['email'], request_id=request.request_id)
 
+    return request.close('Fulfilled', DINING_CONFIRMATION)
 
-def handle_thank_you(intent_request: dict) -> dict:
-    session_attributes = intent_request.get('sessionAttributes') if intent_request.get(
-        'sessionAttributes') is not None else {}
-    return close(
-        session_attributes,
-        "Fulfilled",
-        {
-            "contentType": "PlainText",
-            "content": "Thanks for chatting with me!"
-        },
-        intent_request['sessionState']['intent']['name']
-    )
-
-
-# --- Intents ---
 
-
-def dispatch(intent_request):
+def send_message(location, cuisine, date, time, count, phone, email, request_id=None) -> None:
     """
-    Called when the user specifies an intent for this bot.
+    Enqueues a dining request for lf2. The message is sent at the end of the
+    invocation, see Enqueue.end_invocation.
     """
-    print(intent_request)
-    logger.debug('dispatch intentName={}'.format(
-        intent_request['sessionState']['intent']['name']))
+    request: dict = {
+        "location": location["value"]["interpretedValue"],
+        "cuisine": cuisine["value"]["interpretedValue"],
+        "date": str(date["value"]["interpretedValue"]),
+        "time": time["value"]["interpretedValue"],
+        "count": int(count["value"]["interpretedValue"]),
+        "phone": phone["value"]["interpretedValue"],
+        "email": email["value"]["interpretedValue"],
+        "correlation_id": get_correlation_id(),
+    }
 
-    intent_name = intent_request['sessionState']['intent']['name']
+    entry: dict = dict(
+        MessageBody=encode_request(request),
+        MessageGroupId=group_id(request, fallback=request_id),
+        MessageDeduplicationId=deduplication_id(request, DEDUP_WINDOW_SECONDS),
+    )
+    if LEGACY_ATTRIBUTES:
+        entry["MessageAttributes"] = legacy_attributes(request)
+    ENQUEUE.enqueue(entry)
 
-    # Dispatch to your bot's intent handlers
-    if intent_name == 'GreetingIntent':
-        return handle_greet(intent_request)
-    elif intent_name == 'DiningSuggestionIntent':
-        return handle_dining_intent(intent_request)
-    elif intent_name == 'ThankYouIntent':
-        raise handle_thank_you(intent_request)
 
-    raise Exception('Intent with name ' + intent_name + ' not supported')
+@dispatcher.intent('ThankYouIntent')
+def handle_thank_you(request: IntentRequest) -> dict:
+    return request.close('Fulfilled', plain_text('Thanks for chatting with me!'))
 
 
 # --- Main handler ---
@@ -364,12 +177,11 @@ def lambda_handler(event, context):
     Route the incoming request based on intent.
     The JSON body of the request is provided in the event slot.
     """
-    # By default, treat the user request as coming from the America/New_York time zone.
-    os.environ['TZ'] = 'America/New_York'
-    time.tzset()
-    # botname = ""
-
-    # logger.debug('event.bot.name={}'.format(event['bot']['name']))
-    logger.debug("event received.\n{}".format(event))
-
-    return dispatch(event)
+    # Dates are evaluated in validation.TIMEZONE (America/New_York).
+    request_attributes: dict = event.get('requestAttributes') or {}
+    set_correlation_id(request_attributes.get('correlationId')
+                       or (event.get('sessionState') or {}).get('originatingRequestId'))
+    try:
+        return dispatcher.dispatch(event)
+    finally:
+        ENQUEUE.end_invocation()
@@ -2,60 +2,117 @@ import boto3
 from botocore.exceptions import ClientError
 import os
 import logging
-import requests
-from requests.auth import HTTPBasicAuth
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
+from candidates import CandidateTable
+from render import display_fields, render_error, render_suggestions
+from instrumentation import emit_counts, emit_duration, get_correlation_id, set_correlation_id, span
+from lazy import lazy_import
+from record_runner import run_records
+from request_schema import decode_record
+from resilience import CircuitBreaker, CircuitOpenError, hedged
+from search_index import INDEX_ALIAS
+from ses_sender import Email, SesSender
+from single_flight import SingleFlight
+from suggestion_cache import SuggestionCache
+from suggestion_source import DYNAMODB, MATERIALISED, SourceSelector
+from validation import suggestion_key
+
+# requests is only needed when the suggestion cache misses
+requests = lazy_import("requests")
+
 logger = logging.getLogger(__name__)
 
 REGION: str = "us-east-1"
 CLUSTER_HOST: str = "https://search-csgy9223a-hw1-dining-wt7iphrqwwnp6pzz4i37djulsq.us-east-1.es.amazonaws.com"
-INDEX: str = "restaurants"
+INDEX: str = INDEX_ALIAS
 PORT: int = 443
 
+# how many restaurants are fetched, and cached, per (cuisine, location)
+SUGGESTION_CANDIDATES: int = int(os.getenv("SUGGESTION_CANDIDATES", "3"))
 
-class SesWrapper:
-    def __init__(self, ses_resource) -> None:
-        self.ses_resource = ses_resource
+# how many of the candidates are included in each email
+SUGGESTIONS_PER_EMAIL: int = int(os.getenv("SUGGESTIONS_PER_EMAIL", "3"))
 
-    def publish(self, address, message) -> str:
-        SENDER = "AWS SES <ab7289@nyu.edu>"
+# how many of a (cuisine, location)'s restaurants the index query ranks by rating
+INDEX_QUERY_LIMIT: int = int(os.getenv("INDEX_QUERY_LIMIT", "50"))
 
-        SUBJECT: str = "DiningConcierge SES"
-        CHARTSET = "UTF-8"
-        try:
-            response = self.ses_resource.send_email(
-                Destination={
-                    "ToAddresses": [
-                        address
-                    ],
-                },
-                Message={
-                    "Body": {
-                        "Text": {
-                            "Charset": CHARTSET,
-                            "Data": message,
-                        }
-                    },
-                    "Subject": {
-                        "Charset": CHARTSET,
-                        "Data": SUBJECT,
-                    }
-                },
-                Source=SENDER
-            )
-        except ClientError as e:
-            logger.error("There was an error sending email: %s",
-                         e.response["Error"]["Message"])
-            raise
-        else:
-            return response["MessageId"]
+# BatchGetItem calls made for one lookup's unprocessed keys, with an
+# exponential, fully jittered backoff from this base, in seconds
+BATCH_GET_ATTEMPTS: int = 5
+BATCH_GET_BASE_DELAY: float = 0.05
+
+# how many of a batch's records are handled at once; records of one FIFO
+# message group are always handled in order
+RECORD_CONCURRENCY: int = int(os.getenv("RECORD_CONCURRENCY", "1"))
+
+# seconds a record may take before it is abandoned and retried
+RECORD_TIMEOUT: float = float(os.getenv("RECORD_TIMEOUT", "10"))
+
+# left at the end of an invocation for sending the batch's emails, but never
+# more than half of what is left when the records start
+SEND_RESERVE_MS: int = int(os.getenv("SEND_RESERVE_MS", "3000"))
+
+# seconds a record is always given, however little of the invocation is left
+RECORD_MIN_TIMEOUT: float = float(os.getenv("RECORD_MIN_TIMEOUT", "1"))
+
+# reply with the failed records instead of failing the whole batch; the event
+# source mapping must have ReportBatchItemFailures turned on
+REPORT_BATCH_ITEM_FAILURES: bool = os.getenv("REPORT_BATCH_ITEM_FAILURES", "false").lower() == "true"
+
+# one SES client and send pool per container
+SES: SesSender = SesSender.from_env()
+
+# OpenSearch, or the table's Cuisine/Location index when configured or while
+# OpenSearch is slow or failing; see suggestion_source
+SOURCE: SourceSelector = SourceSelector.from_env()
+
+# (connect, read) seconds for each search request
+SEARCH_TIMEOUT: tuple = (float(os.getenv("OPENSEARCH_CONNECT_TIMEOUT", "0.5")),
+                         float(os.getenv("OPENSEARCH_READ_TIMEOUT", "2")))
+
+# a second search is sent when the first has not answered within the p95 of
+# recent searches, or this many milliseconds until there are enough of them
+SEARCH_HEDGE_DELAY_MS: float = float(os.getenv("SEARCH_HEDGE_DELAY_MS", "200"))
+SEARCH_HEDGE_MIN_DELAY_MS: float = float(os.getenv("SEARCH_HEDGE_MIN_DELAY_MS", "20"))
+SEARCH_HEDGING: bool = os.getenv("SEARCH_HEDGING", "true").lower() == "true"
+
+# fails searches fast while the cluster keeps failing them
+SEARCH_CIRCUIT: CircuitBreaker = CircuitBreaker.from_env("OpenSearch", "OPENSEARCH")
+
+# shares one lookup between the concurrent records that need the same one
+FLIGHT: SingleFlight = SingleFlight()
+
+_dynamodb = None
+_restaurant_table = None
+_candidate_table: Optional[CandidateTable] = None
+_cache: Optional[SuggestionCache] = None
+_search_pool: Optional[ThreadPoolExecutor] = None
+_search_counts: dict = {"hedged": 0, "rejected": 0}
+_search_counts_lock = threading.Lock()
+# the container-lifetime counters as of the last emit, see counts_since_last_emit
+_emitted_counts: dict = {}
+_emitted_counts_lock = threading.Lock()
+_budget_checked: bool = False
+
+
+class UnprocessedKeysError(RuntimeError):
+    """Raised when BatchGetItem keeps leaving keys unprocessed."""
 
 
 class RestaurantTable:
 
     TABLE_NAME: str = "yelp-restaurants"
 
+    # created by dynamodb/table_admin.py
+    CUISINE_LOCATION_INDEX: str = "CuisineLocationIndex"
+    CUISINE_KEY: str = "CuisineKey"
+    LOCATION_KEY: str = "LocationKey"
+
     """Encapsulates an Amazon DynamoDB table of restaurant data."""
 
     def __init__(self, dyn_resource):
@@ -102,14 +159,84 @@ class RestaurantTable:
         else:
             return response['Item']
 
+    def get_restaurants(self, ids: list) -> list:
+        """
+        Retrieves several restaurants with BatchGetItem, retrying unprocessed
+        keys with backoff. A failed lookup raises rather than returning some of
+        the restaurants, so a partial list is never cached.
 
-def get_query(cuisine: str):
+        :param ids: the restaurant ids, at most 100
+        :return: the restaurants found, in the order of ids
+        :raises UnprocessedKeysError: when keys are still unprocessed after BATCH_GET_ATTEMPTS calls
+        """
+        request: dict = {self.table.name: {"Keys": [{"id": id} for id in ids]}}
+        found: dict = {}
+        for attempt in range(BATCH_GET_ATTEMPTS):
+            if attempt:
+                time.sleep(random.uniform(0, BATCH_GET_BASE_DELAY * (2 ** attempt)))
+            try:
+                with span("DynamoDB", "BatchGetItem"):
+                    response = self.dyn_resource.batch_get_item(RequestItems=request)
+            except ClientError as err:
+                logger.error(
+                    "Couldn't retrieve restaurants from Table %s. Here's why: %s: %s",
+                    self.table.name,
+                    err.response["Error"]["Code"], err.response["Error"]["Message"]
+                )
+                raise
+            for item in response["Responses"].get(self.table.name, []):
+                found[item["id"]] = item
+            request = response.get("UnprocessedKeys")
+            if not request:
+                return [found[id] for id in ids if id in found]
+        raise UnprocessedKeysError(
+            f"{len(request[self.table.name]['Keys'])} restaurant(s) still unprocessed "
+            f"after {BATCH_GET_ATTEMPTS} attempts")
+
+    def query_cuisine_location(self, cuisine: str, location: str, limit: int = SUGGESTION_CANDIDATES) -> list:
+        """
+        Finds restaurants with the Cuisine/Location index, without OpenSearch.
+
+        :param cuisine: the cuisine requested
+        :param location: the location requested
+        :param limit: the number of restaurants to return
+        :return: the best rated of the first INDEX_QUERY_LIMIT restaurants
+                 found, best first, with the fields the index projects
+        :raises ClientError: when the query fails, so no empty result is cached
+        """
+        cuisine_key, location_key = suggestion_key(cuisine, location)
+        try:
+            with span("DynamoDB", "Query"):
+                response = self.table.query(
+                    IndexName=self.CUISINE_LOCATION_INDEX,
+                    KeyConditionExpression="#ck = :ck AND #lk = :lk",
+                    ProjectionExpression="id, #n, #loc, rating, review_count",
+                    ExpressionAttributeNames={"#ck": self.CUISINE_KEY, "#lk": self.LOCATION_KEY,
+                                              "#n": "name", "#loc": "location"},
+                    ExpressionAttributeValues={":ck": cuisine_key, ":lk": location_key},
+                    Limit=INDEX_QUERY_LIMIT,
+                )
+        except ClientError as err:
+            logger.error(
+                "Couldn't query index %s of Table %s. Here's why: %s: %s",
+                self.CUISINE_LOCATION_INDEX, self.table.name,
+                err.response["Error"]["Code"], err.response["Error"]["Message"]
+            )
+            raise
+        items: list = response["Items"]
+        items.sort(key=lambda item: (item.get("rating") or 0, item.get("review_count") or 0), reverse=True)
+        return items[:limit]
+
+
+def get_query(cuisine: str, size: int = SUGGESTION_CANDIDATES):
     """
     Constructs a GraphQL Query used by OpenSearch
 
     :param cuisine: the cuisine to search for
+    :param size: the number of hits to return
     """
     query: dict = {
+        "size": size,
         "query": {
             "term": {
                 "Cuisine": {
@@ -121,133 +248,323 @@ def get_query(cuisine: str):
     return query
 
 
-def handle_os_response(response, attributes):
+def handle_os_response(response) -> list:
     """
     Handles parsing out the response from OpenSearch
 
-    :param response: the requests response from OpenSearch
-    :param attributes: the SQS attributes originall sent
+    :param response: the parsed JSON response from OpenSearch
+    :return: the ids of the restaurants hit, best first
     """
-    print(
-        f"handle_os_response: response: {response}\nattributes: {attributes}")
     hits_obj = response["hits"]
     hit_count: int = hits_obj["total"]["value"]
     if hit_count == 0:
         logger.error("No hits retrieved")
-        send_error(attributes)
-    else:
-        top_hit = hits_obj["hits"][0]
-        logger.info("top hit: %s", top_hit)
-        logger.info("id: %s", top_hit['_source']['id'])
-        top_id: str = top_hit['_source']['id']
-        suggestion: dict = query_db(top_id)
-        if suggestion is not None:
-            send_message(suggestion, attributes)
-        else:
-            send_error(attributes)
+        return []
+    return [hit['_source']['id'] for hit in hits_obj["hits"]]
+
+
+def send_search(url: str, os_query: dict, auth) -> dict:
+    """
+    Sends one search request, with SEARCH_TIMEOUT.
+
+    :return: the parsed JSON response
+    :raises requests.RequestException: on a timeout or an error status
+    """
+    with span("OpenSearch", "Search"):
+        response = requests.get(url,
+                                headers={"Content-Type": "application/json"},
+                                json=os_query,
+                                auth=auth,
+                                timeout=SEARCH_TIMEOUT)
+        response.raise_for_status()
+    return response.json()
 
 
-def send_message(restaurant: dict, attributes: dict) -> None:
+def hedge_delay() -> float:
+    """
+    The seconds to wait for a search before hedging it: the p95 of the recent
+    searches, once there are enough of them.
     """
-    uses the information parsed to send a message to the user
+    if len(SOURCE.window) < SOURCE.MIN_SAMPLES:
+        return SEARCH_HEDGE_DELAY_MS / 1000
+    return max(SOURCE.window.percentile(95), SEARCH_HEDGE_MIN_DELAY_MS) / 1000
 
-    :param restaurant: the dictionary representing a restaurant returned from dynamodb
-    :param attributes: the request attributes retrieved from the SQS queue
+
+def search_restaurants(cuisine: str) -> list:
     """
-    print(f"send_message: {restaurant}, {attributes}")
-    ses = SesWrapper(boto3.client("ses"))
+    Queries OpenSearch for restaurants serving a cuisine, hedging slow
+    searches, through SEARCH_CIRCUIT.
 
-    phone: str = attributes["phone"]["stringValue"]
-    count: int = attributes["count"]["stringValue"]
-    cuisine: str = attributes["cuisine"]["stringValue"]
-    date: str = attributes["date"]["stringValue"]
-    location: str = attributes["location"]["stringValue"]
-    time: str = attributes["time"]["stringValue"]
-    email: str = attributes["email"]["stringValue"]
+    :param cuisine: the cuisine to search for
+    :return: the ids of the matching restaurants, best first
+    :raises resilience.CircuitOpenError: while the circuit is open
+    """
+    os_query = get_query(cuisine)
+    url: str = CLUSTER_HOST + "/" + INDEX + "/" + "_search"
+    # also imports requests here rather than in the search threads, where the
+    # hedge could otherwise be held up behind the first search's import
+    auth = requests.auth.HTTPBasicAuth(os.getenv("OS_USER"), os.getenv("OS_PASSWORD"))
+
+    def search() -> dict:
+        if not SEARCH_HEDGING:
+            return send_search(url, os_query, auth)
+        return hedged(get_search_pool(), lambda: send_search(url, os_query, auth), hedge_delay(),
+                      on_hedge=lambda: _count_search("hedged"))
+
+    try:
+        response = FLIGHT.do(("search", cuisine), lambda: SEARCH_CIRCUIT.call(search))
+    except CircuitOpenError:
+        _count_search("rejected")
+        raise
+    return handle_os_response(response)
+
+
+def fetch_candidates(cuisine: str, location: str) -> list:
+    """
+    Looks candidate restaurants up in the source SOURCE picks. The OpenSearch
+    index only holds cuisines, so it is the only source not narrowed by location.
 
-    print(
-        f"params: phone: {phone}\ncount: {count}\ncuisine: {cuisine}\ndate: {date}\ntime: {time}")
+    :return: restaurant records from DynamoDB, best first
+    """
+    source = SOURCE.source()
+    if source == MATERIALISED:
+        records = get_candidate_table().get(cuisine, location)
+        if records is not None:
+            return records
+    table = get_restaurant_table()
+    if source == DYNAMODB:
+        return table.query_cuisine_location(cuisine, location)
+    start = time.perf_counter()
+    try:
+        ids = search_restaurants(cuisine)
+    except Exception as err:
+        if not SOURCE.record_failure(err):
+            raise
+        return table.query_cuisine_location(cuisine, location)
+    SOURCE.record((time.perf_counter() - start) * 1000)
+    if not ids:
+        return []
+    return FLIGHT.do(("restaurants", tuple(ids)), lambda: table.get_restaurants(ids))
 
-    rest_name: str = restaurant.get("name")
-    loc_obj: dict = restaurant.get("location")
-    location_display_name: str = loc_obj["display_address"][0]
 
-    print(
-        f"restaurant suggestion: name: {rest_name}, address: {location_display_name}")
+def find_suggestions(cuisine: str, location: str) -> list:
+    """
+    Finds candidate restaurants for a request, from the cache when possible.
+    Concurrent misses for the same pair share one lookup.
 
-    message: str = (
-        f"Hello! Here are my {cuisine} restaurant suggestions for {count} "
-        f"people, for {date} at {time}: {rest_name}, located at {location_display_name}.\n"
-        "Hope you enjoy the suggestions!."
-    )
+    :return: restaurant records from DynamoDB, best first
+    """
+    cache = get_cache()
+    records = cache.get(cuisine, location)
+    if records is None:
+        def fetch() -> list:
+            fetched = fetch_candidates(cuisine, location)
+            cache.put(cuisine, location, fetched)
+            return fetched
+        records = FLIGHT.do(("candidates",) + suggestion_key(cuisine, location), fetch)
+    return records
+
+
+def pick_suggestions(candidates: list) -> list:
+    """
+    Picks the restaurants for one email. Materialised candidates are a longer
+    ranked list, which is sampled so that requests for the same pair get
+    different suggestions; they stay in rank order.
+    """
+    if SOURCE.mode != MATERIALISED or len(candidates) <= SUGGESTIONS_PER_EMAIL:
+        return candidates[:SUGGESTIONS_PER_EMAIL]
+    picked = sorted(random.sample(range(len(candidates)), SUGGESTIONS_PER_EMAIL))
+    return [candidates[i] for i in picked]
 
-    print(f"Message to send:\n{message}")
 
-    msg_id: str = ses.publish(email, message)
-    logger.info("Sent error message.\nMessageId: %s\nBody: %s",
-                msg_id, message)
+def handle_request(request: dict, outbox: list) -> None:
+    """
+    Finds suggestions for one dining request and queues the reply.
+
+    :param request: the dining request decoded from the SQS message
+    :param outbox: collects the emails to send at the end of the batch
+    """
+    suggestions: list = find_suggestions(request["cuisine"], request["location"])
+    if suggestions:
+        send_message(pick_suggestions(suggestions), request, outbox)
+    else:
+        send_error(request, outbox)
 
 
-def send_error(attributes: dict) -> None:
+def send_message(restaurants: list, request: dict, outbox: list) -> None:
     """
-    Sends a generic error message to the user
+    uses the information parsed to queue a message to the user
 
-    :param attributes: the request attributes retrieved from the SQS queueu
+    :param restaurants: the restaurants to suggest, as returned from dynamodb
+    :param request: the dining request decoded from the SQS message
+    :param outbox: collects the emails to send at the end of the batch
     """
-    print(f"send_error: {attributes}")
-    ses = SesWrapper(boto3.client("ses"))
+    # the request holds the user's phone and email, so only ids are logged
+    logger.debug("suggesting %s for %s", [restaurant["id"] for restaurant in restaurants],
+                 request["cuisine"])
+
+    text, body = render_suggestions(request, restaurants)
+    outbox.append(Email(request["email"], text, "suggestion", html=body,
+                        correlation_id=get_correlation_id(), data=dict(
+        cuisine=request["cuisine"], count=request["count"], date=request["date"], time=request["time"],
+        suggestions=[display_fields(restaurant) for restaurant in restaurants],
+    )))
 
-    phone: str = attributes["phone"]["stringValue"]
-    count: int = attributes["count"]["stringValue"]
-    cuisine: str = attributes["cuisine"]["stringValue"]
-    date: str = attributes["date"]["stringValue"]
-    location: str = attributes["location"]["stringValue"]
-    time: str = attributes["time"]["stringValue"]
-    email: str = attributes["email"]["stringValue"]
 
-    message: str = (
-        f"Hi there, unfortunately we don't appear to have any suggestions "
-        f"for {cuisine} in {location}, for {count} guests on {date} at "
-        f"{time}. Please try again when more restaurants have been indexed."
-    )
+def send_error(request: dict, outbox: list) -> None:
+    """
+    Queues a generic error message to the user
+
+    :param request: the dining request decoded from the SQS message
+    :param outbox: collects the emails to send at the end of the batch
+    """
+    logger.debug("no suggestions for %s in %s", request["cuisine"], request["location"])
 
-    msg_id: str = ses.publish(email, message)
-    logger.info("Sent error message.\nMessageId: %s\nBody: %s",
-                msg_id, message)
+    text, body = render_error(request)
+    outbox.append(Email(request["email"], text, "error", html=body,
+                        correlation_id=get_correlation_id(), data=dict(
+        cuisine=request["cuisine"], location=request["location"], count=request["count"],
+        date=request["date"], time=request["time"],
+    )))
 
 
-def query_db(top_id: str) -> Optional[dict]:
+def get_dynamodb():
+    global _dynamodb
+    if _dynamodb is None:
+        _dynamodb = boto3.resource("dynamodb")
+    return _dynamodb
+
+
+def get_restaurant_table() -> RestaurantTable:
+    """
+    Returns the restaurant table, checking that it exists only once per container.
     """
-    Queries dynamodb for the restaurant represented by the
-    id retrieved from OpenSearch
+    global _restaurant_table
+    if _restaurant_table is None:
+        rest_table = RestaurantTable(get_dynamodb())
+        if not rest_table.exists(RestaurantTable.TABLE_NAME):
+            logger.error("Unable to connect to the database")
+        _restaurant_table = rest_table
+    return _restaurant_table
+
+
+def get_candidate_table() -> CandidateTable:
+    global _candidate_table
+    if _candidate_table is None:
+        _candidate_table = CandidateTable.from_env(get_dynamodb())
+    return _candidate_table
+
+
+def get_search_pool() -> ThreadPoolExecutor:
+    global _search_pool
+    if _search_pool is None:
+        # room for every concurrent record's search and its hedge
+        workers = int(os.getenv("SEARCH_MAX_WORKERS", str(max(4, 2 * RECORD_CONCURRENCY))))
+        _search_pool = ThreadPoolExecutor(workers,
+                                          thread_name_prefix="search")
+    return _search_pool
+
+
+def _count_search(name: str) -> None:
+    with _search_counts_lock:
+        _search_counts[name] += 1
+
 
-    :param top_id: the unique id of a restaurant
+def counts_since_last_emit(counts: dict) -> dict:
     """
-    rest_table = RestaurantTable(boto3.resource("dynamodb"))
-    if not rest_table.exists(RestaurantTable.TABLE_NAME):
-        logger.error("Unable to connect to the database")
+    Turns counters kept since the container started into the increase since
+    the previous call, so each invocation's metrics count only its own events.
+    """
+    with _emitted_counts_lock:
+        deltas: dict = {name: value - _emitted_counts.get(name, 0) for name, value in counts.items()}
+        _emitted_counts.update(counts)
+    return deltas
 
-    result = rest_table.get_restaurant(top_id)
-    # print(f"returned result {result} from db")
-    return result
 
+def get_cache() -> SuggestionCache:
+    global _cache
+    if _cache is None:
+        shared = os.getenv("SUGGESTION_CACHE_TABLE") is not None
+        _cache = SuggestionCache.from_env(get_dynamodb() if shared else None)
+    return _cache
 
-def lambda_handler(event, context):
-    for record in event['Records']:
 
-        attributes = record["messageAttributes"]
-        cuisine: str = attributes["cuisine"]["stringValue"]
+def process_record(record: dict) -> list:
+    """
+    Handles one SQS record.
 
-        os_query = get_query(cuisine)
+    :return: the emails to send for it
+    """
+    request: dict = decode_record(record)
+    set_correlation_id(request.get("correlation_id") or record.get("messageId"))
+    sent_timestamp = (record.get("attributes") or {}).get("SentTimestamp")
+    if sent_timestamp:
+        emit_duration("QueueDelay", time.time() * 1000 - int(sent_timestamp))
+    outbox: list = []
+    handle_request(request, outbox)
+    return outbox
 
-        headers = {"Content-Type": "application/json"}
-        url: str = CLUSTER_HOST + "/" + INDEX + "/" + "_search"
 
-        auth = HTTPBasicAuth(os.getenv("OS_USER"), os.getenv("OS_PASSWORD"))
-        response = requests.get(url,
-                                headers=headers,
-                                json=os_query,
-                                auth=auth)
+def record_timeout(context) -> float:
+    """
+    RECORD_TIMEOUT, shortened so that the records finish with SEND_RESERVE_MS
+    of the invocation left. The reserve is scaled down to half of the time
+    left when the invocation is too short for it, and a record always gets at
+    least RECORD_MIN_TIMEOUT.
+    """
+    global _budget_checked
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return RECORD_TIMEOUT
+    remaining_ms = context.get_remaining_time_in_millis()
+    if not _budget_checked:
+        # the function's timeout is only known once the first invocation starts
+        _budget_checked = True
+        if remaining_ms < RECORD_TIMEOUT * 1000 + SEND_RESERVE_MS:
+            logger.warning("The invocation's %dms can't fit RECORD_TIMEOUT (%ss) and SEND_RESERVE_MS (%dms); "
+                           "records will be given less time", remaining_ms, RECORD_TIMEOUT, SEND_RESERVE_MS)
+    reserve_ms = min(SEND_RESERVE_MS, remaining_ms / 2)
+    timeout = min(RECORD_TIMEOUT, (remaining_ms - reserve_ms) / 1000)
+    return max(timeout, min(RECORD_MIN_TIMEOUT, RECORD_TIMEOUT))
 
-        handle_os_response(response.json(), attributes)
-        # print(f"OpenSearch response\n{response}")
+
+def lambda_handler(event, context):
+    # created before the records race to create them: records run on worker
+    # threads, and one that is abandoned may still be running when the next starts
+    get_cache()
+    get_restaurant_table()
+    results = run_records(event['Records'], process_record, RECORD_CONCURRENCY, record_timeout(context))
+    failed: set = {result.record["messageId"] for result in results if not result.ok}
+    if failed and not REPORT_BATCH_ITEM_FAILURES:
+        raise next(result.error for result in results if not result.ok)
+
+    stats: dict = get_cache().stats()
+    flights: dict = FLIGHT.stats()
+    with _search_counts_lock:
+        searches: dict = dict(_search_counts)
+    logger.info("since the container started, suggestion cache: %s, lookups: %s, searches: %s",
+                stats, flights, searches)
+    emit_counts(counts_since_last_emit({
+        "CacheLocalHits": stats["local_hits"], "CacheSharedHits": stats["shared_hits"],
+        "CacheMisses": stats["misses"], "SearchesHedged": searches["hedged"],
+        "SearchesRejected": searches["rejected"], "LookupsUnique": flights["unique"],
+        "LookupsCoalesced": flights["coalesced"]}))
+
+    outbox: list = []
+    senders: list = []
+    for result in results:
+        if result.ok:
+            outbox.extend(result.value)
+            senders.extend([result.record["messageId"]] * len(result.value))
+
+    # all of the batch's emails go out concurrently
+    msg_ids: list = SES.send_all(outbox)
+    logger.info("Sent %d of %d emails", sum(1 for msg_id in msg_ids if msg_id), len(outbox))
+    if None in msg_ids:
+        if not REPORT_BATCH_ITEM_FAILURES:
+            raise RuntimeError(f"{msg_ids.count(None)} of {len(outbox)} emails could not be sent")
+        failed.update(sender for sender, msg_id in zip(senders, msg_ids) if msg_id is None)
+
+    if REPORT_BATCH_ITEM_FAILURES:
+        emit_counts({"RecordsFailed": len(failed)})
+        return {"batchItemFailures": [{"itemIdentifier": result.record["messageId"]}
+                                      for result in results if result.record["messageId"] in failed]}
@@ -0,0 +1,141 @@
+"""
+Runs the records of an SQS batch concurrently, for lf2.
+
+Records run on a thread pool, at most `concurrency` at a time, so a batch takes
+about as long as its slowest record rather than the sum of all of them.
+Records that share a MessageGroupId (FIFO queues) still run one after another,
+in order, and when one of them fails or times out the rest of its group are
+not run, so they are retried in order too. Each record runs in its own
+context, so correlation ids set while handling one record do not leak into
+another, and its errors are captured instead of failing the whole batch.
+
+A record that overruns its timeout is abandoned rather than interrupted: its
+thread runs on in the background but its result is discarded, so a record's
+handler should only have side effects through the value it returns. With a
+timeout, records run on worker threads even when only one runs at a time, and
+the rest of the batch moves to fresh threads once one is abandoned.
+"""
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RecordTimeoutError(TimeoutError):
+    """Set as the error of a record that did not finish within its timeout."""
+
+
+class RecordSkippedError(RuntimeError):
+    """Set as the error of a record not run because an earlier one of its group failed."""
+
+
+class RecordResult:
+    """What handling one record returned, or why it failed."""
+
+    __slots__ = ("record", "value", "error")
+
+    def __init__(self, record: dict) -> None:
+        self.record: dict = record
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def message_group(record: dict) -> str:
+    """
+    The ordering group of a record: its MessageGroupId on a FIFO queue, or
+    the record alone on a standard queue.
+    """
+    group = (record.get("attributes") or {}).get("MessageGroupId")
+    return f"group:{group}" if group else f"message:{record.get('messageId', id(record))}"
+
+
+def run_records(records: List[dict], handle: Callable[[dict], object], concurrency: int = 1,
+                timeout: Optional[float] = None) -> List[RecordResult]:
+    """
+    Handles every record, concurrently across message groups.
+
+    :param records: the records of the batch, in the order received
+    :param handle: handles one record; its return value becomes the result's value
+    :param concurrency: the most records handled at once
+    :param timeout: seconds each record may take once started; without one,
+                    a concurrency of 1 handles the records on the calling thread
+    :return: the results, in the order of records
+    """
+    results: List[RecordResult] = [RecordResult(record) for record in records]
+    groups: OrderedDict = OrderedDict()
+    for result in results:
+        groups.setdefault(message_group(result.record), deque()).append(result)
+
+    def fail_rest(group: str, result: RecordResult) -> None:
+        for skipped in groups[group]:
+            skipped.error = RecordSkippedError(
+                f"not run as message {result.record.get('messageId')} of its group failed")
+        groups[group].clear()
+
+    if concurrency <= 1 and timeout is None:
+        for group, pending in groups.items():
+            while pending:
+                result = pending.popleft()
+                try:
+                    result.value = contextvars.Context().run(handle, result.record)
+                except Exception as err:
+                    logger.exception("Couldn't handle message %s", result.record.get("messageId"))
+                    result.error = err
+                    fail_rest(group, result)
+        return results
+
+    concurrency = max(concurrency, 1)
+    executor = ThreadPoolExecutor(concurrency, thread_name_prefix="record")
+    ready: deque = deque(groups)
+    running: dict = {}
+    try:
+        while ready or running:
+            while ready and len(running) < concurrency:
+                group = ready.popleft()
+                result = groups[group].popleft()
+                future = executor.submit(contextvars.Context().run, handle, result.record)
+                deadline = time.monotonic() + timeout if timeout is not None else None
+                running[future] = (group, result, deadline)
+
+            deadlines = [deadline for _, _, deadline in running.values() if deadline is not None]
+            wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                group, result, _ = running.pop(future)
+                try:
+                    result.value = future.result()
+                except Exception as err:
+                    logger.exception("Couldn't handle message %s", result.record.get("messageId"))
+                    result.error = err
+                    fail_rest(group, result)
+                    continue
+                if groups[group]:
+                    ready.append(group)
+
+            now = time.monotonic()
+            abandoned = False
+            for future, (group, result, deadline) in list(running.items()):
+                if deadline is not None and deadline <= now and not future.done():
+                    del running[future]
+                    logger.error("Abandoned message %s after %ss", result.record.get("messageId"), timeout)
+                    result.error = RecordTimeoutError(f"not handled within {timeout}s")
+                    fail_rest(group, result)
+                    abandoned = True
+            if abandoned and (ready or running):
+                # the abandoned records keep their threads busy, so the records
+                # still to start get a pool of their own
+                executor.shutdown(wait=False)
+                executor = ThreadPoolExecutor(concurrency, thread_name_prefix="record")
+    finally:
+        # abandoned records finish in the background
+        executor.shutdown(wait=False)
+    return results
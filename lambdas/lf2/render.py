@@ -0,0 +1,108 @@
+"""
+Renders the emails lf2 sends.
+
+Each template is parsed and validated once per container, so rendering a
+message is a single format_map call. Every message is rendered as plain text
+and as HTML, with the HTML values escaped.
+"""
+import html
+from string import Formatter
+from typing import Tuple
+
+_formatter: Formatter = Formatter()
+
+
+class CompiledTemplate:
+    """
+    A str.format-style template, validated and parsed for its field names
+    once, then rendered with a single format_map call.
+    """
+
+    __slots__ = ("template", "fields", "escape")
+
+    def __init__(self, template: str, escape: bool = False) -> None:
+        """
+        :param template: the template, using {name} placeholders
+        :param escape: HTML-escape the values substituted into the template
+        """
+        self.template: str = template
+        self.escape: bool = escape
+        fields: list = []
+        for _, field, spec, conversion in _formatter.parse(template):
+            if field is None:
+                continue
+            if spec or conversion or not field.isidentifier():
+                raise ValueError(f"only plain {{name}} fields are supported: {field}")
+            fields.append(field)
+        self.fields: tuple = tuple(fields)
+
+    def render(self, values: dict) -> str:
+        if self.escape:
+            values = {field: html.escape(str(values[field])) for field in self.fields}
+        return self.template.format_map(values)
+
+
+SUGGESTION_TEXT: CompiledTemplate = CompiledTemplate(
+    "Hello! Here are my {cuisine} restaurant suggestions for {count} "
+    "people, for {date} at {time}:\n{suggestions}\n"
+    "Hope you enjoy the suggestions!"
+)
+SUGGESTION_TEXT_ITEM: CompiledTemplate = CompiledTemplate("{rank}. {name}, located at {address}")
+
+SUGGESTION_HTML: CompiledTemplate = CompiledTemplate(
+    "<p>Hello! Here are my {cuisine} restaurant suggestions for {count} "
+    "people, for {date} at {time}:</p><ol>{suggestions}</ol>"
+    "<p>Hope you enjoy the suggestions!</p>"
+)
+SUGGESTION_HTML_ITEM: CompiledTemplate = CompiledTemplate(
+    "<li><strong>{name}</strong>, located at {address}</li>", escape=True)
+
+ERROR_TEXT: CompiledTemplate = CompiledTemplate(
+    "Hi there, unfortunately we don't appear to have any suggestions "
+    "for {cuisine} in {location}, for {count} guests on {date} at "
+    "{time}. Please try again when more restaurants have been indexed."
+)
+ERROR_HTML: CompiledTemplate = CompiledTemplate(
+    "<p>Hi there, unfortunately we don't appear to have any suggestions "
+    "for {cuisine} in {location}, for {count} guests on {date} at "
+    "{time}. Please try again when more restaurants have been indexed.</p>",
+    escape=True
+)
+
+
+def display_fields(restaurant: dict) -> dict:
+    """
+    Picks the fields an email shows from a restaurant record.
+    """
+    return {
+        "name": restaurant.get("name"),
+        "address": restaurant["location"]["display_address"][0],
+    }
+
+
+def render_suggestions(request: dict, restaurants: list) -> Tuple[str, str]:
+    """
+    Renders the suggestion email for a request.
+
+    :param request: the dining request
+    :param restaurants: the restaurant records to suggest, best first
+    :return: (text, html)
+    """
+    items: list = [dict(display_fields(restaurant), rank=rank)
+                   for rank, restaurant in enumerate(restaurants, 1)]
+    text = SUGGESTION_TEXT.render(dict(
+        request, suggestions="\n".join([SUGGESTION_TEXT_ITEM.render(item) for item in items])))
+    # the list items are escaped as they are rendered, the rest of the request here
+    escaped: dict = {key: html.escape(str(request[key])) for key in ("cuisine", "count", "date", "time")}
+    escaped["suggestions"] = "".join([SUGGESTION_HTML_ITEM.render(item) for item in items])
+    body = SUGGESTION_HTML.render(escaped)
+    return text, body
+
+
+def render_error(request: dict) -> Tuple[str, str]:
+    """
+    Renders the "no suggestions" email for a request.
+
+    :return: (text, html)
+    """
+    return ERROR_TEXT.render(request), ERROR_HTML.render(request)
@@ -0,0 +1,130 @@
+"""
+Keeps a slow or failing dependency from holding lf2's records hostage.
+
+CircuitBreaker stops calling a dependency after several consecutive
+failures and fails fast until a cool-down has passed, then lets a single
+trial call through to decide whether to close again. hedged() sends a second,
+identical request when the first has not answered within a delay, and
+returns whichever answers first, which cuts the tail a single slow node adds.
+
+Configuration (environment), for a breaker made with from_env(prefix):
+    <PREFIX>_CIRCUIT_FAILURES   consecutive failures that open the circuit
+    <PREFIX>_CIRCUIT_RESET      seconds the circuit stays open
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency while its circuit is open."""
+
+
+class CircuitBreaker:
+    """A per-container circuit breaker around calls to one dependency."""
+
+    CLOSED: str = "closed"
+    OPEN: str = "open"
+    HALF_OPEN: str = "half-open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30) -> None:
+        """
+        :param name: the dependency, used in logs and errors
+        :param failure_threshold: consecutive failures that open the circuit
+        :param reset_timeout: seconds before an open circuit lets a trial call through
+        """
+        self.name: str = name
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.state: str = self.CLOSED
+        self.failures: int = 0
+        self.opened_at: float = 0.0
+        self.lock: threading.Lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "CircuitBreaker":
+        return cls(name, int(os.getenv(f"{prefix}_CIRCUIT_FAILURES", "5")),
+                   float(os.getenv(f"{prefix}_CIRCUIT_RESET", "30")))
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go ahead. Once the cool-down has passed, only the
+        first caller is let through, as the trial.
+        """
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.state != self.CLOSED:
+                logger.info("Closing the %s circuit", self.name)
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Opening the %s circuit for %ss after %d failure(s)",
+                                   self.name, self.reset_timeout, self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, func: Callable, *args, **kwargs):
+        """
+        Calls func through the breaker.
+
+        :raises CircuitOpenError: when the circuit is open
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"the {self.name} circuit is open")
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+def hedged(executor: Executor, call: Callable, delay: float, on_hedge: Callable = None):
+    """
+    Calls call(), and calls it again if the first call has not returned within
+    delay seconds; the first of the two to succeed wins. The loser is left to
+    finish in the background, so call should have its own timeout.
+
+    :param executor: runs the calls; the caller's context variables, such as
+                     the correlation id, are copied into them
+    :param delay: seconds to wait before hedging
+    :param on_hedge: called when the second request is sent
+    :return: the result of the first call to succeed
+    :raises: the last error, when both calls fail
+    """
+    first = executor.submit(contextvars.copy_context().run, call)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+    if on_hedge is not None:
+        on_hedge()
+    pending = {first, executor.submit(contextvars.copy_context().run, call)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except Exception as err:
+                error = err
+    raise error
@@ -0,0 +1,243 @@
+"""
+Sends lf2's suggestion emails through one shared SES client.
+
+A batch of emails is dispatched concurrently on a thread pool, throttled by a
+token bucket to the account's SES send-rate quota, so the latency of a batch
+is roughly that of its slowest send rather than the sum of all of them.
+When SES templates have been registered, emails of that kind are sent with
+send_bulk_templated_email instead (up to 50 destinations per call).
+
+Configuration (environment):
+    SES_SENDER              the From address
+    SES_MAX_SEND_RATE       the account's maximum sends per second
+    SES_MAX_WORKERS         the size of the send thread pool
+    SES_TEMPLATE_SUGGESTION the registered template for suggestion emails
+    SES_TEMPLATE_ERROR      the registered template for "no suggestions" emails
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SENDER: str = "AWS SES <ab7289@nyu.edu>"
+SUBJECT: str = "DiningConcierge SES"
+CHARSET: str = "UTF-8"
+MAX_BULK_DESTINATIONS: int = 50
+
+# what a send can fail with: an error from SES, or one reaching it, such as a
+# connection error or a read timeout
+SEND_ERRORS: tuple = (ClientError, BotoCoreError)
+
+
+def error_message(err: Exception) -> str:
+    if isinstance(err, ClientError):
+        return err.response["Error"]["Message"]
+    return str(err)
+
+
+class TokenBucket:
+    """A thread-safe token bucket refilled at a fixed rate."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        """
+        :param rate: tokens added per second
+        :param capacity: the most tokens that can accumulate, defaults to rate
+        """
+        self.rate: float = rate
+        self.capacity: float = capacity if capacity is not None else max(rate, 1)
+        self.tokens: float = self.capacity
+        self.updated: float = time.monotonic()
+        self.lock: threading.Lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> None:
+        """
+        Blocks until tokens are available, then takes them.
+
+        :raises ValueError: when more tokens are asked for than the bucket can
+                            ever hold, which would otherwise block forever
+        """
+        if tokens > self.capacity:
+            raise ValueError(f"can't acquire {tokens} tokens from a bucket of capacity {self.capacity}")
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Email:
+    """An outgoing email, with the data to fill its template if it has one."""
+
+    __slots__ = ("to", "text", "html", "kind", "data", "correlation_id")
+
+    def __init__(self, to: str, text: str, kind: str, data: Optional[dict] = None,
+                 html: Optional[str] = None, correlation_id: Optional[str] = None) -> None:
+        """
+        :param to: the recipient address
+        :param text: the plain text body
+        :param kind: "suggestion" or "error", used to pick a template
+        :param data: the template data, used in templated mode
+        :param html: an optional HTML alternative to the text body
+        :param correlation_id: the id of the request the email answers
+        """
+        self.to: str = to
+        self.text: str = text
+        self.html: Optional[str] = html
+        self.kind: str = kind
+        self.data: dict = data or {}
+        self.correlation_id: Optional[str] = correlation_id
+
+
+class SesSender:
+    """Sends batches of Email through a single SES client."""
+
+    def __init__(self, client=None, sender: str = DEFAULT_SENDER, max_send_rate: float = 14,
+                 max_workers: int = 8, templates: Optional[dict] = None) -> None:
+        """
+        :param client: an SES client; created on first use when omitted
+        :param sender: the From address
+        :param max_send_rate: the SES send-rate quota, in emails per second
+        :param max_workers: the number of concurrent sends
+        :param templates: maps an Email kind to a registered SES template name
+        """
+        self._client = client
+        self.sender: str = sender
+        self.bucket: TokenBucket = TokenBucket(max_send_rate)
+        self.max_workers: int = max_workers
+        self.templates: dict = templates or {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls) -> "SesSender":
+        templates: dict = {}
+        for kind in ("suggestion", "error"):
+            template = os.getenv(f"SES_TEMPLATE_{kind.upper()}")
+            if template:
+                templates[kind] = template
+        return cls(
+            sender=os.getenv("SES_SENDER", DEFAULT_SENDER),
+            max_send_rate=float(os.getenv("SES_MAX_SEND_RATE", "14")),
+            max_workers=int(os.getenv("SES_MAX_WORKERS", "8")),
+            templates=templates,
+        )
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client("ses")
+        return self._client
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ses")
+        return self._pool
+
+    def publish(self, email: Email) -> str:
+        """
+        Sends a single email.
+
+        :return: the SES MessageId
+        """
+        body: dict = {"Text": {"Charset": CHARSET, "Data": email.text}}
+        if email.html is not None:
+            body["Html"] = {"Charset": CHARSET, "Data": email.html}
+        self.bucket.acquire()
+        try:
+            with span("SES", "SendEmail", correlation_id=email.correlation_id):
+                response = self.client.send_email(
+                    Destination={"ToAddresses": [email.to]},
+                    Message={
+                        "Body": body,
+                        "Subject": {"Charset": CHARSET, "Data": SUBJECT},
+                    },
+                    Source=self.sender
+                )
+        except SEND_ERRORS as e:
+            logger.error("There was an error sending email: %s", error_message(e))
+            raise
+        return response["MessageId"]
+
+    def publish_templated(self, template: str, emails: List[Email]) -> List[Optional[str]]:
+        """
+        Sends emails sharing one registered template with send_bulk_templated_email.
+
+        :return: the MessageId of each email, or None where SES rejected it
+                 or its call failed
+        """
+        ids: list = []
+        # a call takes a token per destination, so never more than the bucket holds
+        chunk_size = max(1, min(MAX_BULK_DESTINATIONS, int(self.bucket.capacity)))
+        for start in range(0, len(emails), chunk_size):
+            chunk = emails[start:start + chunk_size]
+            self.bucket.acquire(len(chunk))
+            try:
+                with span("SES", "SendBulkTemplatedEmail"):
+                    response = self.client.send_bulk_templated_email(
+                        Source=self.sender,
+                        Template=template,
+                        DefaultTemplateData="{}",
+                        Destinations=[
+                            {
+                                "Destination": {"ToAddresses": [email.to]},
+                                "ReplacementTemplateData": json.dumps(email.data, default=str),
+                            }
+                            for email in chunk
+                        ],
+                    )
+            except SEND_ERRORS as e:
+                # only this chunk failed; the earlier ones were sent
+                logger.error("There was an error sending templated email: %s", error_message(e))
+                ids.extend([None] * len(chunk))
+                continue
+            for status in response["Status"]:
+                if status["Status"] != "Success":
+                    logger.error("SES rejected a templated email: %s: %s",
+                                 status["Status"], status.get("Error"))
+                ids.append(status.get("MessageId") if status["Status"] == "Success" else None)
+        return ids
+
+    def send_all(self, emails: List[Email]) -> List[Optional[str]]:
+        """
+        Sends a batch of emails concurrently. A failed send does not affect
+        the others.
+
+        :return: the MessageId of each email in order, or None where it failed
+        """
+        results: list = [None] * len(emails)
+        templated: dict = {}
+        futures: list = []
+        for i, email in enumerate(emails):
+            template = self.templates.get(email.kind)
+            if template is not None:
+                templated.setdefault(template, []).append(i)
+            else:
+                futures.append((i, self.pool.submit(self.publish, email)))
+
+        for template, indexes in templated.items():
+            ids = self.publish_templated(template, [emails[i] for i in indexes])
+            for i, msg_id in zip(indexes, ids):
+                results[i] = msg_id
+
+        for i, future in futures:
+            try:
+                results[i] = future.result()
+            except SEND_ERRORS:
+                # logged by publish; the caller retries only this email's record
+                pass
+        return results
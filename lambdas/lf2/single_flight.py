@@ -0,0 +1,68 @@
+"""
+Coalesces identical calls that are in flight at the same time.
+
+When lf2 handles records concurrently, a burst of requests for the same
+cuisine and location misses the cache together and would each make the same
+searches and DynamoDB reads. SingleFlight lets the first caller for a key make
+the call while the others wait for, and share, its result or its error.
+Nothing is kept once the call returns; repeated lookups are the cache's job.
+"""
+import threading
+from typing import Callable, Hashable
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self) -> None:
+        self.done: threading.Event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time, sharing its outcome."""
+
+    def __init__(self) -> None:
+        self.calls: dict = {}
+        self.lock: threading.Lock = threading.Lock()
+        self.counters: dict = {"unique": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, func: Callable):
+        """
+        Calls func, unless a call for key is already in flight, in which case
+        waits for that call instead.
+
+        :return: what the call for key returned
+        :raises: what the call for key raised
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.counters["unique"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+            return call.value
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        """Returns the unique and coalesced call counters since the container started."""
+        with self.lock:
+            return dict(self.counters)
@@ -0,0 +1,116 @@
+"""
+Chooses where lf2 looks suggestion candidates up: OpenSearch, the table's
+Cuisine/Location index in DynamoDB, or the candidates materialised at ingest.
+
+In "auto" mode OpenSearch is used while it is healthy. The latency of its
+recent searches is tracked per container, and while their p95 is over the
+budget, or after a search fails, lookups go to DynamoDB for a cool-down
+period before OpenSearch is tried again.
+
+Configuration (environment):
+    SUGGESTION_SOURCE               "opensearch" (default), "dynamodb", "materialised" or "auto"
+    OPENSEARCH_LATENCY_BUDGET_MS    the p95 search latency tolerated in auto mode
+    SUGGESTION_SOURCE_COOLDOWN      seconds to stay on DynamoDB once switched
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+OPENSEARCH: str = "opensearch"
+DYNAMODB: str = "dynamodb"
+AUTO: str = "auto"
+# pairs that have not been materialised are looked up in OpenSearch
+MATERIALISED: str = "materialised"
+
+
+class LatencyWindow:
+    """The latencies of the most recent calls, for percentiles over a sliding window."""
+
+    def __init__(self, size: int = 100) -> None:
+        self.samples: deque = deque(maxlen=size)
+        self.lock: threading.Lock = threading.Lock()
+
+    def add(self, milliseconds: float) -> None:
+        with self.lock:
+            self.samples.append(milliseconds)
+
+    def percentile(self, q: float) -> float:
+        """
+        The nearest-rank percentile of the window, or 0 when it is empty.
+
+        :param q: the percentile, from 0 to 100
+        """
+        with self.lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+class SourceSelector:
+    """Picks the suggestion source for each lookup."""
+
+    MIN_SAMPLES: int = 10
+
+    def __init__(self, mode: str = OPENSEARCH, budget_ms: float = 500, cooldown: float = 30,
+                 window: LatencyWindow = None) -> None:
+        """
+        :param mode: OPENSEARCH, DYNAMODB, MATERIALISED or AUTO
+        :param budget_ms: in AUTO mode, the p95 OpenSearch latency tolerated
+        :param cooldown: in AUTO mode, seconds to use DynamoDB once switched
+        :param window: the recent OpenSearch latencies
+        """
+        if mode not in (OPENSEARCH, DYNAMODB, MATERIALISED, AUTO):
+            raise ValueError(f"unknown suggestion source {mode}")
+        self.mode: str = mode
+        self.budget_ms: float = budget_ms
+        self.cooldown: float = cooldown
+        self.window: LatencyWindow = window or LatencyWindow()
+        self.fallback_until: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> "SourceSelector":
+        return cls(
+            mode=os.getenv("SUGGESTION_SOURCE", OPENSEARCH).lower(),
+            budget_ms=float(os.getenv("OPENSEARCH_LATENCY_BUDGET_MS", "500")),
+            cooldown=float(os.getenv("SUGGESTION_SOURCE_COOLDOWN", "30")),
+        )
+
+    def source(self) -> str:
+        if self.mode != AUTO:
+            return self.mode
+        return DYNAMODB if time.monotonic() < self.fallback_until else OPENSEARCH
+
+    def _fall_back(self, reason: str) -> None:
+        if time.monotonic() >= self.fallback_until:
+            logger.warning("Serving suggestions from DynamoDB for %ss: %s", self.cooldown, reason)
+        self.fallback_until = time.monotonic() + self.cooldown
+
+    def record(self, milliseconds: float) -> None:
+        """Records the latency of a successful OpenSearch search."""
+        self.window.add(milliseconds)
+        if self.mode == AUTO and len(self.window) >= self.MIN_SAMPLES:
+            p95 = self.window.percentile(95)
+            if p95 > self.budget_ms:
+                self._fall_back(f"p95 search latency {p95:.0f}ms is over the {self.budget_ms:.0f}ms budget")
+                # judge OpenSearch afresh once the cool-down is over
+                self.window.samples.clear()
+
+    def record_failure(self, err: Exception) -> bool:
+        """
+        Records a failed OpenSearch search.
+
+        :return: True when the lookup should be retried against DynamoDB
+        """
+        if self.mode != AUTO:
+            return False
+        self._fall_back(f"search failed: {err!r}")
+        return True
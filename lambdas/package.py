@@ -0,0 +1,122 @@
+"""
+Builds the deployment zips for the Lambdas and the shared layer.
+
+Each function zip holds the function's own modules plus whatever its
+requirements.txt lists, minus the packages the Python runtime already
+provides. The shared modules in common/ are zipped under python/ as a
+layer, which the runtime puts on sys.path; every function, the sample
+BookTrip bot included, imports from it, so each must be deployed with the
+layer attached. The handler is lambda_function.lambda_handler, except for the
+sample bot's lambda_lex.lambda_handler.
+
+    python lambdas/package.py --out build
+    python lambdas/package.py --out build lf1 lf2
+"""
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+LAMBDAS: str = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONS: tuple = ("lf0", "lf1", "lf2", "ddb-to-opensearch", "sample")
+LAYER: str = "common"
+
+# shipped with the Lambda Python runtime, so bundling them only adds init time
+RUNTIME_PROVIDED: frozenset = frozenset({"boto3", "botocore", "s3transfer", "jmespath"})
+
+SKIPPED_DIRS: frozenset = frozenset({"__pycache__", ".pytest_cache"})
+
+
+def requirements(function: str) -> list:
+    """
+    Reads a function's requirements, dropping the runtime-provided packages.
+    """
+    path = os.path.join(LAMBDAS, function, "requirements.txt")
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        lines = [line.split("#")[0].strip() for line in file]
+    return [line for line in lines if line and _name(line) not in RUNTIME_PROVIDED]
+
+
+def _name(requirement: str) -> str:
+    for separator in ("[", "=", "<", ">", "~", "!", ";", " "):
+        requirement = requirement.split(separator)[0]
+    return requirement.lower().replace("_", "-")
+
+
+def _add_tree(archive: zipfile.ZipFile, source: str, prefix: str = "") -> None:
+    for directory, dirs, files in os.walk(source):
+        dirs[:] = [d for d in dirs if d not in SKIPPED_DIRS and not d.endswith(".dist-info")]
+        for name in files:
+            # requirements.txt and deployment config such as event_filter.json stay out
+            if name.endswith((".pyc", ".txt", ".json")) and directory == source:
+                continue
+            path = os.path.join(directory, name)
+            archive.write(path, os.path.join(prefix, os.path.relpath(path, source)))
+
+
+def _install(packages: list, target: str) -> None:
+    subprocess.run([sys.executable, "-m", "pip", "install", "--quiet", "--no-compile",
+                    "--target", target, *packages], check=True)
+    # pip pulls the runtime-provided packages back in as transitive dependencies
+    for name in os.listdir(target):
+        if _name(name.split("-")[0]) in RUNTIME_PROVIDED:
+            shutil.rmtree(os.path.join(target, name))
+
+
+def build_function(function: str, out: str) -> str:
+    """
+    Zips a function with its trimmed dependencies.
+
+    :return: the path of the zip
+    """
+    path = os.path.join(out, f"{function}.zip")
+    with tempfile.TemporaryDirectory() as deps, zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        packages = requirements(function)
+        if packages:
+            _install(packages, deps)
+            _add_tree(archive, deps)
+        _add_tree(archive, os.path.join(LAMBDAS, function))
+    logger.info("Built %s with %s", path, packages or "no dependencies")
+    return path
+
+
+def build_layer(out: str) -> str:
+    """
+    Zips the shared modules as a layer.
+
+    :return: the path of the zip
+    """
+    path = os.path.join(out, f"{LAYER}-layer.zip")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        _add_tree(archive, os.path.join(LAMBDAS, LAYER), "python")
+    logger.info("Built %s", path)
+    return path
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("functions", nargs="*", metavar="function",
+                        help="the functions to build, defaults to all of them")
+    parser.add_argument("--out", default="build", help="the directory to write the zips to")
+    args = parser.parse_args(argv)
+    unknown = set(args.functions) - set(FUNCTIONS)
+    if unknown:
+        parser.error(f"unknown functions {sorted(unknown)}, choose from {', '.join(FUNCTIONS)}")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    os.makedirs(args.out, exist_ok=True)
+    build_layer(args.out)
+    for function in args.functions or FUNCTIONS:
+        build_function(function, args.out)
+
+
+if __name__ == "__main__":
+    main()
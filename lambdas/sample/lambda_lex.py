@@ -10,109 +10,28 @@ visit the Lex Getting Started documentation http://docs.aws.amazon.com/lex/lates
 
 import json
 import datetime
-import time
 import os
-import dateutil.parser
 import logging
 
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+from codehook import Dispatcher, IntentRequest, LexV1Request, plain_text
+from pricing import CAR_TYPE_INDEX, ROOM_TYPE_INDEX, car_daily_rate, hotel_nightly_rate
+from validation import build_validation_result, isvalid_city, parse_date, safe_int, today
 
+logger = logging.getLogger(__name__)
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
 
-# --- Helpers that build all of the responses ---
-
-
-def elicit_slot(session_attributes, intent_name, slots, slot_to_elicit, message):
-    return {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'ElicitSlot',
-            'intentName': intent_name,
-            'slots': slots,
-            'slotToElicit': slot_to_elicit,
-            'message': message
-        }
-    }
-
-
-def confirm_intent(session_attributes, intent_name, slots, message):
-    return {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'ConfirmIntent',
-            'intentName': intent_name,
-            'slots': slots,
-            'message': message
-        }
-    }
-
-
-def close(session_attributes, fulfillment_state, message):
-    response = {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'Close',
-            'fulfillmentState': fulfillment_state,
-            'message': message
-        }
-    }
-
-    return response
-
-
-def delegate(session_attributes, slots):
-    return {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'Delegate',
-            'slots': slots
-        }
-    }
+dispatcher: Dispatcher = Dispatcher(LexV1Request)
 
 
 # --- Helper Functions ---
 
 
-def safe_int(n):
-    """
-    Safely convert n value to int.
-    """
-    if n is not None:
-        return int(n)
-    return n
-
-
-def try_ex(func):
-    """
-    Call passed in function in try block. If KeyError is encountered return None.
-    This function is intended to be used to safely access dictionary.
-
-    Note that this function would have negative impact on performance.
-    """
-
-    try:
-        return func()
-    except KeyError:
-        return None
-
-
 def generate_car_price(location, days, age, car_type):
     """
     Generates a number within a reasonable range that might be expected for a flight.
     The price is fixed for a given pair of locations.
     """
-
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
-    base_location_cost = 0
-    for i in range(len(location)):
-        base_location_cost += ord(location.lower()[i]) - 97
-
-    age_multiplier = 1.10 if age < 25 else 1
-    # Select economy is car_type is not found
-    if car_type not in car_types:
-        car_type = car_types[0]
-
-    return days * ((100 + base_location_cost) + ((car_types.index(car_type.lower()) * 50) * age_multiplier))
+    return days * car_daily_rate(location, age, car_type)
 
 
 def generate_hotel_price(location, nights, room_type):
@@ -120,67 +39,32 @@ def generate_hotel_price(location, nights, room_type):
     Generates a number within a reasonable range that might be expected for a hotel.
     The price is fixed for a pair of location and roomType.
     """
-
-    room_types = ['queen', 'king', 'deluxe']
-    cost_of_living = 0
-    for i in range(len(location)):
-        cost_of_living += ord(location.lower()[i]) - 97
-
-    return nights * (100 + cost_of_living + (100 + room_types.index(room_type.lower())))
+    return nights * hotel_nightly_rate(location, room_type)
 
 
 def isvalid_car_type(car_type):
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
-    return car_type.lower() in car_types
-
-
-def isvalid_city(city):
-    valid_cities = ['new york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio',
-                    'san diego', 'dallas', 'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis',
-                    'columbus', 'fort worth', 'charlotte', 'detroit', 'el paso', 'seattle', 'denver', 'washington dc',
-                    'memphis', 'boston', 'nashville', 'baltimore', 'portland']
-    return city.lower() in valid_cities
+    return car_type.lower() in CAR_TYPE_INDEX
 
 
 def isvalid_room_type(room_type):
-    room_types = ['queen', 'king', 'deluxe']
-    return room_type.lower() in room_types
-
-
-def isvalid_date(date):
-    try:
-        dateutil.parser.parse(date)
-        return True
-    except ValueError:
-        return False
+    return room_type.lower() in ROOM_TYPE_INDEX
 
 
 def get_day_difference(later_date, earlier_date):
-    later_datetime = dateutil.parser.parse(later_date).date()
-    earlier_datetime = dateutil.parser.parse(earlier_date).date()
-    return abs(later_datetime - earlier_datetime).days
+    return abs(parse_date(later_date) - parse_date(earlier_date)).days
 
 
 def add_days(date, number_of_days):
-    new_date = dateutil.parser.parse(date).date()
-    new_date += datetime.timedelta(days=number_of_days)
-    return new_date.strftime('%Y-%m-%d')
-
-
-def build_validation_result(isvalid, violated_slot, message_content):
-    return {
-        'isValid': isvalid,
-        'violatedSlot': violated_slot,
-        'message': {'contentType': 'PlainText', 'content': message_content}
-    }
+    new_date = parse_date(date) + datetime.timedelta(days=number_of_days)
+    return new_date.isoformat()
 
 
 def validate_book_car(slots):
-    pickup_city = try_ex(lambda: slots['PickUpCity'])
-    pickup_date = try_ex(lambda: slots['PickUpDate'])
-    return_date = try_ex(lambda: slots['ReturnDate'])
-    driver_age = safe_int(try_ex(lambda: slots['DriverAge']))
-    car_type = try_ex(lambda: slots['CarType'])
+    pickup_city = slots.get('PickUpCity')
+    pickup_date = slots.get('PickUpDate')
+    return_date = slots.get('ReturnDate')
+    driver_age = safe_int(slots.get('DriverAge'))
+    car_type = slots.get('CarType')
 
     if pickup_city and not isvalid_city(pickup_city):
         return build_validation_result(
@@ -190,17 +74,17 @@ def validate_book_car(slots):
         )
 
     if pickup_date:
-        if not isvalid_date(pickup_date):
+        if parse_date(pickup_date) is None:
             return build_validation_result(False, 'PickUpDate', 'I did not understand your departure date.  When would you like to pick up your car rental?')
-        if datetime.datetime.strptime(pickup_date, '%Y-%m-%d').date() <= datetime.date.today():
+        if parse_date(pickup_date) <= today():
             return build_validation_result(False, 'PickUpDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?')
 
     if return_date:
-        if not isvalid_date(return_date):
+        if parse_date(return_date) is None:
             return build_validation_result(False, 'ReturnDate', 'I did not understand your return date.  When would you like to return your car rental?')
 
     if pickup_date and return_date:
-        if dateutil.parser.parse(pickup_date) >= dateutil.parser.parse(return_date):
+        if parse_date(pickup_date) >= parse_date(return_date):
             return build_validation_result(False, 'ReturnDate', 'Your return date must be after your pick up date.  Can you try a different return date?')
 
         if get_day_difference(pickup_date, return_date) > 30:
@@ -224,10 +108,10 @@ def validate_book_car(slots):
 
 
 def validate_hotel(slots):
-    location = try_ex(lambda: slots['Location'])
-    checkin_date = try_ex(lambda: slots['CheckInDate'])
-    nights = safe_int(try_ex(lambda: slots['Nights']))
-    room_type = try_ex(lambda: slots['RoomType'])
+    location = slots.get('Location')
+    checkin_date = slots.get('CheckInDate')
+    nights = safe_int(slots.get('Nights'))
+    room_type = slots.get('RoomType')
 
     if location and not isvalid_city(location):
         return build_validation_result(
@@ -237,9 +121,9 @@ def validate_hotel(slots):
         )
 
     if checkin_date:
-        if not isvalid_date(checkin_date):
+        if parse_date(checkin_date) is None:
             return build_validation_result(False, 'CheckInDate', 'I did not understand your check in date.  When would you like to check in?')
-        if datetime.datetime.strptime(checkin_date, '%Y-%m-%d').date() <= datetime.date.today():
+        if parse_date(checkin_date) <= today():
             return build_validation_result(False, 'CheckInDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?')
 
     if nights is not None and (nights < 1 or nights > 30):
@@ -258,7 +142,8 @@ def validate_hotel(slots):
 """ --- Functions that control the bot's behavior --- """
 
 
-def book_hotel(intent_request):
+@dispatcher.intent('BookHotel')
+def book_hotel(request: IntentRequest) -> dict:
     """
     Performs dialog management and fulfillment for booking a hotel.
 
@@ -267,12 +152,12 @@ def book_hotel(intent_request):
     2) Use of sessionAttributes to pass information that can be used to guide conversation
     """
 
-    location = try_ex(lambda: intent_request['currentIntent']['slots']['Location'])
-    checkin_date = try_ex(lambda: intent_request['currentIntent']['slots']['CheckInDate'])
-    nights = safe_int(try_ex(lambda: intent_request['currentIntent']['slots']['Nights']))
+    location = request.slot('Location')
+    checkin_date = request.slot('CheckInDate')
+    nights = safe_int(request.slot('Nights'))
 
-    room_type = try_ex(lambda: intent_request['currentIntent']['slots']['RoomType'])
-    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+    room_type = request.slot('RoomType')
+    session_attributes = request.session_attributes
 
     # Load confirmation history and track the current reservation.
     reservation = json.dumps({
@@ -285,20 +170,12 @@ def book_hotel(intent_request):
 
     session_attributes['currentReservation'] = reservation
 
-    if intent_request['invocationSource'] == 'DialogCodeHook':
+    if request.invocation_source == 'DialogCodeHook':
         # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
-        validation_result = validate_hotel(intent_request['currentIntent']['slots'])
+        validation_result = validate_hotel(request.slots)
         if not validation_result['isValid']:
-            slots = intent_request['currentIntent']['slots']
-            slots[validation_result['violatedSlot']] = None
-
-            return elicit_slot(
-                session_attributes,
-                intent_request['currentIntent']['name'],
-                slots,
-                validation_result['violatedSlot'],
-                validation_result['message']
-            )
+            request.set_slot(validation_result['violatedSlot'], None)
+            return request.elicit_slot(validation_result['violatedSlot'], validation_result['message'])
 
         # Otherwise, let native DM rules determine how to elicit for slots and prompt for confirmation.  Pass price
         # back in sessionAttributes once it can be calculated; otherwise clear any setting from sessionAttributes.
@@ -307,30 +184,27 @@ def book_hotel(intent_request):
             price = generate_hotel_price(location, nights, room_type)
             session_attributes['currentReservationPrice'] = price
         else:
-            try_ex(lambda: session_attributes.pop('currentReservationPrice'))
+            session_attributes.pop('currentReservationPrice', None)
 
         session_attributes['currentReservation'] = reservation
-        return delegate(session_attributes, intent_request['currentIntent']['slots'])
+        return request.delegate()
 
     # Booking the hotel.  In a real application, this would likely involve a call to a backend service.
-    logger.debug('bookHotel under={}'.format(reservation))
+    logger.debug('bookHotel under=%s', reservation)
 
-    try_ex(lambda: session_attributes.pop('currentReservationPrice'))
-    try_ex(lambda: session_attributes.pop('currentReservation'))
+    session_attributes.pop('currentReservationPrice', None)
+    session_attributes.pop('currentReservation', None)
     session_attributes['lastConfirmedReservation'] = reservation
 
-    return close(
-        session_attributes,
+    return request.close(
         'Fulfilled',
-        {
-            'contentType': 'PlainText',
-            'content': 'Thanks, I have placed your reservation.   Please let me know if you would like to book a car '
-                       'rental, or another hotel.'
-        }
+        plain_text('Thanks, I have placed your reservation.   Please let me know if you would like to book a car '
+                   'rental, or another hotel.')
     )
 
 
-def book_car(intent_request):
+@dispatcher.intent('BookCar')
+def book_car(request: IntentRequest) -> dict:
     """
     Performs dialog management and fulfillment for booking a car.
 
@@ -338,18 +212,17 @@ def book_car(intent_request):
     1) Use of elicitSlot in slot validation and re-prompting
     2) Use of sessionAttributes to pass information that can be used to guide conversation
     """
-    slots = intent_request['currentIntent']['slots']
-    pickup_city = slots['PickUpCity']
-    pickup_date = slots['PickUpDate']
-    return_date = slots['ReturnDate']
-    driver_age = slots['DriverAge']
-    car_type = slots['CarType']
-    confirmation_status = intent_request['currentIntent']['confirmationStatus']
-    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
-    last_confirmed_reservation = try_ex(lambda: session_attributes['lastConfirmedReservation'])
+    pickup_city = request.slot('PickUpCity')
+    pickup_date = request.slot('PickUpDate')
+    return_date = request.slot('ReturnDate')
+    driver_age = request.slot('DriverAge')
+    car_type = request.slot('CarType')
+    confirmation_status = request.confirmation_status
+    session_attributes = request.session_attributes
+    last_confirmed_reservation = session_attributes.get('lastConfirmedReservation')
     if last_confirmed_reservation:
         last_confirmed_reservation = json.loads(last_confirmed_reservation)
-    confirmation_context = try_ex(lambda: session_attributes['confirmationContext'])
+    confirmation_context = session_attributes.get('confirmationContext')
 
     # Load confirmation history and track the current reservation.
     reservation = json.dumps({
@@ -363,59 +236,46 @@ def book_car(intent_request):
 
     if pickup_city and pickup_date and return_date and driver_age and car_type:
         # Generate the price of the car in case it is necessary for future steps.
-        price = generate_car_price(pickup_city, get_day_difference(pickup_date, return_date), driver_age, car_type)
+        price = generate_car_price(pickup_city, get_day_difference(pickup_date, return_date), safe_int(driver_age), car_type)
         session_attributes['currentReservationPrice'] = price
 
-    if intent_request['invocationSource'] == 'DialogCodeHook':
+    if request.invocation_source == 'DialogCodeHook':
         # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
-        validation_result = validate_book_car(intent_request['currentIntent']['slots'])
+        validation_result = validate_book_car(request.slots)
         if not validation_result['isValid']:
-            slots[validation_result['violatedSlot']] = None
-            return elicit_slot(
-                session_attributes,
-                intent_request['currentIntent']['name'],
-                slots,
-                validation_result['violatedSlot'],
-                validation_result['message']
-            )
+            request.set_slot(validation_result['violatedSlot'], None)
+            return request.elicit_slot(validation_result['violatedSlot'], validation_result['message'])
 
         # Determine if the intent (and current slot settings) has been denied.  The messaging will be different
         # if the user is denying a reservation he initiated or an auto-populated suggestion.
         if confirmation_status == 'Denied':
             # Clear out auto-population flag for subsequent turns.
-            try_ex(lambda: session_attributes.pop('confirmationContext'))
-            try_ex(lambda: session_attributes.pop('currentReservation'))
+            session_attributes.pop('confirmationContext', None)
+            session_attributes.pop('currentReservation', None)
             if confirmation_context == 'AutoPopulate':
-                return elicit_slot(
-                    session_attributes,
-                    intent_request['currentIntent']['name'],
-                    {
+                return request.elicit_slot(
+                    'PickUpCity',
+                    plain_text('Where would you like to make your car reservation?'),
+                    slots={
                         'PickUpCity': None,
                         'PickUpDate': None,
                         'ReturnDate': None,
                         'DriverAge': None,
                         'CarType': None
-                    },
-                    'PickUpCity',
-                    {
-                        'contentType': 'PlainText',
-                        'content': 'Where would you like to make your car reservation?'
                     }
                 )
 
-            return delegate(session_attributes, intent_request['currentIntent']['slots'])
+            return request.delegate()
 
         if confirmation_status == 'None':
             # If we are currently auto-populating but have not gotten confirmation, keep requesting for confirmation.
             if (not pickup_city and not pickup_date and not return_date and not driver_age and not car_type)\
                     or confirmation_context == 'AutoPopulate':
-                if last_confirmed_reservation and try_ex(lambda: last_confirmed_reservation['ReservationType']) == 'Hotel':
+                if last_confirmed_reservation and last_confirmed_reservation.get('ReservationType') == 'Hotel':
                     # If the user's previous reservation was a hotel - prompt for a rental with
                     # auto-populated values to match this reservation.
                     session_attributes['confirmationContext'] = 'AutoPopulate'
-                    return confirm_intent(
-                        session_attributes,
-                        intent_request['currentIntent']['name'],
+                    return request.confirm_intent(
                         {
                             'PickUpCity': last_confirmed_reservation['Location'],
                             'PickUpDate': last_confirmed_reservation['CheckInDate'],
@@ -425,84 +285,41 @@ def book_car(intent_request):
                             'CarType': None,
                             'DriverAge': None
                         },
-                        {
-                            'contentType': 'PlainText',
-                            'content': 'Is this car rental for your {} night stay in {} on {}?'.format(
-                                last_confirmed_reservation['Nights'],
-                                last_confirmed_reservation['Location'],
-                                last_confirmed_reservation['CheckInDate']
-                            )
-                        }
+                        plain_text('Is this car rental for your {} night stay in {} on {}?'.format(
+                            last_confirmed_reservation['Nights'],
+                            last_confirmed_reservation['Location'],
+                            last_confirmed_reservation['CheckInDate']
+                        ))
                     )
 
             # Otherwise, let native DM rules determine how to elicit for slots and/or drive confirmation.
-            return delegate(session_attributes, intent_request['currentIntent']['slots'])
+            return request.delegate()
 
         # If confirmation has occurred, continue filling any unfilled slot values or pass to fulfillment.
         if confirmation_status == 'Confirmed':
             # Remove confirmationContext from sessionAttributes so it does not confuse future requests
-            try_ex(lambda: session_attributes.pop('confirmationContext'))
+            session_attributes.pop('confirmationContext', None)
             if confirmation_context == 'AutoPopulate':
                 if not driver_age:
-                    return elicit_slot(
-                        session_attributes,
-                        intent_request['currentIntent']['name'],
-                        intent_request['currentIntent']['slots'],
+                    return request.elicit_slot(
                         'DriverAge',
-                        {
-                            'contentType': 'PlainText',
-                            'content': 'How old is the driver of this car rental?'
-                        }
+                        plain_text('How old is the driver of this car rental?')
                     )
                 elif not car_type:
-                    return elicit_slot(
-                        session_attributes,
-                        intent_request['currentIntent']['name'],
-                        intent_request['currentIntent']['slots'],
+                    return request.elicit_slot(
                         'CarType',
-                        {
-                            'contentType': 'PlainText',
-                            'content': 'What type of car would you like? Popular models are '
-                                       'economy, midsize, and luxury.'
-                        }
+                        plain_text('What type of car would you like? Popular models are '
+                                   'economy, midsize, and luxury.')
                     )
 
-            return delegate(session_attributes, intent_request['currentIntent']['slots'])
+            return request.delegate()
 
     # Booking the car.  In a real application, this would likely involve a call to a backend service.
-    logger.debug('bookCar at={}'.format(reservation))
-    del session_attributes['currentReservationPrice']
-    del session_attributes['currentReservation']
+    logger.debug('bookCar at=%s', reservation)
+    session_attributes.pop('currentReservationPrice', None)
+    session_attributes.pop('currentReservation', None)
     session_attributes['lastConfirmedReservation'] = reservation
-    return close(
-        session_attributes,
-        'Fulfilled',
-        {
-            'contentType': 'PlainText',
-            'content': 'Thanks, I have placed your reservation.'
-        }
-    )
-
-
-# --- Intents ---
-
-
-def dispatch(intent_request):
-    """
-    Called when the user specifies an intent for this bot.
-    """
-
-    logger.debug('dispatch userId={}, intentName={}'.format(intent_request['userId'], intent_request['currentIntent']['name']))
-
-    intent_name = intent_request['currentIntent']['name']
-
-    # Dispatch to your bot's intent handlers
-    if intent_name == 'BookHotel':
-        return book_hotel(intent_request)
-    elif intent_name == 'BookCar':
-        return book_car(intent_request)
-
-    raise Exception('Intent with name ' + intent_name + ' not supported')
+    return request.close('Fulfilled', plain_text('Thanks, I have placed your reservation.'))
 
 
 # --- Main handler ---
@@ -513,9 +330,7 @@ def lambda_handler(event, context):
     Route the incoming request based on intent.
     The JSON body of the request is provided in the event slot.
     """
-    # By default, treat the user request as coming from the America/New_York time zone.
-    os.environ['TZ'] = 'America/New_York'
-    time.tzset()
-    logger.debug('event.bot.name={}'.format(event['bot']['name']))
+    # Dates are evaluated in validation.TIMEZONE (America/New_York).
+    logger.debug('event.bot.name=%s', event['bot']['name'])
 
-    return dispatch(event)
+    return dispatcher.dispatch(event)
@@ -0,0 +1,107 @@
+"""
+Precomputed price tables for the BookTrip sample.
+
+Prices are a fixed function of (city, car type, age band) or (city, room
+type), so the per-day and per-night rates for every supported city are
+computed once at import and quotes become a dictionary lookup and a multiply.
+"""
+from functools import lru_cache
+
+from validation import VALID_CITIES
+
+CAR_TYPES: tuple = ('economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury')
+ROOM_TYPES: tuple = ('queen', 'king', 'deluxe')
+
+CAR_TYPE_INDEX: dict = {car_type: i for i, car_type in enumerate(CAR_TYPES)}
+ROOM_TYPE_INDEX: dict = {room_type: i for i, room_type in enumerate(ROOM_TYPES)}
+
+# drivers under this age pay the young driver multiplier
+YOUNG_DRIVER_AGE: int = 25
+AGE_BAND_MULTIPLIERS: tuple = (1, 1.10)
+
+
+@lru_cache(maxsize=1024)
+def location_cost(location: str) -> int:
+    """
+    The fixed cost of living for a location, derived from its name.
+    """
+    return sum(ord(c) - 97 for c in location.lower())
+
+
+def age_band(age: int) -> int:
+    return 1 if age < YOUNG_DRIVER_AGE else 0
+
+
+def _car_rate(location: str, car_type_index: int, band: int) -> float:
+    return (100 + location_cost(location)) + ((car_type_index * 50) * AGE_BAND_MULTIPLIERS[band])
+
+
+def _hotel_rate(location: str, room_type_index: int) -> int:
+    return 100 + location_cost(location) + (100 + room_type_index)
+
+
+CAR_DAILY_RATES: dict = {
+    (city, car_type, band): _car_rate(city, i, band)
+    for city in VALID_CITIES
+    for car_type, i in CAR_TYPE_INDEX.items()
+    for band in range(len(AGE_BAND_MULTIPLIERS))
+}
+
+HOTEL_NIGHTLY_RATES: dict = {
+    (city, room_type): _hotel_rate(city, i)
+    for city in VALID_CITIES
+    for room_type, i in ROOM_TYPE_INDEX.items()
+}
+
+
+def car_daily_rate(location: str, age: int, car_type: str) -> float:
+    """
+    The daily rate for a car rental. Unknown car types are priced as economy.
+    """
+    location = location.lower()
+    car_type = car_type.lower()
+    if car_type not in CAR_TYPE_INDEX:
+        car_type = CAR_TYPES[0]
+    band = age_band(age)
+    rate = CAR_DAILY_RATES.get((location, car_type, band))
+    if rate is None:
+        rate = _car_rate(location, CAR_TYPE_INDEX[car_type], band)
+    return rate
+
+
+def hotel_nightly_rate(location: str, room_type: str) -> int:
+    """
+    The nightly rate for a hotel room.
+
+    :raises ValueError: if the room type is not supported
+    """
+    location = location.lower()
+    room_type = room_type.lower()
+    rate = HOTEL_NIGHTLY_RATES.get((location, room_type))
+    if rate is None:
+        if room_type not in ROOM_TYPE_INDEX:
+            raise ValueError(f"{room_type} is not in list")
+        rate = _hotel_rate(location, ROOM_TYPE_INDEX[room_type])
+    return rate
+
+
+def quote_cars(quotes) -> list:
+    """
+    Prices many car rentals at once.
+
+    :param quotes: an iterable of (location, days, age, car_type) tuples
+    :return: the price of each quote, in order
+    """
+    rate = car_daily_rate
+    return [days * rate(location, age, car_type) for location, days, age, car_type in quotes]
+
+
+def quote_hotels(quotes) -> list:
+    """
+    Prices many hotel stays at once.
+
+    :param quotes: an iterable of (location, nights, room_type) tuples
+    :return: the price of each quote, in order
+    """
+    rate = hotel_nightly_rate
+    return [nights * rate(location, room_type) for location, nights, room_type in quotes]
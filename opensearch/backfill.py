@@ -0,0 +1,267 @@
+"""
+Rebuilds the restaurants search index from the yelp-restaurants table.
+
+The table is read with a segmented parallel Scan, one thread per segment, and
+every item goes through the same build_document as the stream indexer. The
+documents are streamed into _bulk requests sent by a fixed number of threads
+through a bounded queue, so memory and the load on the cluster stay bounded
+however large the table is. Requests, or single items, the cluster rejects
+with 429 or a 502/503/504 are retried with backoff.
+
+    python opensearch/backfill.py --new-version --delete-old
+    python opensearch/backfill.py --index restaurants-v3 --segments 16 --concurrency 4
+"""
+import logging
+import queue
+import random
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, List, Optional
+
+import click
+import requests
+
+from index_admin import IndexAdmin, next_index
+# index_admin has put the shared layer modules on sys.path
+from search_index import INDEX_ALIAS, INDEXED_ATTRIBUTES, build_document  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME: str = "yelp-restaurants"
+
+# only what build_document reads is fetched; every name goes through a
+# placeholder since several are DynamoDB reserved words
+PROJECTION: tuple = INDEXED_ATTRIBUTES
+
+RETRYABLE_STATUSES: frozenset = frozenset({429, 502, 503, 504})
+
+_DONE = object()
+
+
+class BackfillStats:
+    """Counters shared by the scan and bulk threads."""
+
+    def __init__(self) -> None:
+        self.scanned: int = 0
+        self.indexed: int = 0
+        self.failed: int = 0
+        self.skipped: int = 0
+        self.started: float = time.monotonic()
+        self.lock: threading.Lock = threading.Lock()
+
+    def add(self, **counts: int) -> None:
+        with self.lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def rate(self) -> float:
+        return self.indexed / max(time.monotonic() - self.started, 1e-9)
+
+    def __str__(self) -> str:
+        return (f"{self.scanned} scanned, {self.indexed} indexed, {self.failed} failed, "
+                f"{self.skipped} skipped, {self.rate():.0f} docs/sec")
+
+
+class Backfill:
+    """Streams every item of a DynamoDB table into an OpenSearch index."""
+
+    def __init__(self, admin: IndexAdmin, index: str, table_factory: Callable,
+                 segments: int = 8, concurrency: int = 4, batch_size: int = 500,
+                 max_attempts: int = 5, base_delay: float = 0.5, progress_interval: float = 5) -> None:
+        """
+        :param admin: the cluster to write to
+        :param index: the index, or alias, to write the documents into
+        :param table_factory: returns a Boto3 DynamoDB Table; called once per
+                              scan thread, as resources are not thread-safe
+        :param segments: the number of parallel Scan segments and threads
+        :param concurrency: the number of _bulk requests in flight
+        :param batch_size: documents per _bulk request
+        :param max_attempts: attempts per document before it counts as failed
+        :param base_delay: base of the exponential, fully jittered backoff, in seconds
+        :param progress_interval: seconds between progress reports
+        """
+        self.admin: IndexAdmin = admin
+        self.index: str = index
+        self.table_factory: Callable = table_factory
+        self.segments: int = segments
+        self.concurrency: int = concurrency
+        self.batch_size: int = batch_size
+        self.max_attempts: int = max_attempts
+        self.base_delay: float = base_delay
+        self.progress_interval: float = progress_interval
+        # a full queue blocks the scanners, which bounds the documents held in memory
+        self.batches: queue.Queue = queue.Queue(maxsize=concurrency * 2)
+        self.stats: BackfillStats = BackfillStats()
+        self.errors: List[BaseException] = []
+
+    def scan_segment(self, segment: int) -> None:
+        table = self.table_factory()
+        kwargs: dict = {
+            "Segment": segment,
+            "TotalSegments": self.segments,
+            "ProjectionExpression": ", ".join(f"#f{i}" for i in range(len(PROJECTION))),
+            "ExpressionAttributeNames": {f"#f{i}": name for i, name in enumerate(PROJECTION)},
+        }
+        batch: list = []
+        while True:
+            response = table.scan(**kwargs)
+            items = response.get("Items", [])
+            self.stats.add(scanned=len(items))
+            for item in items:
+                document = build_document(item)
+                if document is None:
+                    self.stats.add(skipped=1)
+                    continue
+                batch.append(document)
+                if len(batch) >= self.batch_size:
+                    self.batches.put(batch)
+                    batch = []
+            if "LastEvaluatedKey" not in response:
+                break
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        if batch:
+            self.batches.put(batch)
+
+    def send(self, documents: list) -> None:
+        """
+        Indexes a batch with _bulk, retrying the whole request when the
+        cluster rejects it, and the documents it rejects, with a retryable status.
+        """
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(random.uniform(0, self.base_delay * (2 ** attempt)))
+            lines: list = []
+            for document in documents:
+                lines.append({"index": {"_index": self.index, "_id": document["id"]}})
+                lines.append(document)
+            try:
+                response = self.admin.bulk(lines)
+            except requests.HTTPError as err:
+                status = err.response.status_code if err.response is not None else None
+                if status not in RETRYABLE_STATUSES:
+                    raise
+                logger.warning("The _bulk request was rejected with %s on attempt %d", status, attempt + 1)
+                continue
+
+            retry: list = []
+            failed: int = 0
+            for document, item in zip(documents, response["items"]):
+                result = item["index"]
+                if result["status"] < 300:
+                    continue
+                if result["status"] in RETRYABLE_STATUSES:
+                    retry.append(document)
+                else:
+                    failed += 1
+                    logger.error("Couldn't index %s. Here's why: %s: %s", document["id"],
+                                 result["status"], result.get("error"))
+            self.stats.add(indexed=len(documents) - len(retry) - failed, failed=failed)
+            if not retry:
+                return
+            documents = retry
+        logger.error("Giving up on %d document(s) after %d attempts", len(documents), self.max_attempts)
+        self.stats.add(failed=len(documents))
+
+    def _scan_worker(self, segment: int) -> None:
+        try:
+            self.scan_segment(segment)
+        except BaseException as err:
+            logger.error("Scan segment %d failed: %s", segment, err)
+            self.errors.append(err)
+
+    def _send_worker(self) -> None:
+        while True:
+            documents = self.batches.get()
+            if documents is _DONE:
+                return
+            try:
+                self.send(documents)
+            except BaseException as err:
+                logger.error("A _bulk request failed: %s", err)
+                self.errors.append(err)
+                self.stats.add(failed=len(documents))
+
+    def _report(self, done: threading.Event) -> None:
+        while not done.wait(self.progress_interval):
+            logger.info("%s", self.stats)
+
+    def run(self) -> BackfillStats:
+        """
+        Scans the whole table into the index and waits for every batch to be sent.
+        """
+        self.stats = BackfillStats()
+        done = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(done,), daemon=True)
+        senders = [threading.Thread(target=self._send_worker, name=f"bulk-{i}")
+                   for i in range(self.concurrency)]
+        scanners = [threading.Thread(target=self._scan_worker, args=(segment,), name=f"scan-{segment}")
+                    for segment in range(self.segments)]
+        reporter.start()
+        for thread in senders + scanners:
+            thread.start()
+        for thread in scanners:
+            thread.join()
+        for _ in senders:
+            self.batches.put(_DONE)
+        for thread in senders:
+            thread.join()
+        done.set()
+        logger.info("Backfill finished: %s", self.stats)
+        return self.stats
+
+
+def dynamodb_table_factory(table_name: str) -> Callable:
+    import boto3
+
+    def factory():
+        return boto3.session.Session().resource("dynamodb").Table(table_name)
+    return factory
+
+
+@click.command()
+@click.option("--table", "-t", default=TABLE_NAME, help="The DynamoDB table to read")
+@click.option("--index", "-i", default=None, help="The index or alias to load, defaults to the alias")
+@click.option("--new-version", is_flag=True, help="Load a new version of the index, then swap the alias to it")
+@click.option("--delete-old", is_flag=True, help="With --new-version, delete the index the alias pointed at")
+@click.option("--segments", "-s", default=8, help="Parallel Scan segments")
+@click.option("--concurrency", "-c", default=4, help="_bulk requests in flight")
+@click.option("--batch-size", "-b", default=500, help="Documents per _bulk request")
+def main(table: str, index: Optional[str], new_version: bool, delete_old: bool,
+         segments: int, concurrency: int, batch_size: int):
+    """
+    Indexes every restaurant in the DynamoDB table.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    admin = IndexAdmin.from_env()
+    if new_version:
+        if index:
+            raise click.UsageError("--index and --new-version are exclusive")
+        index = next_index(admin)
+        admin.create_index(index)
+        click.echo(f"Created {index}")
+    index = index or INDEX_ALIAS
+
+    backfill = Backfill(admin, index, dynamodb_table_factory(table), segments=segments,
+                        concurrency=concurrency, batch_size=batch_size)
+    # only a version nothing reads yet is loaded without replicas and refresh;
+    # an in-place backfill leaves the live index's settings alone
+    with admin.bulk_load(index) if new_version else nullcontext():
+        stats = backfill.run()
+    click.echo(f"Indexed {stats.indexed} of {stats.scanned} items into {index} "
+               f"({stats.failed} failed, {stats.rate():.0f} docs/sec)")
+
+    if backfill.errors or stats.failed:
+        raise click.ClickException("the backfill was incomplete" +
+                                   (", the alias was not swapped" if new_version else ""))
+    if new_version:
+        previous = admin.point_alias(index)
+        click.echo(f"{INDEX_ALIAS} -> {index}")
+        if delete_old:
+            for old in previous:
+                admin.delete_index(old)
+                click.echo(f"Deleted {old}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Manages the lifecycle of the restaurants search index.
+
+The index is versioned ("restaurants-v1", "restaurants-v2", ...) behind the
+"restaurants" alias that lf2 and the stream indexer use, so a full reindex
+builds a new version next to the live one and swaps the alias atomically.
+While a version is being bulk loaded its replicas and refresh are turned off
+and restored afterwards.
+
+    python opensearch/index_admin.py status
+    python opensearch/index_admin.py create
+    python opensearch/index_admin.py reindex --delete-old
+    python opensearch/index_admin.py swap restaurants-v2
+"""
+import json
+import logging
+import os
+import re
+import sys
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+import click
+import requests
+from requests.auth import HTTPBasicAuth
+
+# the index definition is shared with the Lambdas, which get it from their layer
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdas", "common"))
+
+from search_index import INDEX_ALIAS, INDEX_MAPPINGS, INDEX_SETTINGS, versioned_name  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST: str = "https://search-csgy9223a-hw1-dining-wt7iphrqwwnp6pzz4i37djulsq.us-east-1.es.amazonaws.com"
+
+BULK_SETTINGS: dict = {"number_of_replicas": 0, "refresh_interval": "-1"}
+
+
+class IndexAdmin:
+    """Encapsulates the OpenSearch index and alias APIs for the restaurants index."""
+
+    def __init__(self, host: str, auth=None, timeout: float = 60) -> None:
+        """
+        :param host: the cluster endpoint, e.g. https://search-....es.amazonaws.com
+        :param auth: a requests auth object, e.g. HTTPBasicAuth
+        :param timeout: seconds to wait for each request
+        """
+        self.host: str = host.rstrip("/")
+        self.session: requests.Session = requests.Session()
+        self.session.auth = auth
+        self.timeout: float = timeout
+
+    @classmethod
+    def from_env(cls) -> "IndexAdmin":
+        return cls(os.getenv("OS_HOST", DEFAULT_HOST),
+                   HTTPBasicAuth(os.getenv("OS_USER"), os.getenv("OS_PASSWORD")))
+
+    def request(self, method: str, path: str, allow: tuple = (), **kwargs) -> Optional[dict]:
+        """
+        Sends a request to the cluster.
+
+        :param allow: error statuses that return None instead of raising
+        :return: the parsed JSON response
+        """
+        response = self.session.request(method, self.host + path, timeout=self.timeout, **kwargs)
+        if response.status_code in allow:
+            return None
+        if response.status_code >= 400:
+            logger.error("Couldn't %s %s. Here's why: %s: %s", method, path,
+                         response.status_code, response.text)
+            response.raise_for_status()
+        return response.json() if response.content else {}
+
+    def create_index(self, name: str) -> None:
+        self.request("PUT", f"/{name}", json={"settings": INDEX_SETTINGS, "mappings": INDEX_MAPPINGS})
+
+    def delete_index(self, name: str) -> None:
+        self.request("DELETE", f"/{name}")
+
+    def versions(self) -> List[int]:
+        """Returns the versions of the index that exist, oldest first."""
+        indices = self.request("GET", f"/_cat/indices/{INDEX_ALIAS}-v*?format=json", allow=(404,)) or []
+        pattern = re.compile(rf"^{re.escape(INDEX_ALIAS)}-v(\d+)$")
+        return sorted(int(match.group(1)) for match in
+                      (pattern.match(index["index"]) for index in indices) if match)
+
+    def alias_targets(self, alias: str = INDEX_ALIAS) -> List[str]:
+        """Returns the indexes an alias points at."""
+        return sorted(self.request("GET", f"/_alias/{alias}", allow=(404,)) or {})
+
+    def is_concrete_index(self, name: str = INDEX_ALIAS) -> bool:
+        """
+        Whether name is an index rather than an alias, as "restaurants" was
+        before the index was versioned.
+        """
+        return name in (self.request("GET", f"/{name}", allow=(404,)) or {})
+
+    def point_alias(self, index: str, alias: str = INDEX_ALIAS) -> List[str]:
+        """
+        Points an alias at a single index, in one atomic update, so readers
+        and writers never see the alias missing or pointing at two indexes.
+        An unversioned index with the alias's name is deleted in the same
+        update, since the two cannot coexist.
+
+        :return: the versioned indexes the alias pointed at before
+        """
+        previous = self.alias_targets(alias)
+        actions: list = [{"remove": {"index": old, "alias": alias}} for old in previous if old != index]
+        if not previous and self.is_concrete_index(alias):
+            actions.append({"remove_index": {"index": alias}})
+        actions.append({"add": {"index": index, "alias": alias, "is_write_index": True}})
+        self.request("POST", "/_aliases", json={"actions": actions})
+        return [old for old in previous if old != index]
+
+    def get_settings(self, index: str) -> dict:
+        settings = self.request("GET", f"/{index}/_settings")[index]["settings"]["index"]
+        return {name: settings.get(name) for name in BULK_SETTINGS}
+
+    def put_settings(self, index: str, settings: dict) -> None:
+        self.request("PUT", f"/{index}/_settings", json={"index": settings})
+
+    @contextmanager
+    def bulk_load(self, index: str):
+        """
+        Turns off replicas and refresh on an index for the duration of a bulk
+        load, then restores its settings and refreshes it, even on failure.
+        """
+        saved = self.get_settings(index)
+        self.put_settings(index, BULK_SETTINGS)
+        try:
+            yield
+        finally:
+            self.put_settings(index, {name: value if value is not None else INDEX_SETTINGS[name]
+                                      for name, value in saved.items()})
+            self.request("POST", f"/{index}/_refresh")
+
+    def bulk(self, lines: Iterable[dict]) -> dict:
+        """
+        Sends one _bulk request.
+
+        :param lines: the action and source lines, in order
+        :return: the parsed response, whose "items" report each action
+        """
+        body = "".join(_json(line) + "\n" for line in lines)
+        return self.request("POST", "/_bulk", data=body.encode(),
+                            headers={"Content-Type": "application/x-ndjson"})
+
+    def reindex(self, source: str, dest: str) -> dict:
+        """
+        Copies every document of source into dest with the _reindex API. The
+        document id is set to the restaurant id, which also collapses the
+        duplicates that auto-generated ids left in the unversioned index.
+        """
+        return self.request("POST", "/_reindex?wait_for_completion=true&refresh=true", json={
+            "source": {"index": source},
+            "dest": {"index": dest},
+            "script": {"lang": "painless", "source": "if (ctx._source.id != null) { ctx._id = ctx._source.id }"},
+        })
+
+    def count(self, index: str) -> int:
+        return self.request("GET", f"/{index}/_count")["count"]
+
+
+def _json(document: dict) -> str:
+    return json.dumps(document, separators=(",", ":"), default=str)
+
+
+def next_index(admin: IndexAdmin) -> str:
+    versions = admin.versions()
+    return versioned_name(versions[-1] + 1 if versions else 1)
+
+
+@click.group()
+def cli():
+    """Manages the versioned restaurants index and its alias."""
+    logging.basicConfig(level=logging.INFO)
+
+
+@cli.command()
+def status():
+    """Shows every version of the index and where the alias points."""
+    admin = IndexAdmin.from_env()
+    targets = admin.alias_targets()
+    for version in admin.versions():
+        name = versioned_name(version)
+        marker = f" <- {INDEX_ALIAS}" if name in targets else ""
+        click.echo(f"{name}: {admin.count(name)} documents{marker}")
+    if not targets:
+        click.echo(f"the {INDEX_ALIAS} alias does not exist")
+
+
+@cli.command()
+@click.option("--version", "-v", type=int, help="The version to create, defaults to the next one")
+@click.option("--point-alias/--no-point-alias", default=None,
+              help="Point the alias at the new index, by default only when the alias does not exist")
+def create(version: Optional[int], point_alias: Optional[bool]):
+    """Creates a version of the index with the explicit mapping."""
+    admin = IndexAdmin.from_env()
+    name = versioned_name(version) if version else next_index(admin)
+    admin.create_index(name)
+    click.echo(f"Created {name}")
+    if point_alias or (point_alias is None and not admin.alias_targets()):
+        admin.point_alias(name)
+        click.echo(f"{INDEX_ALIAS} -> {name}")
+
+
+@cli.command()
+@click.argument("index")
+@click.option("--delete-old", is_flag=True, help="Delete the indexes the alias pointed at before")
+def swap(index: str, delete_old: bool):
+    """Atomically points the alias at INDEX."""
+    admin = IndexAdmin.from_env()
+    previous = admin.point_alias(index)
+    click.echo(f"{INDEX_ALIAS} -> {index} (was {', '.join(previous) or 'unset'})")
+    if delete_old:
+        for old in previous:
+            admin.delete_index(old)
+            click.echo(f"Deleted {old}")
+
+
+@cli.command()
+@click.option("--delete-old", is_flag=True, help="Delete the old index once the alias is swapped")
+def reindex(delete_old: bool):
+    """
+    Copies the live index into a new version with the current mapping, then
+    swaps the alias. Stream updates that arrive during the copy land in the
+    old index, so run a backfill afterwards if the table is being written to.
+
+    The first run migrates the unversioned "restaurants" index, which is
+    deleted when the alias replaces it.
+    """
+    admin = IndexAdmin.from_env()
+    sources = admin.alias_targets() or ([INDEX_ALIAS] if admin.is_concrete_index() else [])
+    if len(sources) != 1:
+        raise click.ClickException(f"{INDEX_ALIAS} must point at one index, not {sources}")
+    dest = next_index(admin)
+    admin.create_index(dest)
+    with admin.bulk_load(dest):
+        result = admin.reindex(sources[0], dest)
+    click.echo(f"Copied {result.get('total')} documents from {sources[0]} into {dest}")
+    if result.get("failures"):
+        raise click.ClickException(f"{len(result['failures'])} documents failed, the alias was not swapped")
+    previous = admin.point_alias(dest)
+    click.echo(f"{INDEX_ALIAS} -> {dest}")
+    if delete_old:
+        for old in previous:
+            admin.delete_index(old)
+            click.echo(f"Deleted {old}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,41 @@
+"""
+Makes the Lambda modules importable the way they are deployed: the shared
+modules from the common layer, and a function's own modules from its directory.
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDAS: str = os.path.join(ROOT, "lambdas")
+
+# keep EMF metric lines out of test output
+os.environ.setdefault("METRICS_DISABLED", "true")
+
+for directory in (os.path.join(LAMBDAS, "common"), os.path.join(LAMBDAS, "lf1"), os.path.join(LAMBDAS, "lf2")):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+
+def load_lambda(name: str):
+    """
+    Loads a Lambda's lambda_function.py under a unique name, as every function
+    has a module of that name.
+
+    :param name: the directory of the Lambda under lambdas/, e.g. 'lf2'
+    """
+    module_name = f"{name}_lambda_function".replace("-", "_")
+    if module_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            module_name, os.path.join(LAMBDAS, name, "lambda_function.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[module_name] = module
+    return sys.modules[module_name]
+
+
+@pytest.fixture(scope="session")
+def lf2():
+    return load_lambda("lf2")
@@ -0,0 +1,47 @@
+"""
+The import-time guarantees of the lazy-import change: lf1's dialog turns,
+most of its invocations, never load boto3. Each check runs in a fresh
+interpreter, as other tests import boto3 into this one.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from conftest import LAMBDAS
+
+DIALOG_TURN: dict = {
+    "invocationSource": "DialogCodeHook",
+    "sessionState": {
+        "intent": {"name": "DiningSuggestionIntent", "confirmationState": "None", "slots": {
+            "location": {"value": {"originalValue": "nyc", "interpretedValue": "nyc", "resolvedValues": ["nyc"]}},
+            "cuisine": None,
+        }},
+        "sessionAttributes": {},
+        "originatingRequestId": "request-1",
+    },
+}
+
+
+def loaded_modules(function: str, event: dict) -> set:
+    """
+    Initialises a Lambda the way the runtime does and handles one event.
+
+    :return: the names of the modules loaded by the end of the invocation
+    """
+    script = "; ".join([
+        "import json, sys",
+        f"sys.path[:0] = [{os.path.join(LAMBDAS, function)!r}, {os.path.join(LAMBDAS, 'common')!r}]",
+        "import lambda_function",
+        f"lambda_function.lambda_handler(json.loads({json.dumps(event)!r}), None)",
+        "print(json.dumps(sorted(sys.modules)))",
+    ])
+    env = dict(os.environ, METRICS_DISABLED="true", ENQUEUE_MODE="sync")
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    return set(json.loads(result.stdout.splitlines()[-1]))
+
+
+def test_lf1_dialog_turns_do_not_import_boto3():
+    modules = loaded_modules("lf1", DIALOG_TURN)
+    assert "lambda_function" in modules
+    assert not {"boto3", "botocore", "urllib.request"} & modules
@@ -0,0 +1,54 @@
+import logging
+import threading
+
+import pytest
+
+from enqueue import Enqueue, EnqueueError, PostResponseFlusher, SqsEnqueuer
+
+ENTRY: dict = {"MessageBody": '{"email": "user@example.com", "phone": "+15550100"}',
+               "MessageGroupId": "g", "MessageDeduplicationId": "dedup-1"}
+
+
+class FailingClient:
+    def send_message_batch(self, QueueUrl: str, Entries: list) -> dict:
+        raise RuntimeError(f"can't send {Entries}")
+
+
+class RejectingClient:
+    def send_message_batch(self, QueueUrl: str, Entries: list) -> dict:
+        return {"Failed": [{"Id": entry["Id"], "SenderFault": True, "Code": "InvalidParameterValue",
+                            "Message": "rejected"} for entry in Entries]}
+
+
+def flush_after_response(client, caplog) -> list:
+    """Runs one invocation's deferred flush, returning the messages logged."""
+    flusher = PostResponseFlusher(SqsEnqueuer("queue", "us-east-1", client=client), "localhost")
+    flushed = threading.Event()
+    calls = []
+
+    def next_event() -> None:
+        calls.append(1)
+        if len(calls) > 1:
+            flushed.set()
+            threading.Event().wait()
+
+    flusher._next_event = next_event
+    flusher.hand_over([dict(ENTRY)])
+    with caplog.at_level(logging.ERROR):
+        threading.Thread(target=flusher._run, daemon=True).start()
+        assert flushed.wait(5), "the flush thread did not ask for the next event"
+    return [record.getMessage() for record in caplog.records]
+
+
+@pytest.mark.parametrize("client", [FailingClient(), RejectingClient()])
+def test_a_failed_flush_logs_ids_but_no_message_bodies(client, caplog):
+    messages = flush_after_response(client, caplog)
+    assert any("dedup-1" in message for message in messages)
+    assert not any("user@example.com" in message or "+15550100" in message for message in messages)
+
+
+def test_sync_mode_raises_when_messages_are_not_sent():
+    enqueue = Enqueue(SqsEnqueuer("queue", "us-east-1", client=RejectingClient()))
+    enqueue.enqueue(dict(ENTRY))
+    with pytest.raises(EnqueueError):
+        enqueue.end_invocation()
@@ -0,0 +1,27 @@
+from fuzzy import CITY_INDEX, CUISINE_INDEX, FuzzyIndex
+
+
+def test_exact_values_and_aliases_match():
+    assert CITY_INDEX.match("nyc") == ("new york", [])
+    assert CUISINE_INDEX.match("Italian") == ("italian", [])
+
+
+def test_a_single_edit_is_corrected():
+    assert CUISINE_INDEX.match("italain") == ("italian", [])
+    assert CITY_INDEX.match("portlnd") == ("portland", [])
+
+
+def test_two_edits_are_only_suggested():
+    assert CITY_INDEX.match("columbia") == (None, ["columbus"])
+    assert CITY_INDEX.match("portlandia") == (None, ["portland"])
+
+
+def test_short_words_must_match_exactly():
+    assert FuzzyIndex.max_distance("abc") == 0
+    assert FuzzyIndex.max_distance("abcdef") == 1
+    assert FuzzyIndex.max_distance("abcdefg") == 2
+
+
+def test_equally_close_values_are_suggested():
+    index = FuzzyIndex({"bake": "bake", "cake": "cake"})
+    assert index.match("dake") == (None, ["bake", "cake"])
@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+
+import pytest
+
+
+class Context:
+    def __init__(self, remaining_ms: int) -> None:
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self) -> int:
+        return self.remaining_ms
+
+
+@pytest.fixture
+def lf2_defaults(lf2, monkeypatch):
+    monkeypatch.setattr(lf2, "RECORD_TIMEOUT", 10.0)
+    monkeypatch.setattr(lf2, "SEND_RESERVE_MS", 3000)
+    monkeypatch.setattr(lf2, "RECORD_MIN_TIMEOUT", 1.0)
+    monkeypatch.setattr(lf2, "_budget_checked", True)
+    return lf2
+
+
+def test_without_a_context_the_configured_timeout_is_used(lf2_defaults):
+    assert lf2_defaults.record_timeout(None) == 10.0
+
+
+def test_a_long_invocation_gets_the_configured_timeout(lf2_defaults):
+    assert lf2_defaults.record_timeout(Context(60000)) == 10.0
+
+
+def test_the_reserve_is_kept_when_it_fits(lf2_defaults):
+    assert lf2_defaults.record_timeout(Context(8000)) == pytest.approx(5.0)
+
+
+def test_a_short_invocation_scales_the_reserve_down(lf2_defaults):
+    # Lambda's default timeout of 3s would leave nothing for the records
+    assert lf2_defaults.record_timeout(Context(3000)) == pytest.approx(1.5)
+
+
+def test_records_always_get_the_minimum(lf2_defaults):
+    assert lf2_defaults.record_timeout(Context(500)) == 1.0
+
+
+def test_the_minimum_never_exceeds_the_configured_timeout(lf2_defaults, monkeypatch):
+    monkeypatch.setattr(lf2_defaults, "RECORD_TIMEOUT", 0.5)
+    assert lf2_defaults.record_timeout(Context(100)) == 0.5
+
+
+def test_a_budget_that_cannot_fit_is_warned_about_once(lf2_defaults, monkeypatch, caplog):
+    monkeypatch.setattr(lf2_defaults, "_budget_checked", False)
+    with caplog.at_level(logging.WARNING):
+        lf2_defaults.record_timeout(Context(3000))
+        lf2_defaults.record_timeout(Context(3000))
+    assert len([r for r in caplog.records if "can't fit" in r.getMessage()]) == 1
+
+
+class Sender:
+    def send_all(self, emails: list) -> list:
+        return [f"id-{i}" for i, _ in enumerate(emails)]
+
+
+def test_the_default_configuration_abandons_a_slow_record(lf2, monkeypatch):
+    release = threading.Event()
+
+    def process_record(record: dict) -> list:
+        if record["messageId"] == "slow":
+            release.wait(5)
+        return [record["messageId"]]
+
+    assert lf2.RECORD_CONCURRENCY == 1, "the test covers the default configuration"
+    monkeypatch.setattr(lf2, "process_record", process_record)
+    monkeypatch.setattr(lf2, "get_restaurant_table", lambda: None)
+    monkeypatch.setattr(lf2, "SES", Sender())
+    monkeypatch.setattr(lf2, "REPORT_BATCH_ITEM_FAILURES", True)
+    monkeypatch.setattr(lf2, "RECORD_TIMEOUT", 0.1)
+    monkeypatch.setattr(lf2, "RECORD_MIN_TIMEOUT", 0.1)
+    records = [{"messageId": "slow", "attributes": {}}, {"messageId": "fast", "attributes": {}}]
+    started = time.monotonic()
+    try:
+        response = lf2.lambda_handler({"Records": records}, None)
+    finally:
+        release.set()
+    assert time.monotonic() - started < 2
+    assert response == {"batchItemFailures": [{"itemIdentifier": "slow"}]}
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from record_runner import RecordSkippedError, RecordTimeoutError, message_group, run_records
+
+
+def record(message_id: str, group: str = None) -> dict:
+    attributes = {"MessageGroupId": group} if group else {}
+    return {"messageId": message_id, "attributes": attributes, "body": message_id}
+
+
+def test_message_group():
+    assert message_group(record("1", "a")) == "group:a"
+    assert message_group(record("1")) == "message:1"
+
+
+def test_results_keep_the_order_of_records():
+    records = [record(str(i)) for i in range(6)]
+    results = run_records(records, lambda r: r["body"] * 2, concurrency=3)
+    assert [result.value for result in results] == ["00", "11", "22", "33", "44", "55"]
+    assert all(result.ok for result in results)
+
+
+def test_a_failed_record_does_not_fail_the_others():
+    def handle(r):
+        if r["messageId"] == "bad":
+            raise ValueError("boom")
+        return r["messageId"]
+
+    for concurrency in (1, 4):
+        results = run_records([record("a"), record("bad"), record("b")], handle, concurrency)
+        assert [result.ok for result in results] == [True, False, True]
+        assert isinstance(results[1].error, ValueError)
+        assert results[2].value == "b"
+
+
+def test_a_failure_skips_the_rest_of_its_group_only():
+    handled = []
+
+    def handle(r):
+        handled.append(r["messageId"])
+        if r["messageId"] == "a1":
+            raise ValueError("boom")
+
+    for concurrency in (1, 4):
+        handled.clear()
+        records = [record("a1", "a"), record("b1", "b"), record("a2", "a"), record("b2", "b")]
+        results = run_records(records, handle, concurrency)
+        assert isinstance(results[2].error, RecordSkippedError)
+        assert results[1].ok and results[3].ok
+        assert "a2" not in handled
+
+
+def test_a_group_runs_in_order_one_at_a_time():
+    running = []
+    overlapped = []
+    order = []
+    lock = threading.Lock()
+
+    def handle(r):
+        with lock:
+            if running:
+                overlapped.append(r["messageId"])
+            running.append(r)
+            order.append(r["messageId"])
+        time.sleep(0.01)
+        with lock:
+            running.remove(r)
+
+    run_records([record(str(i), "g") for i in range(5)], handle, concurrency=4)
+    assert order == ["0", "1", "2", "3", "4"]
+    assert not overlapped
+
+
+def test_a_slow_record_is_abandoned_and_skips_its_group():
+    release = threading.Event()
+
+    def handle(r):
+        if r["messageId"] == "slow":
+            release.wait(5)
+        return r["messageId"]
+
+    records = [record("slow", "a"), record("next", "a"), record("other", "b")]
+    started = time.monotonic()
+    try:
+        results = run_records(records, handle, concurrency=2, timeout=0.1)
+    finally:
+        release.set()
+    assert time.monotonic() - started < 2
+    assert isinstance(results[0].error, RecordTimeoutError)
+    assert isinstance(results[1].error, RecordSkippedError)
+    assert results[2].value == "other"
+
+
+def test_context_variables_do_not_leak_between_records():
+    import contextvars
+    var = contextvars.ContextVar("var", default=None)
+
+    def handle(r):
+        seen = var.get()
+        var.set(r["messageId"])
+        return seen
+
+    results = run_records([record("a"), record("b")], handle, concurrency=1)
+    assert [result.value for result in results] == [None, None]
+
+
+def test_a_timeout_applies_when_records_run_one_at_a_time():
+    release = threading.Event()
+    started = []
+
+    def handle(r):
+        started.append(r["messageId"])
+        if r["messageId"] == "slow":
+            release.wait(5)
+        return r["messageId"]
+
+    records = [record("slow"), record("next"), record("last")]
+    try:
+        results = run_records(records, handle, concurrency=1, timeout=0.1)
+    finally:
+        release.set()
+    assert isinstance(results[0].error, RecordTimeoutError)
+    # the abandoned record still holds its thread, but does not hold up the rest
+    assert [result.value for result in results[1:]] == ["next", "last"]
+    assert started == ["slow", "next", "last"]
@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, hedged
+
+
+def fail():
+    raise ValueError("boom")
+
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            breaker.call(fail)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "never called")
+
+
+def test_a_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    with pytest.raises(ValueError):
+        breaker.call(fail)
+    assert breaker.call(lambda: "ok") == "ok"
+    with pytest.raises(ValueError):
+        breaker.call(fail)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_circuit_lets_one_trial_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    with pytest.raises(ValueError):
+        breaker.call(fail)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_a_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=0.05)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            breaker.call(fail)
+    time.sleep(0.06)
+    with pytest.raises(ValueError):
+        breaker.call(fail)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "never called")
+
+
+def test_hedged_returns_a_fast_call_without_hedging():
+    hedges = []
+    with ThreadPoolExecutor(2) as executor:
+        assert hedged(executor, lambda: "fast", 1, on_hedge=lambda: hedges.append(1)) == "fast"
+    assert not hedges
+
+
+def test_hedged_returns_the_hedge_when_the_first_call_is_slow():
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return "slow"
+        return "hedge"
+
+    with ThreadPoolExecutor(2) as executor:
+        try:
+            assert hedged(executor, call, 0.01) == "hedge"
+        finally:
+            release.set()
+
+
+def test_hedged_raises_when_both_calls_fail():
+    def call():
+        time.sleep(0.02)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(2) as executor:
+        with pytest.raises(ValueError):
+            hedged(executor, call, 0.001)
@@ -0,0 +1,57 @@
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+
+from ses_sender import Email, SesSender, TokenBucket
+
+
+class Client:
+    """Sends every email, except to the addresses in failing, which raise their error."""
+
+    def __init__(self, failing: dict) -> None:
+        self.failing: dict = failing
+        self.sent: list = []
+
+    def send_email(self, Destination: dict, **kwargs) -> dict:
+        to = Destination["ToAddresses"][0]
+        if to in self.failing:
+            raise self.failing[to]
+        self.sent.append(to)
+        return {"MessageId": f"id-{to}"}
+
+    def send_bulk_templated_email(self, Destinations: list, **kwargs) -> dict:
+        addresses = [destination["Destination"]["ToAddresses"][0] for destination in Destinations]
+        for to in addresses:
+            if to in self.failing:
+                raise self.failing[to]
+        self.sent.extend(addresses)
+        return {"Status": [{"Status": "Success", "MessageId": f"id-{to}"} for to in addresses]}
+
+
+ERRORS: list = [
+    EndpointConnectionError(endpoint_url="https://email.us-east-1.amazonaws.com"),
+    ReadTimeoutError(endpoint_url="https://email.us-east-1.amazonaws.com"),
+    ClientError({"Error": {"Code": "Throttling", "Message": "Maximum sending rate exceeded."}}, "SendEmail"),
+]
+
+
+@pytest.mark.parametrize("error", ERRORS)
+def test_a_failed_send_only_fails_its_email(error):
+    client = Client({"b@example.com": error})
+    sender = SesSender(client=client, max_send_rate=100)
+    emails = [Email(to, "text", "suggestion") for to in ("a@example.com", "b@example.com", "c@example.com")]
+    assert sender.send_all(emails) == ["id-a@example.com", None, "id-c@example.com"]
+
+
+@pytest.mark.parametrize("error", ERRORS)
+def test_a_failed_templated_call_only_fails_its_chunk(error):
+    client = Client({"c@example.com": error})
+    # a bucket of two tokens sends two destinations per call
+    sender = SesSender(client=client, max_send_rate=2, templates={"suggestion": "Suggestions"})
+    emails = [Email(to, "text", "suggestion") for to in ("a@example.com", "b@example.com", "c@example.com")]
+    assert sender.send_all(emails) == ["id-a@example.com", "id-b@example.com", None]
+    assert client.sent == ["a@example.com", "b@example.com"]
+
+
+def test_acquiring_more_than_the_capacity_raises():
+    with pytest.raises(ValueError):
+        TokenBucket(2).acquire(3)
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def run_together(flight: SingleFlight, key, func, callers: int) -> tuple:
+    """
+    Calls flight.do from several threads.
+
+    :return: the started threads, and the list each fills with what it got or raised
+    """
+    outcomes = [None] * callers
+
+    def call(i: int) -> None:
+        try:
+            outcomes[i] = flight.do(key, func)
+        except Exception as err:
+            outcomes[i] = err
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    threads, outcomes = run_together(flight, "key", func, 5)
+    while flight.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert outcomes == ["value"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"unique": 1, "coalesced": 4}
+
+
+def test_concurrent_calls_share_one_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def func():
+        release.wait(5)
+        raise ValueError("boom")
+
+    threads, outcomes = run_together(flight, "key", func, 3)
+    while flight.stats()["coalesced"] < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+
+def test_nothing_is_kept_once_a_call_returns():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == 1
+    assert flight.do("key", lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do("key", lambda: int("x"))
+    assert flight.do("key", lambda: 3) == 3
+    assert flight.stats() == {"unique": 4, "coalesced": 0}